@@ -41,41 +41,35 @@ class SearchPerformanceMiddleware(MiddlewareMixin):
                     f"Path: {request.path}"
                 )
             
-            # Save to SearchLog for analytics
+            # Buffer the SearchLog for analytics, written in batches by core.tasks.flush_search_logs
             if search_query and response.status_code == 200:
                 try:
-                    from core.models import SearchLog
-                    import json
+                    from core.utils import buffer_search_log
                     
-                    # Extract results count from response
-                    results_count = 0
-                    try:
-                        if hasattr(response, 'data'):
-                            results_count = response.data.get('count', 0)
-                        elif response.content:
-                            content = json.loads(response.content.decode('utf-8'))
-                            results_count = content.get('count', 0)
-                    except:
-                        pass
+                    # Set by the search view, no need to parse the response
+                    results_count = getattr(request, 'search_results_count', 0)
                     
                     # Determine search type and mode
                     search_type = 'product' if '/products/' in request.path else 'offer'
                     search_mode = request.GET.get('search_mode', 'hybrid' if request.GET.get('q') else 'legacy')
-                    min_similarity = request.GET.get('min_similarity')
                     
-                    # Create log entry
-                    SearchLog.objects.create(
-                        user=request.user if request.user.is_authenticated else None,
-                        query=search_query,
+                    try:
+                        min_similarity = float(request.GET['min_similarity'])
+                    except (KeyError, ValueError):
+                        min_similarity = None
+                    
+                    buffer_search_log(
+                        user_id=request.user.id if request.user.is_authenticated else None,
+                        query=search_query[:200],
                         search_mode=search_mode,
                         search_type=search_type,
                         results_count=results_count,
                         response_time=duration,
-                        min_similarity=float(min_similarity) if min_similarity else None,
+                        min_similarity=min_similarity,
                         user_role=getattr(request.user, 'role', '') if request.user.is_authenticated else ''
                     )
                 except Exception as e:
-                    logger.error(f"Failed to save search log: {e}")
+                    logger.error(f"Failed to buffer search log: {e}")
         
         return response
     
@@ -183,78 +183,61 @@ class WorkShift(models.Model):
             self.notes = notes
         self.save()
     
-    def update_statistics(self):
-        """تحديث إحصائيات الوردية."""
-        from django.apps import apps
-        
-        SaleInvoice = apps.get_model('invoices', 'SaleInvoice')
-        PurchaseInvoice = apps.get_model('invoices', 'PurchaseInvoice')
-        SalePayment = apps.get_model('finance', 'SalePayment')
-        PurchasePayment = apps.get_model('finance', 'PurchasePayment')
-        SaleReturnInvoice = apps.get_model('invoices', 'SaleReturnInvoice')
-        PurchaseReturnInvoice = apps.get_model('invoices', 'PurchaseReturnInvoice')
-        Complaint = apps.get_model('profiles', 'Complaint')
-        User = apps.get_model('accounts', 'User')
-        
-        # حساب الإحصائيات خلال فترة الوردية
-        start = self.start_time
-        end = self.end_time if self.end_time else timezone.now()
+    @staticmethod
+    def get_statistics(start, end):
+        """
+        تعبيرات إحصائيات الوردية بين start و end.
         
-        # الفواتير
-        self.total_sale_invoices = SaleInvoice.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end
-        ).count()
-        
-        self.total_purchase_invoices = PurchaseInvoice.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end
-        ).count()
-        
-        # الدفعات
-        sale_payments = SalePayment.objects.filter(
-            timestamp__gte=start,
-            timestamp__lte=end
-        )
-        purchase_payments = PurchasePayment.objects.filter(
-            timestamp__gte=start,
-            timestamp__lte=end
-        )
-        
-        self.total_payments = sale_payments.count() + purchase_payments.count()
-        self.total_payments_amount = (
-            sum(sale_payments.values_list('amount', flat=True)) +
-            sum(purchase_payments.values_list('amount', flat=True))
-        )
+        كل إحصائية subquery تجميعية (COUNT / SUM) على فهرس الوقت، تُحسب كلها في استعلام واحد.
+        """
+        from django.apps import apps
+        from django.db.models import DecimalField, F, Func, IntegerField, Subquery, Value
+        from django.db.models.functions import Coalesce
         
-        # المرتجعات
-        self.total_returns = (
-            SaleReturnInvoice.objects.filter(created_at__gte=start, created_at__lte=end).count() +
-            PurchaseReturnInvoice.objects.filter(created_at__gte=start, created_at__lte=end).count()
-        )
+        def window(app_label, model_name, field, function, column="id", **filters):
+            queryset = apps.get_model(app_label, model_name).objects.filter(
+                **{f"{field}__gte": start, f"{field}__lte": end}, **filters
+            )
+            output_field = IntegerField() if function == "COUNT" else DecimalField(max_digits=15, decimal_places=2)
+            # Func (not an aggregate) so the subquery has no GROUP BY and always returns one row
+            subquery = queryset.order_by().annotate(value=Func(F(column), function=function, output_field=output_field))
+            return Coalesce(Subquery(subquery.values("value")[:1]), Value(0), output_field=output_field)
         
-        # الشكاوي
-        self.total_complaints = Complaint.objects.filter(
-            created_at__gte=start,
-            created_at__lte=end
-        ).count()
+        amount_field = DecimalField(max_digits=15, decimal_places=2)
         
-        # التسجيلات الجديدة
-        self.total_new_registrations = User.objects.filter(
-            role='PHARMACY',
-            date_joined__gte=start,
-            date_joined__lte=end
-        ).count()
+        return {
+            "total_sale_invoices": window("invoices", "SaleInvoice", "created_at", "COUNT"),
+            "total_purchase_invoices": window("invoices", "PurchaseInvoice", "created_at", "COUNT"),
+            "total_payments": (
+                window("finance", "SalePayment", "timestamp", "COUNT") +
+                window("finance", "PurchasePayment", "timestamp", "COUNT")
+            ),
+            "total_payments_amount": models.ExpressionWrapper(
+                window("finance", "SalePayment", "timestamp", "SUM", "amount") +
+                window("finance", "PurchasePayment", "timestamp", "SUM", "amount"),
+                output_field=amount_field,
+            ),
+            "total_returns": (
+                window("invoices", "SaleReturnInvoice", "created_at", "COUNT") +
+                window("invoices", "PurchaseReturnInvoice", "created_at", "COUNT")
+            ),
+            "total_complaints": window("profiles", "Complaint", "created_at", "COUNT"),
+            "total_new_registrations": window("accounts", "User", "date_joined", "COUNT", role="PHARMACY"),
+            "total_sales_amount": window("invoices", "SaleInvoice", "created_at", "SUM", "total_price"),
+        }
+    
+    def update_statistics(self):
+        """
+        إعادة حساب إحصائيات الوردية من الفواتير والمرتجعات والمدفوعات.
         
-        # المبيعات
-        self.total_sales_amount = sum(
-            SaleInvoice.objects.filter(
-                created_at__gte=start,
-                created_at__lte=end
-            ).values_list('total_price', flat=True)
-        )
+        استعلام UPDATE واحد بالإحصائيات كلها ثم قراءتها، بدون جلب أي صفوف.
+        """
+        start = self.start_time
+        end = self.end_time if self.end_time else timezone.now()
+        statistics = self.get_statistics(start, end)
         
-        self.save()
+        WorkShift.objects.filter(pk=self.pk).update(**statistics)
+        self.refresh_from_db(fields=list(statistics))
 
 
 class SearchLog(models.Model):
@@ -362,8 +345,11 @@ class PopularSearch(models.Model):
     """
     query = models.CharField(max_length=200, unique=True)
     search_count = models.IntegerField(default=0)
+    zero_results_count = models.IntegerField(default=0)
     avg_results = models.IntegerField(default=0)
     avg_response_time = models.FloatField(default=0.0)
+    # Last SearchLog folded into this row, the highest one is the aggregation watermark
+    last_search_log_id = models.BigIntegerField(default=0)
     search_type = models.CharField(
         max_length=20,
         choices=[
@@ -386,4 +372,77 @@ class PopularSearch(models.Model):
         ]
     
     def __str__(self):
-        return f"{self.query} ({self.search_count} searches)"
\ No newline at end of file
+        return f"{self.query} ({self.search_count} searches)"
+    
+    @property
+    def zero_result_rate(self):
+        return self.zero_results_count / self.search_count if self.search_count else 0.0
+    
+    @classmethod
+    def aggregate_search_logs(cls, batch_size=50000):
+        """
+        Fold the SearchLog rows created since the last run into PopularSearch.
+        
+        Only logs with an id above the watermark (highest `last_search_log_id`) are read,
+        grouped by query in the database and merged into the existing rows with one upsert per batch.
+        Returns the number of folded logs.
+        """
+        from django.db.models import Count, Max, Q, Sum
+        
+        watermark = cls.objects.aggregate(watermark=Max('last_search_log_id'))['watermark'] or 0
+        last_id = SearchLog.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        folded = 0
+        
+        while watermark < last_id:
+            upper = min(watermark + batch_size, last_id)
+            rows = list(
+                SearchLog.objects.filter(id__gt=watermark, id__lte=upper)
+                .values('query')
+                .annotate(
+                    count=Count('id'),
+                    zero_results=Count('id', filter=Q(results_count=0)),
+                    total_results=Sum('results_count'),
+                    total_time=Sum('response_time'),
+                    search_type=Max('search_type'),
+                    last_id=Max('id'),
+                )
+            )
+            existing = cls.objects.in_bulk([row['query'] for row in rows], field_name='query')
+            popular_searches = []
+            
+            for row in rows:
+                popular_search = existing.get(row['query']) or cls(query=row['query'])
+                count = popular_search.search_count + row['count']
+                
+                popular_search.avg_results = round(
+                    (popular_search.avg_results * popular_search.search_count + row['total_results']) / count
+                )
+                popular_search.avg_response_time = (
+                    popular_search.avg_response_time * popular_search.search_count + row['total_time']
+                ) / count
+                popular_search.search_count = count
+                popular_search.zero_results_count += row['zero_results']
+                popular_search.search_type = row['search_type']
+                popular_search.last_search_log_id = row['last_id']
+                popular_searches.append(popular_search)
+            
+            cls.objects.bulk_create(
+                popular_searches,
+                update_conflicts=True,
+                unique_fields=['query'],
+                update_fields=[
+                    'search_count',
+                    'zero_results_count',
+                    'avg_results',
+                    'avg_response_time',
+                    'search_type',
+                    'last_search_log_id',
+                    'last_searched',
+                    'updated_at',
+                ],
+            )
+            
+            folded += sum(row['count'] for row in rows)
+            watermark = upper
+        
+        return folded
\ No newline at end of file
@@ -146,6 +146,19 @@ class BaseUserCreateSerializer(BaseModelSerializer):
 
 
 class BaseUploaderSerializer(serializers.Serializer):
+    """
+    Validates an Excel sheet row by row into `{"data": [...]}`.
+
+    The file is parsed once (.xlsx streamed with openpyxl in read-only mode) into columns.
+    Each required column is validated either by a `validate_columns_<name>(values, line_numbers)`
+    hook, called once with all the values of the column (so it can resolve them with one query)
+    and returning one validated value or `ValidationError` per row, or by a per-cell
+    `validate_column_<name>(value, line_number)` hook. `optional_columns` are validated the same
+    way, only when the sheet has them (rows of a sheet without them don't get the key).
+    `get_value_<name>` hooks then add the `additional_values` to every valid row. Errors are
+    reported per row.
+    """
+
     file = serializers.FileField(
         validators=[
             file_validators.EXCEL_VALIDATOR,
@@ -153,17 +166,57 @@ class BaseUploaderSerializer(serializers.Serializer):
         ]
     )
     required_columns = []
+    optional_columns = []
     additional_values = []
 
-    def validate_file(self, value):
-        # Read the file into a Pandas DataFrame
-        dataset = pd.read_excel(value)
+    def read_file(self, file):
+        """
+        Parse the sheet into `(columns, line_numbers)`, `columns` maps the lower-cased header names
+        to the cell values (empty cells as None). Fully empty rows are skipped, `line_numbers`
+        keeps the position of every parsed row after the header.
+        """
+        file.seek(0)
+        header, rows = [], []
+
+        if file.name.lower().endswith(".xlsx"):
+            from openpyxl import load_workbook
+
+            workbook = load_workbook(file, read_only=True, data_only=True)
+            try:
+                sheet_rows = workbook.active.iter_rows(values_only=True)
+                header = next(sheet_rows, None) or ()
+                rows = [
+                    (line_number, values)
+                    for line_number, values in enumerate(sheet_rows, start=1)
+                    if not all(value is None or value == "" for value in values)
+                ]
+            finally:
+                workbook.close()
+
+        else:
+            dataset = pd.read_excel(file)
+            dataset = dataset.astype(object).where(dataset.notna(), None)
+            header = list(dataset.columns)
+            rows = [(index + 1, values) for index, values in enumerate(dataset.itertuples(index=False, name=None))]
+
+        file.seek(0)
+
+        column_names = [str(name).lower().strip() if name is not None else None for name in header]
+        columns = {name: [] for name in column_names if name}
+
+        for _, values in rows:
+            values = dict(zip(column_names, values))
+            for name, column in columns.items():
+                column.append(values.get(name))
+
+        return columns, [line_number for line_number, _ in rows]
 
-        FILE_COLUMNS = [col.lower().strip() for col in dataset.columns]
+    def validate_file(self, value):
+        self.file_columns, self.file_line_numbers = self.read_file(value)
 
         columns_not_found = []
         for required_column in self.required_columns:
-            if required_column not in FILE_COLUMNS:
+            if required_column not in self.file_columns:
                 columns_not_found.append(required_column)
 
         if columns_not_found:
@@ -188,6 +241,17 @@ class BaseUploaderSerializer(serializers.Serializer):
         except ValidationError as err:
             return err.detail, True
 
+    def _validate_column_values(self, column_name, values, line_numbers):
+        fn = getattr(self, "validate_columns_{}".format(column_name), None)
+
+        if fn is None:
+            return [
+                self._validate_column_value(column_name, value, line_number)
+                for value, line_number in zip(values, line_numbers)
+            ]
+
+        return [(_v.detail, True) if isinstance(_v, ValidationError) else (_v, False) for _v in fn(values, line_numbers)]
+
     def _get_column_value(self, additional_value, row_values, validated_row_values, line_number):
         try:
             fn = getattr(self, "get_value_{}".format(additional_value), None)
@@ -202,31 +266,36 @@ class BaseUploaderSerializer(serializers.Serializer):
             return err.detail, True
 
     def validate_file_data(self, file):
-        dataset = pd.read_excel(file)
+        if getattr(self, "file_columns", None) is None:
+            self.file_columns, self.file_line_numbers = self.read_file(file)
+
+        line_numbers = self.file_line_numbers
+        column_names = [
+            *self.required_columns,
+            *(column_name for column_name in self.optional_columns if column_name in self.file_columns),
+        ]
+        validated_columns = {
+            column_name: self._validate_column_values(column_name, self.file_columns[column_name], line_numbers)
+            for column_name in column_names
+        }
 
         errs = []
         data = []
 
-        for index, row in dataset.iterrows():
+        for index, line_number in enumerate(line_numbers):
             row_errs = {}
             obj = {}
-            line_number = index + 1
 
             row_values = {}
             validated_row_values = {}
 
-            for column_name in self.required_columns:
-                row_value = row.get(column_name, None)
-
-                if pd.isna(row_value):
-                    row_value = None
-
-                _v, _e = self._validate_column_value(column_name, row_value, line_number)
+            for column_name in column_names:
+                _v, _e = validated_columns[column_name][index]
 
                 if _e:
                     row_errs[column_name] = _v
                 else:
-                    row_values[column_name] = row_value
+                    row_values[column_name] = self.file_columns[column_name][index]
                     validated_row_values[column_name] = _v
                     obj[column_name] = _v
 
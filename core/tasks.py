@@ -0,0 +1,52 @@
+"""
+Celery tasks for the core app.
+"""
+
+from celery import shared_task
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def flush_search_logs():
+    """
+    Write the search logs buffered by `SearchPerformanceMiddleware` in batches.
+
+    Returns:
+        dict: Number of created search logs
+    """
+    from core.utils import flush_search_log_buffer
+
+    flushed = flush_search_log_buffer()
+
+    if flushed:
+        logger.info(f"Flushed {flushed} search logs")
+
+    return {"success": True, "flushed": flushed}
+
+
+@shared_task
+def aggregate_popular_searches():
+    """
+    Fold the search logs created since the last run into PopularSearch.
+
+    Returns:
+        dict: Number of folded search logs
+    """
+    from django.apps import apps
+    from django.core.cache import cache
+
+    # A second run at the same time would fold the same logs twice
+    if not cache.add("aggregate_popular_searches:lock", 1, timeout=30 * 60):
+        return {"success": True, "folded": 0, "skipped": True}
+
+    try:
+        folded = apps.get_model("core", "PopularSearch").aggregate_search_logs()
+    finally:
+        cache.delete("aggregate_popular_searches:lock")
+
+    if folded:
+        logger.info(f"Aggregated {folded} search logs into popular searches")
+
+    return {"success": True, "folded": folded}
@@ -0,0 +1,234 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.choices import Role
+from core.models import PopularSearch, SearchLog, WorkShift
+from core.utils import (
+    SEARCH_LOG_BUFFER_KEY,
+    buffer_search_log,
+    bump_search_cache_version,
+    filter_by_ranked_ids,
+    flush_search_log_buffer,
+    get_ranked_search_ids,
+    get_search_cache_key,
+)
+from market.models import Category
+
+User = get_user_model()
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SearchLogBufferTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="+201000000030", name="Pharmacy", role=Role.PHARMACY)
+
+    def buffer(self, query, results_count=3, response_time=0.1):
+        buffer_search_log(
+            user_id=self.user.id,
+            query=query,
+            search_mode="hybrid",
+            search_type="product",
+            results_count=results_count,
+            response_time=response_time,
+            min_similarity=None,
+            user_role=self.user.role,
+        )
+
+    def test_logs_are_written_in_batches(self):
+        for index in range(25):
+            self.buffer("panadol" if index % 2 else "brufen", results_count=index % 3)
+
+        self.assertFalse(SearchLog.objects.exists())
+
+        with self.assertNumQueries(3):
+            self.assertEqual(flush_search_log_buffer(batch_size=10), 25)
+
+        self.assertEqual(SearchLog.objects.count(), 25)
+        self.assertEqual(flush_search_log_buffer(), 0)
+
+        self.buffer("congestal", results_count=0, response_time=2.0)
+        self.assertEqual(flush_search_log_buffer(), 1)
+
+        popular = list(SearchLog.get_popular_searches(limit=2))
+        self.assertEqual([(row["query"], row["count"]) for row in popular], [("brufen", 13), ("panadol", 12)])
+        self.assertEqual(SearchLog.get_slow_searches()[0].query, "congestal")
+        self.assertIn("congestal", [row["query"] for row in SearchLog.get_zero_result_searches()])
+
+    def reserve(self):
+        """A producer between its `incr` of the tail and the `set` of its value"""
+        cache.add(f"{SEARCH_LOG_BUFFER_KEY}:tail", 0, timeout=None)
+        return cache.incr(f"{SEARCH_LOG_BUFFER_KEY}:tail")
+
+    def test_values_being_pushed_are_not_lost(self):
+        self.buffer("panadol")
+        index = self.reserve()
+        self.buffer("brufen")
+
+        self.assertEqual(flush_search_log_buffer(), 1)
+
+        cache.set(f"{SEARCH_LOG_BUFFER_KEY}:{index}", {"query": "congestal", "response_time": 0.1})
+        self.assertEqual(flush_search_log_buffer(), 2)
+        self.assertEqual(
+            sorted(SearchLog.objects.values_list("query", flat=True)), ["brufen", "congestal", "panadol"]
+        )
+
+    def test_values_never_pushed_are_skipped_next_time(self):
+        self.reserve()
+        self.buffer("brufen")
+
+        self.assertEqual(flush_search_log_buffer(), 0)
+        self.assertEqual(flush_search_log_buffer(), 1)
+        self.assertEqual(flush_search_log_buffer(), 0)
+
+
+class PopularSearchAggregationTest(TestCase):
+    def log(self, query, results_count, response_time):
+        return SearchLog.objects.create(query=query, results_count=results_count, response_time=response_time)
+
+    def test_only_new_logs_are_folded(self):
+        self.log("panadol", 10, 0.2)
+        self.log("panadol", 0, 0.4)
+        self.log("brufen", 4, 1.0)
+
+        self.assertEqual(PopularSearch.aggregate_search_logs(), 3)
+
+        panadol = PopularSearch.objects.get(query="panadol")
+        self.assertEqual(panadol.search_count, 2)
+        self.assertEqual(panadol.avg_results, 5)
+        self.assertAlmostEqual(panadol.avg_response_time, 0.3)
+        self.assertEqual(panadol.zero_result_rate, 0.5)
+
+        self.assertEqual(PopularSearch.aggregate_search_logs(), 0)
+
+        last = self.log("panadol", 20, 0.6)
+
+        with self.assertNumQueries(5):
+            self.assertEqual(PopularSearch.aggregate_search_logs(), 1)
+
+        panadol.refresh_from_db()
+        self.assertEqual(panadol.search_count, 3)
+        self.assertEqual(panadol.avg_results, 10)
+        self.assertAlmostEqual(panadol.avg_response_time, 0.4)
+        self.assertEqual(panadol.last_search_log_id, last.id)
+        self.assertEqual(PopularSearch.objects.get(query="brufen").search_count, 1)
+
+
+class WorkShiftStatisticsTest(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user(username="+201000000040", name="Manager", role=Role.MANAGER)
+        self.shift = WorkShift.objects.create(started_by=self.manager)
+        self.pharmacy = User.objects.create_user(username="+201000000041", name="Pharmacy", role=Role.PHARMACY)
+
+    def create_events(self):
+        from finance.choices import PaymentMethodChoice
+        from finance.models import SalePayment
+        from invoices.models import SaleInvoice
+        from profiles.models import Complaint
+
+        for total_price in (Decimal("100.00"), Decimal("250.50")):
+            SaleInvoice.objects.create(
+                user=self.pharmacy, items_count=1, total_quantity=1, total_price=total_price
+            )
+        SalePayment.objects.create(user=self.pharmacy, method=PaymentMethodChoice.CASH, amount=Decimal("75.00"), at=self.shift.start_time)
+        Complaint.objects.create(user=self.pharmacy, subject="Late", body="Late delivery")
+
+    def assert_statistics(self, shift):
+        self.assertEqual(shift.total_sale_invoices, 2)
+        self.assertEqual(shift.total_sales_amount, Decimal("350.50"))
+        self.assertEqual(shift.total_payments, 1)
+        self.assertEqual(shift.total_payments_amount, Decimal("75.00"))
+        self.assertEqual(shift.total_complaints, 1)
+        self.assertEqual(shift.total_new_registrations, 1)
+
+    def test_events_do_not_write_the_shift(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.create_events()
+
+        self.assertFalse([query for query in queries if "core_workshift" in query["sql"]])
+
+    def test_update_statistics_is_aggregate_only(self):
+        self.create_events()
+        WorkShift.objects.filter(pk=self.shift.pk).update(
+            total_sale_invoices=0, total_sales_amount=0, total_payments=0, total_payments_amount=0,
+            total_complaints=0,
+        )
+
+        with self.assertNumQueries(2):
+            self.shift.update_statistics()
+
+        self.assert_statistics(self.shift)
+
+    def test_current_shift_reflects_later_changes(self):
+        from invoices.models import SaleInvoice
+        from rest_framework.test import APIClient
+
+        self.create_events()
+        # Item edits change the invoice total without going through the creation signals
+        SaleInvoice.objects.filter(total_price=Decimal("100.00")).update(total_price=Decimal("130.00"))
+
+        client = APIClient()
+        client.force_authenticate(self.manager)
+        response = client.get(reverse("core:shift-current"))
+
+        self.assertEqual(response.status_code, 200)
+        self.shift.refresh_from_db()
+        self.assertEqual(self.shift.total_sales_amount, Decimal("380.50"))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class SearchResultCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.categories = [Category.objects.create(name=f"Category {index}") for index in range(5)]
+
+    def test_versions_expire_cached_searches(self):
+        products_key = get_search_cache_key(("catalog",), "products", "panadol")
+        offers_key = get_search_cache_key(("catalog", "offers"), "max_offers", "panadol")
+
+        self.assertEqual(get_search_cache_key(("catalog",), "products", "panadol"), products_key)
+        self.assertNotEqual(get_search_cache_key(("catalog",), "products", "brufen"), products_key)
+
+        bump_search_cache_version("offers")
+        self.assertEqual(get_search_cache_key(("catalog",), "products", "panadol"), products_key)
+        self.assertNotEqual(get_search_cache_key(("catalog", "offers"), "max_offers", "panadol"), offers_key)
+
+        bump_search_cache_version("catalog")
+        self.assertNotEqual(get_search_cache_key(("catalog",), "products", "panadol"), products_key)
+
+    def test_versions_are_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_search_cache_version("catalog")
+            # A search running before the commit caches the old results under this key
+            key = get_search_cache_key(("catalog",), "products", "panadol")
+
+        self.assertNotEqual(get_search_cache_key(("catalog",), "products", "panadol"), key)
+
+    def test_ranked_ids_are_cached(self):
+        ranked = Category.objects.order_by("-name")
+        expected = [category.pk for category in reversed(self.categories)]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_ranked_search_ids("categories", lambda: ranked), expected)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_ranked_search_ids("categories", lambda: ranked), expected)
+
+        with self.assertNumQueries(1):
+            results = list(filter_by_ranked_ids(Category.objects.all(), expected[1:3]))
+        self.assertEqual(results, [self.categories[3], self.categories[2]])
+
+    def test_big_searches_are_not_cached(self):
+        with mock.patch("core.utils.SEARCH_CACHE_MAX_RESULTS", 3):
+            with self.assertNumQueries(1):
+                self.assertIsNone(get_ranked_search_ids("categories", Category.objects.all))
+
+            with self.assertNumQueries(0):
+                self.assertIsNone(get_ranked_search_ids("categories", Category.objects.all))
@@ -60,3 +60,208 @@ def get_excel_body():
         },
         "height": 40,
     }
+
+
+# Write-behind buffers kept in the cache (Redis in production, shared by every web and celery worker):
+# a counter (`tail`) and one key per value, the drained position is kept in `head`
+CACHE_BUFFER_TIMEOUT = 60 * 60
+
+
+def push_to_cache_buffer(name, value):
+    """Append `value` to the cache buffer `name`"""
+    from django.core.cache import cache
+
+    cache.add(f"{name}:tail", 0, timeout=None)
+    index = cache.incr(f"{name}:tail")
+    cache.set(f"{name}:{index}", value, timeout=CACHE_BUFFER_TIMEOUT)
+
+
+def drain_cache_buffer(name, batch_size=1000):
+    """
+    Yield the values of the cache buffer `name`, `batch_size` at a time.
+
+    A batch is removed from the buffer only once the next one is requested, so values of a batch
+    whose processing fails are drained again next time. Only one drain of a buffer runs at a time.
+
+    A producer increments `tail` before it sets its value, so the drain stops at the first value
+    not set yet and picks it up next time. A value still missing by then (its producer failed or it
+    expired) is skipped.
+    """
+    from django.core.cache import cache
+
+    lock_key = f"{name}:lock"
+
+    if not cache.add(lock_key, 1, timeout=5 * 60):
+        return
+
+    try:
+        head = cache.get(f"{name}:head", 0)
+        tail = cache.get(f"{name}:tail", 0)
+        # `tail` of the previous drain, values up to it had the whole interval to be set
+        drained_tail = cache.get(f"{name}:drained_tail", 0)
+
+        # The counter was evicted and started again
+        if tail < head:
+            head = drained_tail = 0
+
+        while head < tail:
+            indexes = range(head + 1, min(head + batch_size, tail) + 1)
+            values = cache.get_many([f"{name}:{index}" for index in indexes])
+
+            keys = []
+            for index in indexes:
+                key = f"{name}:{index}"
+                if key not in values and index > drained_tail:
+                    break
+                keys.append(key)
+
+            batch = [values[key] for key in keys if key in values]
+            if batch:
+                yield batch
+
+            cache.delete_many(keys)
+            head += len(keys)
+            cache.set(f"{name}:head", head, timeout=None)
+
+            if len(keys) < len(indexes):
+                break
+
+        cache.set(f"{name}:drained_tail", tail, timeout=None)
+    finally:
+        cache.delete(lock_key)
+
+
+# Search logs are written in batches by `core.tasks.flush_search_logs`
+SEARCH_LOG_BUFFER_KEY = "search_log_buffer"
+
+
+def buffer_search_log(**fields):
+    """Queue one `SearchLog` (its fields as keyword arguments) for the next flush"""
+    push_to_cache_buffer(SEARCH_LOG_BUFFER_KEY, fields)
+
+
+def flush_search_log_buffer(batch_size=1000):
+    """
+    Write the buffered search logs with `bulk_create`, `batch_size` at a time.
+
+    `created_at` of the rows is the flush time, at most one flush interval after the search.
+    Returns the number of created logs.
+    """
+    from django.apps import apps
+
+    SearchLog = apps.get_model("core", "SearchLog")
+    flushed = 0
+
+    for events in drain_cache_buffer(SEARCH_LOG_BUFFER_KEY, batch_size):
+        SearchLog.objects.bulk_create([SearchLog(**fields) for fields in events])
+        flushed += len(events)
+
+    return flushed
+
+
+# Search results are cached as ranked id lists (every page of a search) keyed by the version of the data
+# they depend on: "catalog" (products, companies) and "offers" (max offers). Bumping a version makes every
+# cached search of it stale at once, a version is a random token so an evicted one never comes back
+SEARCH_CACHE_VERSION_KEY = "search_cache_version"
+SEARCH_CACHE_TIMEOUT = 60 * 60
+SEARCH_CACHE_MAX_RESULTS = 2000
+
+
+def get_search_cache_key(scopes, *parts):
+    """Cache key of a search made of `parts` under the current versions of `scopes`"""
+    import hashlib
+    import uuid
+
+    from django.core.cache import cache
+
+    versions = []
+
+    for scope in scopes:
+        version_key = f"{SEARCH_CACHE_VERSION_KEY}:{scope}"
+        version = cache.get(version_key)
+
+        if version is None:
+            cache.add(version_key, uuid.uuid4().hex, timeout=None)
+            version = cache.get(version_key, "")
+
+        versions.append(version)
+
+    digest = hashlib.md5("|".join(str(part) for part in (*versions, *parts)).encode()).hexdigest()
+    return f"search_results:{'_'.join(scopes)}:{digest}"
+
+
+def bump_search_cache_version(*scopes):
+    """
+    Make every cached search depending on `scopes` stale.
+
+    The version is bumped right away and again when the current transaction commits: a search
+    running in between still sees the old rows and caches them under the first new version.
+    """
+    import uuid
+
+    from django.core.cache import cache
+    from django.db import transaction
+
+    def bump():
+        cache.set_many({f"{SEARCH_CACHE_VERSION_KEY}:{scope}": uuid.uuid4().hex for scope in scopes}, timeout=None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_ranked_search_ids(cache_key, get_queryset):
+    """
+    Ranked ids of a search from the cache, computed from `get_queryset()` and cached on a miss.
+
+    Returns None for searches with more than `SEARCH_CACHE_MAX_RESULTS` results, those are remembered
+    as not cacheable and must be run on the database.
+    """
+    from django.core.cache import cache
+
+    ids = cache.get(cache_key)
+
+    if ids is None:
+        ids = list(get_queryset().values_list("pk", flat=True)[: SEARCH_CACHE_MAX_RESULTS + 1])
+
+        if len(ids) > SEARCH_CACHE_MAX_RESULTS:
+            ids = False
+
+        cache.set(cache_key, ids, timeout=SEARCH_CACHE_TIMEOUT)
+
+    return ids if ids is not False else None
+
+
+def filter_by_ranked_ids(queryset, ids):
+    """Rows of `queryset` among `ids`, ordered by their position in `ids`"""
+    from django.contrib.postgres.fields import ArrayField
+    from django.db import models
+
+    position = models.Func(
+        models.Value(list(ids), output_field=ArrayField(models.BigIntegerField())),
+        models.F("pk"),
+        function="array_position",
+        output_field=models.IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(position)
+
+
+def set_trigram_similarity_threshold(threshold, using="default"):
+    """
+    Set the threshold of the pg_trgm `%` operator (`__trigram_similar`) for the connection.
+
+    The server default is 0.3, searches accepting a lower minimum similarity must lower it first
+    or their index-backed candidates miss the weaker matches. It's a session setting (the queryset
+    is evaluated after the view builds it, outside any transaction), every search using `%` sets it.
+    """
+    from django.db import connections
+
+    connection = connections[using]
+
+    if connection.vendor != "postgresql":
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, false)",
+            [str(min(max(float(threshold), 0.0), 1.0))],
+        )
@@ -1,8 +1,90 @@
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 from collections import OrderedDict
 
 
+def get_estimated_count(queryset):
+    """
+    Row count of the table of an unfiltered `queryset` from the PostgreSQL planner statistics.
+
+    Returns None when the estimate can't be used: another database, a filtered / distinct / sliced
+    queryset or a table that was never analyzed.
+    """
+    connection = connections[queryset.db]
+    query = queryset.query
+
+    if connection.vendor != "postgresql":
+        return None
+
+    if query.where or query.distinct or query.combinator or query.low_mark or query.high_mark is not None:
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+
+    if row is None or row[0] < 0:
+        return None
+
+    return row[0]
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        # The estimated count may be off, a full page means there may be more rows
+        if self.paginator.is_estimated:
+            return len(self.object_list) >= self.paginator.per_page
+
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the planner estimate instead of COUNT(*) for unfiltered querysets of big tables.
+
+    Filtered querysets and tables under `estimate_threshold` rows are still counted exactly.
+    Pages past the estimated last page are served (maybe empty) instead of raising, since the real count may be higher.
+    """
+
+    estimate_threshold = 10000
+    is_estimated = False
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, "query"):
+            estimated_count = get_estimated_count(self.object_list)
+
+            if estimated_count is not None and estimated_count >= self.estimate_threshold:
+                self.is_estimated = True
+                return estimated_count
+
+        return super().count
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if self.is_estimated and int(number) > 1:
+                return int(number)
+            raise
+
+    def page(self, number):
+        number = self.validate_number(number)
+
+        if not self.is_estimated:
+            return super().page(number)
+
+        # Don't cut the last page at the estimated count
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom : bottom + self.per_page], number, self)
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 10
     page_query_param = "p"
@@ -11,8 +93,13 @@ class CustomPageNumberPagination(PageNumberPagination):
     total_page_sizes = None
 
     def paginate_queryset(self, queryset, request, view=None):
-        self.total_page_sizes = queryset.count()
-        return super().paginate_queryset(queryset, request, view)
+        # The paginator caches its count, don't run a second COUNT(*) here
+        page = super().paginate_queryset(queryset, request, view)
+
+        if page is not None:
+            self.total_page_sizes = self.page.paginator.count
+
+        return page
 
     def get_paginated_response(self, data):
         return Response(
@@ -30,3 +117,40 @@ class CustomPageNumberPagination(PageNumberPagination):
 
 class LargePageNumberPagination(CustomPageNumberPagination):
     page_size = 100
+
+
+class EstimatedCountPagination(CustomPageNumberPagination):
+    """
+    Same response as `CustomPageNumberPagination` plus `count_is_estimated`,
+    for big tables (notifications, account transactions, search logs) listed without filters.
+    """
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        response.data["count_is_estimated"] = self.page.paginator.is_estimated
+        return response
+
+
+class CustomCursorPagination(CursorPagination):
+    """
+    Keyset pagination for infinite scroll, no COUNT(*) at all and a stable cost for deep pages.
+    `ordering` must end with a unique field.
+    """
+
+    page_size = 10
+    page_size_query_param = "ps"
+    max_page_size = 50
+    ordering = ("-created_at", "-id")
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("page_size", self.page_size),
+                    ("links", {"next": self.get_next_link(), "previous": self.get_previous_link()}),
+                    ("results", data),
+                ]
+            )
+        )
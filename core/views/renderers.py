@@ -69,16 +69,28 @@ class PDFRenderer(BaseRenderer):
 
         context.update({"data": data})
 
-        font_config = FontConfiguration()
-        html = render_to_string(template_name=template_name, context=context, request=request).encode(encoding="UTF-8")
-        deactivate()
-        document = HTML(string=html, base_url=request.build_absolute_uri()).render(font_config=font_config)
-
-        return self._save_virtual_pdf(document)
-
-    def _save_virtual_pdf(self, document: HTML):
-        with TemporaryFile() as tmp:
-            document.write_pdf(tmp, optimize_images=False)
-            tmp.seek(0)
-            virtual_pdf = tmp.read()
-        return virtual_pdf
+        return render_pdf(template_name, context, request=request)
+
+
+def render_pdf(template_name, context, request=None, base_url=None):
+    """
+    Render `template_name` with `context` to PDF bytes.
+    Works without a request (background exports), `base_url` then resolves the relative urls of the document.
+    """
+    if request is not None and base_url is None:
+        base_url = request.build_absolute_uri()
+
+    font_config = FontConfiguration()
+    html = render_to_string(template_name=template_name, context=context, request=request).encode(encoding="UTF-8")
+    deactivate()
+    document = HTML(string=html, base_url=base_url).render(font_config=font_config)
+
+    return save_virtual_pdf(document)
+
+
+def save_virtual_pdf(document: HTML):
+    with TemporaryFile() as tmp:
+        document.write_pdf(tmp, optimize_images=False)
+        tmp.seek(0)
+        virtual_pdf = tmp.read()
+    return virtual_pdf
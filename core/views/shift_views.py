@@ -149,7 +149,8 @@ class CurrentWorkShiftAPIView(APIView):
                 message=_("لا توجد وردية نشطة حالياً.")
             )
         
-        # تحديث الإحصائيات للوردية النشطة
+        # إعادة حساب الإحصائيات عند القراءة (UPDATE واحد بـ subqueries على فهارس الوقت)،
+        # فتشمل تعديل وحذف الفواتير والمدفوعات بدون أي كتابة على الوردية مع كل حدث
         active_shift.update_statistics()
         
         return APIResponse.success(
@@ -0,0 +1,15 @@
+from django.contrib import admin
+
+from core.admin.abstract_admin import DefaultBaseAdminItems
+from exports.models import ExportJob
+
+
+@admin.register(ExportJob)
+class ExportJobModelAdmin(DefaultBaseAdminItems):
+    list_display = ("id", "kind", "user", "status", "filename", "created_at", "finished_at")
+    search_fields = ("filename", "fingerprint")
+    list_filter = ("kind", "status", "created_at")
+    readonly_fields = ("created_at", "finished_at")
+    exclude = ("context",)
+    ordering = ("-created_at",)
+    date_hierarchy = "created_at"
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class ExportJobKindChoice(models.TextChoices):
+    OFFERS_PDF = "offers_pdf", "Offers PDF"
+    SALE_INVOICE_PDF = "sale_invoice_pdf", "Sale Invoice PDF"
+    ACCOUNT_STATEMENT_PDF = "account_statement_pdf", "Account Statement PDF"
+
+
+class ExportJobStatusChoice(models.TextChoices):
+    PENDING = "pending", "Pending"
+    PROCESSING = "processing", "Processing"
+    DONE = "done", "Done"
+    FAILED = "failed", "Failed"
@@ -0,0 +1,124 @@
+import logging
+import tempfile
+from decimal import Decimal
+
+from django.http import FileResponse, JsonResponse
+from rest_framework import serializers
+
+from core.views.mixins import PDFFileMixin
+from core.views.renderers import PDFRenderer
+from exports.choices import ExportJobStatusChoice
+from exports.serializers import ExportJobReadSerializer
+from exports.utils import get_or_create_export_job, write_xlsx
+
+logger = logging.getLogger(__name__)
+
+
+def get_export_file_response(job, content_type="application/pdf"):
+    return FileResponse(job.file.open("rb"), as_attachment=True, filename=job.filename, content_type=content_type)
+
+
+class PDFExportJobMixin(PDFFileMixin):
+    """
+    Renders the PDF of the view in the background instead of inside the request.
+
+    The view passes its serialized data to `export_pdf`. A document already rendered from the
+    same data is served directly, otherwise the export job is returned with status 202 and
+    its `status_url` is polled until the document can be downloaded from `download_url`.
+    """
+
+    export_kind = None
+
+    def export_pdf(self, data):
+        renderer = PDFRenderer()
+        context = {**renderer.get_context_data(self, self.request), "data": data}
+
+        job, _ = get_or_create_export_job(
+            self.export_kind,
+            renderer.get_template(self),
+            context,
+            filename=self.get_filename(request=self.request),
+            user=self.request.user,
+            base_url=self.request.build_absolute_uri(),
+        )
+
+        if job.status == ExportJobStatusChoice.DONE:
+            return get_export_file_response(job)
+
+        job_data = ExportJobReadSerializer(job, context={"request": self.request}).data
+        return JsonResponse(job_data, status=202, headers={"Retry-After": "2"})
+
+
+class XLSXStreamingMixin:
+    """
+    Streams the queryset of a list view as an .xlsx file with constant memory.
+
+    Drop-in replacement of drf-excel `XLSXFileMixin` for large exports: the same `serializer_class`,
+    `get_header`, `get_column_header`, `body` and `get_filename` are used, but the rows are read with
+    a server-side cursor (`iterator(chunk_size=...)`), written with openpyxl write-only mode to a
+    temporary file and streamed back in chunks.
+    """
+
+    xlsx_chunk_size = 2000
+    filename = "export.xlsx"
+
+    def get_filename(self, request=None, *args, **kwargs):
+        return self.filename
+
+    def get_header(self):
+        return getattr(self, "header", {})
+
+    def get_column_header(self):
+        return getattr(self, "column_header", {})
+
+    def get_xlsx_rows(self, queryset):
+        serializer = self.get_serializer()
+        fields = [field for field in serializer.fields.values() if not field.write_only]
+
+        for instance in queryset.iterator(chunk_size=self.xlsx_chunk_size):
+            data = serializer.to_representation(instance)
+            yield [get_xlsx_value(field, data.get(field.field_name)) for field in fields]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        column_header = self.get_column_header()
+
+        titles = column_header.get("titles") or [
+            str(field.label or field.field_name)
+            for field in self.get_serializer().fields.values()
+            if not field.write_only
+        ]
+
+        file = tempfile.TemporaryFile()
+        try:
+            count = write_xlsx(
+                file,
+                self.get_xlsx_rows(queryset),
+                titles,
+                header=self.get_header(),
+                column_header=column_header,
+                body=getattr(self, "body", {}),
+            )
+        except Exception:
+            file.close()
+            raise
+
+        logger.info(f"{self.__class__.__name__}: streamed {count} rows")
+
+        file.seek(0)
+        response = FileResponse(
+            file,
+            as_attachment=True,
+            filename=self.get_filename(request=request, *args, **kwargs),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response["Access-Control-Expose-Headers"] = "Content-Disposition"
+        return response
+
+
+def get_xlsx_value(field, value):
+    # Numbers stay numbers in the sheet (DecimalField is serialized as a string)
+    if value is not None and isinstance(field, serializers.DecimalField):
+        return Decimal(value)
+
+    return value
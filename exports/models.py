@@ -0,0 +1,46 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from exports.choices import ExportJobKindChoice, ExportJobStatusChoice
+
+
+class ExportJob(models.Model):
+    """
+    A document rendered in the background.
+
+    `fingerprint` hashes everything the document is rendered from, a done job is served
+    again for every request with the same fingerprint instead of rendering it again.
+    """
+
+    user = models.ForeignKey(
+        "accounts.User",
+        on_delete=models.SET_NULL,
+        related_name="export_jobs",
+        related_query_name="export_jobs",
+        null=True,
+        blank=True,
+    )
+    kind = models.CharField(choices=ExportJobKindChoice.choices)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(choices=ExportJobStatusChoice.choices, default=ExportJobStatusChoice.PENDING)
+    filename = models.CharField(max_length=255)
+    template_name = models.CharField(max_length=255)
+    # Render input, cleared once the file is rendered
+    context = models.JSONField(encoder=DjangoJSONEncoder, null=True, blank=True)
+    language = models.CharField(max_length=16, blank=True, default="")
+    base_url = models.CharField(max_length=2048, blank=True, default="")
+    file = models.FileField(upload_to="exports/", null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Export job"
+        verbose_name_plural = "Export jobs"
+        indexes = [
+            models.Index(fields=["fingerprint", "status"], name="export_job_fingerprint_idx"),
+            models.Index(fields=["created_at"], name="export_job_created_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
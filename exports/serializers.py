@@ -0,0 +1,36 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from core.serializers.abstract_serializers import BaseModelSerializer
+from exports.choices import ExportJobStatusChoice
+from exports.models import ExportJob
+
+
+class ExportJobReadSerializer(BaseModelSerializer):
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            "id",
+            "kind",
+            "status",
+            "filename",
+            "error",
+            "status_url",
+            "download_url",
+            "created_at",
+            "finished_at",
+        ]
+
+    def get_status_url(self, instance):
+        return reverse("exports:export-jobs-detail", kwargs={"pk": instance.pk}, request=self.context.get("request"))
+
+    def get_download_url(self, instance):
+        if instance.status != ExportJobStatusChoice.DONE:
+            return None
+
+        return reverse(
+            "exports:export-jobs-download", kwargs={"pk": instance.pk}, request=self.context.get("request")
+        )
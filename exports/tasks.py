@@ -0,0 +1,86 @@
+"""
+Celery tasks for the exports app.
+"""
+
+from celery import shared_task
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.utils import timezone, translation
+from datetime import timedelta
+import logging
+
+from exports.choices import ExportJobStatusChoice
+
+logger = logging.getLogger(__name__)
+
+get_model = apps.get_model
+
+
+@shared_task
+def render_export_job(job_id):
+    """
+    Render a pending export job and store the file under its fingerprint.
+
+    Returns:
+        dict: The job status
+    """
+    from core.views.renderers import WEASYPRINT_AVAILABLE, render_pdf
+
+    ExportJob = get_model("exports", "ExportJob")
+
+    # Claim the job, a job already taken by another worker is skipped
+    claimed = ExportJob.objects.filter(pk=job_id, status=ExportJobStatusChoice.PENDING).update(
+        status=ExportJobStatusChoice.PROCESSING
+    )
+    if not claimed:
+        return {"success": False, "job_id": job_id, "status": "skipped"}
+
+    job = ExportJob.objects.get(pk=job_id)
+    started_at = timezone.now()
+
+    try:
+        if not WEASYPRINT_AVAILABLE:
+            raise RuntimeError("PDF generation not available on this system. WeasyPrint dependencies missing.")
+
+        with translation.override(job.language or None):
+            content = render_pdf(job.template_name, job.context, base_url=job.base_url or None)
+
+        job.file.save(f"{job.fingerprint}.pdf", ContentFile(content), save=False)
+        job.status = ExportJobStatusChoice.DONE
+        job.context = None
+
+    except Exception as e:
+        logger.exception(f"Failed to render export job #{job_id}")
+        job.status = ExportJobStatusChoice.FAILED
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["file", "status", "context", "error", "finished_at"])
+
+    logger.info(
+        f"Export job #{job_id} ({job.kind}) {job.status} in {(job.finished_at - started_at).total_seconds():.1f}s"
+    )
+
+    return {"success": job.status == ExportJobStatusChoice.DONE, "job_id": job_id, "status": job.status}
+
+
+@shared_task
+def delete_old_export_jobs(days=7):
+    """
+    Delete export jobs (and their files) older than `days`.
+
+    Returns:
+        dict: Number of deleted jobs
+    """
+    ExportJob = get_model("exports", "ExportJob")
+
+    jobs = ExportJob.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+
+    for job in jobs.exclude(file="").exclude(file__isnull=True).only("pk", "file").iterator(chunk_size=500):
+        job.file.delete(save=False)
+
+    deleted_count, _ = jobs.delete()
+
+    logger.info(f"Deleted {deleted_count} old export jobs")
+
+    return {"success": True, "deleted_count": deleted_count}
@@ -0,0 +1,89 @@
+import io
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase
+
+from accounts.choices import Role
+from exports.choices import ExportJobKindChoice, ExportJobStatusChoice
+from exports.models import ExportJob
+from exports.utils import get_or_create_export_job, write_xlsx
+
+User = get_user_model()
+
+
+class ExportJobCacheTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="+201000000003", name="Manager", role=Role.MANAGER)
+
+    def export(self, data, timestamp="01-01-2026"):
+        with mock.patch("exports.tasks.render_export_job.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                job, created = get_or_create_export_job(
+                    ExportJobKindChoice.SALE_INVOICE_PDF,
+                    "invoices/sale_invoice.html",
+                    {"timestamp": timestamp, "data": data},
+                    filename="invoice.pdf",
+                    user=self.user,
+                )
+        return job, created, delay
+
+    def test_unchanged_document_is_rendered_once(self):
+        job, created, delay = self.export({"id": 1, "total_price": "100.00"})
+        self.assertTrue(created)
+        delay.assert_called_once_with(job.pk)
+
+        # Still rendering, the same job is polled
+        same_job, created, delay = self.export({"id": 1, "total_price": "100.00"})
+        self.assertEqual((same_job.pk, created), (job.pk, False))
+        delay.assert_not_called()
+
+        job.file.save(f"{job.fingerprint}.pdf", ContentFile(b"%PDF-1.7"), save=False)
+        job.status = ExportJobStatusChoice.DONE
+        job.save()
+
+        # Served from the stored file, also when only the print time changed
+        cached_job, created, delay = self.export({"id": 1, "total_price": "100.00"}, timestamp="02-01-2026")
+        self.assertEqual((cached_job.pk, created), (job.pk, False))
+        delay.assert_not_called()
+
+        # The invoice changed, the document is rendered again
+        new_job, created, delay = self.export({"id": 1, "total_price": "120.00"})
+        self.assertTrue(created)
+        self.assertNotEqual(new_job.fingerprint, job.fingerprint)
+        delay.assert_called_once_with(new_job.pk)
+
+        job.file.delete(save=False)
+        self.assertEqual(ExportJob.objects.count(), 2)
+
+
+class WriteXLSXTest(SimpleTestCase):
+    def test_rows_are_written_from_a_generator(self):
+        from openpyxl import load_workbook
+
+        from core.utils import get_excel_body, get_excel_column_header, get_excel_header
+
+        file = io.BytesIO()
+        rows = ([f"code {index}", Decimal("10.50") + index] for index in range(5000))
+
+        count = write_xlsx(
+            file,
+            rows,
+            ["Product code", "Price"],
+            header=get_excel_header(tab_name="Report", header_title="Report"),
+            column_header=get_excel_column_header(titles=["Product code", "Price"]),
+            body=get_excel_body(),
+        )
+
+        self.assertEqual(count, 5000)
+
+        file.seek(0)
+        sheet = load_workbook(file, read_only=True)["Report"]
+        values = list(sheet.values)
+
+        self.assertEqual(values[0][0], "Report")
+        self.assertEqual(values[1], ("Product code", "Price"))
+        self.assertEqual(values[2], ("code 0", 10.5))
+        self.assertEqual(len(values), 5002)
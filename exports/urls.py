@@ -0,0 +1,22 @@
+"""
+URL configuration for exports app.
+"""
+
+from django.urls import path
+from exports import views
+
+
+app_name = "exports"
+
+urlpatterns = [
+    path(
+        "jobs/<int:pk>/",
+        views.ExportJobRetrieveAPIView.as_view(),
+        name="export-jobs-detail",
+    ),
+    path(
+        "jobs/<int:pk>/download/",
+        views.ExportJobDownloadAPIView.as_view(),
+        name="export-jobs-download",
+    ),
+]
@@ -0,0 +1,144 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone, translation
+
+from exports.choices import ExportJobStatusChoice
+
+get_model = apps.get_model
+
+# A pending job older than this is considered lost (e.g. the worker died), a new one is queued
+EXPORT_JOB_STALE_AFTER = timedelta(minutes=10)
+
+# Context keys left out of the fingerprint (the print time of the document)
+FINGERPRINT_IGNORED_KEYS = {"timestamp"}
+
+
+def get_fingerprint(kind, template_name, context, language=""):
+    """sha256 of everything a document is rendered from."""
+    payload = {
+        "kind": kind,
+        "template_name": template_name,
+        "language": language,
+        "context": {key: value for key, value in context.items() if key not in FINGERPRINT_IGNORED_KEYS},
+    }
+    content = json.dumps(payload, cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def get_or_create_export_job(kind, template_name, context, filename, user=None, base_url=""):
+    """
+    Return `(job, created)` for the document rendered from `template_name` and `context`.
+
+    A done job with the same fingerprint is returned as is (the document is never rendered twice),
+    otherwise the pending job of `user` or a new job queued for rendering with `render_export_job`.
+    """
+    from exports.tasks import render_export_job
+
+    ExportJob = get_model("exports", "ExportJob")
+
+    language = translation.get_language() or ""
+    fingerprint = get_fingerprint(kind, template_name, context, language)
+
+    job = (
+        ExportJob.objects.filter(fingerprint=fingerprint, status=ExportJobStatusChoice.DONE)
+        .exclude(file="")
+        .order_by("-pk")
+        .first()
+    )
+    if job is not None:
+        return job, False
+
+    job = (
+        ExportJob.objects.filter(
+            fingerprint=fingerprint,
+            user=user,
+            status__in=[ExportJobStatusChoice.PENDING, ExportJobStatusChoice.PROCESSING],
+            created_at__gte=timezone.now() - EXPORT_JOB_STALE_AFTER,
+        )
+        .order_by("-pk")
+        .first()
+    )
+    if job is not None:
+        return job, False
+
+    job = ExportJob.objects.create(
+        user=user,
+        kind=kind,
+        fingerprint=fingerprint,
+        filename=filename,
+        template_name=template_name,
+        context=context,
+        language=language,
+        base_url=base_url,
+    )
+    transaction.on_commit(lambda: render_export_job.delay(job.pk))
+
+    return job, True
+
+
+def get_xlsx_style(style):
+    """openpyxl style objects from a drf-excel style dict (`get_excel_header` and friends)"""
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+    style = style or {}
+    kwargs = {}
+
+    if "font" in style:
+        kwargs["font"] = Font(**style["font"])
+    if "fill" in style:
+        kwargs["fill"] = PatternFill(**style["fill"])
+    if "alignment" in style:
+        kwargs["alignment"] = Alignment(**style["alignment"])
+    if "border_side" in style:
+        side = Side(**style["border_side"])
+        kwargs["border"] = Border(left=side, right=side, top=side, bottom=side)
+
+    return kwargs
+
+
+def write_xlsx(file, rows, titles, header=None, column_header=None, body=None):
+    """
+    Write `rows` (lists of cell values) to `file` as an .xlsx workbook with openpyxl write-only mode.
+
+    Rows are flushed to disk as they are written, so memory stays flat whatever the number of rows.
+    `header`, `column_header` and `body` are the drf-excel options of the view. Returns the rows count.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    header = header or {}
+    column_header = column_header or {}
+    body = body or {}
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=str(header.get("tab_title") or "Report")[:31])
+
+    def styled_row(values, style):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            for name, style_value in style.items():
+                setattr(cell, name, style_value)
+            cells.append(cell)
+        return cells
+
+    if header.get("use_header"):
+        sheet.append(styled_row([header.get("header_title", "")], get_xlsx_style(header.get("style"))))
+
+    sheet.append(styled_row(titles, get_xlsx_style(column_header.get("style"))))
+
+    body_style = get_xlsx_style(body.get("style"))
+    count = 0
+
+    for row in rows:
+        sheet.append(styled_row(row, body_style))
+        count += 1
+
+    workbook.save(file)
+
+    return count
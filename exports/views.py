@@ -0,0 +1,36 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView, RetrieveAPIView
+from rest_framework.permissions import IsAuthenticated
+
+from exports.choices import ExportJobStatusChoice
+from exports.mixins import get_export_file_response
+from exports.models import ExportJob
+from exports.serializers import ExportJobReadSerializer
+
+
+class ExportJobRetrieveAPIView(RetrieveAPIView):
+    """Status of an export job of the current user (polled until it is done)."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ExportJobReadSerializer
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user)
+
+
+class ExportJobDownloadAPIView(GenericAPIView):
+    """Download the file of a done export job of the current user."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ExportJobReadSerializer
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(user=self.request.user, status=ExportJobStatusChoice.DONE)
+
+    def get(self, request, *args, **kwargs):
+        job = self.get_object()
+
+        if not job.file:
+            raise NotFound("The export file is no longer available.")
+
+        return get_export_file_response(job)
@@ -9,6 +9,8 @@ from api.schemas import (
     TokenRequest, TokenResponse
 )
 from services import llm_service, rag_service, mcp_service, auth_service
+from inference_executor import ExecutorQueueFull
+from dependencies import verify_api_key
 import logging
 import json
 
@@ -91,6 +93,8 @@ async def process_query(request: AgentRequest):
             metadata=result.get('metadata', {})
         )
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Agent processing error: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
@@ -253,6 +257,8 @@ async def trained_chat(request: ChatRequest):
             session_id=request.session_id or 1
         )
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Trained chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Trained chat failed: {str(e)}")
@@ -300,6 +306,8 @@ async def smart_chat(request: ChatRequest):
             session_id=request.session_id or 1
         )
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Smart chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Smart chat failed: {str(e)}")
@@ -347,6 +355,8 @@ async def test_chat(request: ChatRequest):
             session_id=request.session_id or 1
         )
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Test chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Test chat failed: {str(e)}")
@@ -539,7 +549,26 @@ async def test_rag_query(q: str, top_k: int = 5):
     try:
         result = await rag_service.query(q, top_k=top_k)
         return result
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"RAG query error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"RAG query failed: {str(e)}")
 
+
+@router.post("/rag/sync", dependencies=[Depends(verify_api_key)])
+async def sync_rag(force: bool = False):
+    """
+    Sync the RAG index with the latest catalog export (only changed products are embedded)
+    
+    POST /agent/rag/sync?force=false
+    """
+    try:
+        if rag_service._collection is None:
+            await rag_service.initialize()
+        return await rag_service.load_data(force=force)
+    except ExecutorQueueFull:
+        raise
+    except Exception as e:
+        logger.error(f"RAG sync error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"RAG sync failed: {str(e)}")
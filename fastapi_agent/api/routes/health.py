@@ -5,6 +5,7 @@ from fastapi import APIRouter
 from datetime import datetime
 from config import settings
 from api.schemas import HealthResponse
+import inference_executor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -49,3 +50,10 @@ async def liveness_check():
     """
     return {"status": "alive"}
 
+
+@router.get("/executors")
+async def executors_stats():
+    """
+    Queueing metrics of the model executors (running, queued, rejected, average wait/run time)
+    """
+    return inference_executor.get_stats()
@@ -24,7 +24,7 @@ async def transcribe_audio(request: TranscribeRequest):
         audio_bytes = base64.b64decode(request.audio_base64)
         
         # Transcribe
-        result = stt_service.transcribe(audio_bytes, language=request.language)
+        result = await stt_service.transcribe(audio_bytes, language=request.language)
         
         return TranscribeResponse(
             success=True,
@@ -33,6 +33,8 @@ async def transcribe_audio(request: TranscribeRequest):
             duration=result.get('duration')
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
@@ -51,7 +53,7 @@ async def transcribe_file(audio: UploadFile = File(...), language: str = "ar"):
         audio_bytes = await audio.read()
         
         # Transcribe
-        result = stt_service.transcribe(audio_bytes, language=language)
+        result = await stt_service.transcribe(audio_bytes, language=language)
         
         return TranscribeResponse(
             success=True,
@@ -60,6 +62,8 @@ async def transcribe_file(audio: UploadFile = File(...), language: str = "ar"):
             duration=result.get('duration')
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"File transcription error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Transcription failed: {str(e)}")
@@ -30,12 +30,25 @@ class Settings(BaseSettings):
     
     # ChromaDB
     CHROMA_PERSIST_DIR: str = "./chroma_db"
+    RAG_DRUGS_FILE: str = ""  # Catalog exported by Django (auto-detected when empty)
+    RAG_SYNC_INTERVAL: int = 300  # Seconds between checks for a new catalog export
     
     # Audio settings
     WHISPER_MODEL: str = "base"  # tiny, base, small, medium, large
     TTS_LANGUAGE: str = "ar"
     AUDIO_STORAGE_PATH: str = "./recordings"
     
+    # Inference executor (parallel calls / waiting calls per model, 503 beyond that)
+    STT_MAX_CONCURRENCY: int = 1
+    STT_MAX_QUEUE: int = 4
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_MAX_QUEUE: int = 16
+    TTS_MAX_CONCURRENCY: int = 4
+    TTS_MAX_QUEUE: int = 32
+    RAG_MAX_CONCURRENCY: int = 4
+    RAG_MAX_QUEUE: int = 64
+    EXECUTOR_RETRY_AFTER: int = 5
+    
     # WebRTC
     STUN_SERVER: Optional[str] = "stun:stun.l.google.com:19302"
     
@@ -0,0 +1,138 @@
+"""
+Bounded executor for blocking model calls (Whisper, Ollama, gTTS, ChromaDB)
+
+Every model runs its blocking calls on its own thread pool so the event loop
+keeps serving other requests. Each model has a concurrency limit and a bounded
+wait queue; once the queue is full new calls are rejected with HTTP 503.
+"""
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException, status
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorQueueFull(HTTPException):
+    """Raised when a model has no free slot and its wait queue is full"""
+
+    def __init__(self, model: str):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"The {model} service is busy, please retry shortly",
+            headers={"Retry-After": str(settings.EXECUTOR_RETRY_AFTER)},
+        )
+        self.model = model
+
+
+class ModelExecutor:
+    """
+    Runs blocking calls of one model with at most `max_concurrency` in parallel
+    and at most `max_queue` waiting for a free slot
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-inference")
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+        # Metrics
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait_time = 0.0
+        self.total_run_time = 0.0
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        if self._semaphore.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            logger.warning(f"{self.name} executor queue is full ({self.queued} waiting), rejecting call")
+            raise ExecutorQueueFull(self.name)
+
+        enqueued_at = time.monotonic()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.monotonic()
+        self.total_wait_time += started_at - enqueued_at
+        self.running += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self.total_run_time += time.monotonic() - started_at
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(1000 * self.total_wait_time / self.completed, 2) if self.completed else 0.0,
+            "avg_run_ms": round(1000 * self.total_run_time / self.completed, 2) if self.completed else 0.0,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# One executor per model, created on first use from the settings
+# (<MODEL>_MAX_CONCURRENCY, <MODEL>_MAX_QUEUE)
+_executors: Dict[str, ModelExecutor] = {}
+
+
+def get_executor(model: str) -> ModelExecutor:
+    executor = _executors.get(model)
+
+    if executor is None:
+        prefix = model.upper()
+        executor = ModelExecutor(
+            model,
+            max_concurrency=getattr(settings, f"{prefix}_MAX_CONCURRENCY"),
+            max_queue=getattr(settings, f"{prefix}_MAX_QUEUE"),
+        )
+        _executors[model] = executor
+
+    return executor
+
+
+async def run_inference(model: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Run the blocking `func(*args, **kwargs)` on the executor of `model`
+
+    Raises:
+        ExecutorQueueFull: the model is saturated (HTTP 503)
+    """
+    return await get_executor(model).run(func, *args, **kwargs)
+
+
+def get_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown():
+    for executor in _executors.values():
+        executor.shutdown()
+    _executors.clear()
@@ -4,11 +4,13 @@ FastAPI AI Sales Agent Service - Main Application
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from config import settings
 from api.routes import calls, agent, stt, health
 from services import stt_service, rag_service
+import inference_executor
 from middleware.auth_middleware import token_auth_middleware
 
 # Configure logging
@@ -36,6 +38,7 @@ async def lifespan(app: FastAPI):
         # Initialize RAG service
         logger.info("Initializing RAG service...")
         await rag_service.initialize()
+        rag_sync_task = asyncio.create_task(rag_service.periodic_sync())
         logger.info("✓ RAG service initialized")
         
         logger.info("✅ Service started successfully!")
@@ -48,6 +51,8 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down AI Sales Agent Service...")
+    rag_sync_task.cancel()
+    inference_executor.shutdown()
 
 
 # Create FastAPI app
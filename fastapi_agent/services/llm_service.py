@@ -4,6 +4,7 @@ LLM Service using Ollama with Phi-3 Mini
 import ollama
 import logging
 from config import settings
+from inference_executor import ExecutorQueueFull, run_inference
 from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -24,7 +25,9 @@ async def chat(messages: List[Dict[str, str]], context: Dict[str, Any] = None) -
         logger.info(f"Sending chat request to Ollama ({len(messages)} messages)")
         
         # Call Ollama API
-        response = ollama.chat(
+        response = await run_inference(
+            "llm",
+            ollama.chat,
             model=settings.OLLAMA_MODEL,
             messages=messages
         )
@@ -40,6 +43,8 @@ async def chat(messages: List[Dict[str, str]], context: Dict[str, Any] = None) -
             'message': response['message']
         }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"LLM error: {str(e)}", exc_info=True)
         return {
@@ -63,7 +68,9 @@ async def generate(prompt: str, system: str = None) -> Dict[str, Any]:
     try:
         logger.info(f"Generating response for prompt: '{prompt[:100]}...'")
         
-        response = ollama.generate(
+        response = await run_inference(
+            "llm",
+            ollama.generate,
             model=settings.OLLAMA_MODEL,
             prompt=prompt,
             system=system
@@ -74,6 +81,8 @@ async def generate(prompt: str, system: str = None) -> Dict[str, Any]:
             'response': response['response']
         }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Generation error: {str(e)}", exc_info=True)
         return {
@@ -105,7 +114,9 @@ async def extract_intent(text: str) -> Dict[str, Any]:
 مثال: {"intent": "order", "entities": {"product": "باراسيتامول", "quantity": 10}}
 """
         
-        response = ollama.chat(
+        response = await run_inference(
+            "llm",
+            ollama.chat,
             model=settings.OLLAMA_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -140,6 +151,8 @@ async def extract_intent(text: str) -> Dict[str, Any]:
             **result
         }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Intent extraction error: {str(e)}")
         return {
@@ -265,6 +278,8 @@ async def process_with_functions(text: str, user_id: int = None, session_id: int
                 }
             }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Process with functions error: {str(e)}")
         return {
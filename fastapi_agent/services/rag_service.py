@@ -3,10 +3,13 @@ RAG (Retrieval Augmented Generation) Service using ChromaDB
 """
 import chromadb
 from chromadb.config import Settings as ChromaSettings
+import asyncio
+import hashlib
 import logging
 import json
 import os
 from config import settings
+from inference_executor import ExecutorQueueFull, run_inference
 from typing import List, Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -15,9 +18,13 @@ logger = logging.getLogger(__name__)
 _client = None
 _collection = None
 
+# Modification time of the last synced catalog file
+_synced_mtime = None
+_sync_lock = asyncio.Lock()
+
 
 async def initialize():
-    """Initialize ChromaDB and load data"""
+    """Initialize ChromaDB and sync it with the exported catalog"""
     global _client, _collection
     
     if _client is None:
@@ -36,41 +43,37 @@ async def initialize():
         
         logger.info(f"ChromaDB initialized. Collection has {_collection.count()} documents")
         
-        # Load data if collection is empty
-        if _collection.count() == 0:
-            await load_data()
+        # Only new, changed or deleted products are embedded again
+        await load_data()
 
 
-async def load_data():
-    """Load drug catalog data from exported JSON"""
-    global _collection
-    
-    logger.info("Loading drug catalog into ChromaDB...")
-    
-    # Path to exported data
-    drugs_file = os.path.join(settings.DJANGO_API_URL.replace('http://web:8000', '../'), 'rag_data/drugs.json')
+def get_drugs_file():
+    """Path of the catalog exported by Django (`sync_rag_data` / `export_rag_data`)"""
+    candidates = [
+        settings.RAG_DRUGS_FILE,
+        os.path.join(settings.DJANGO_API_URL.replace('http://web:8000', '../'), 'rag_data/drugs.json'),
+        # Shared volumes
+        '/app/shared_rag_data/drugs.json',
+        '/app/rag_data/drugs.json',
+    ]
     
-    # Alternative: Load from shared volume
-    if not os.path.exists(drugs_file):
-        drugs_file = '/app/rag_data/drugs.json'
+    for drugs_file in candidates:
+        if drugs_file and os.path.exists(drugs_file):
+            return drugs_file
     
-    if not os.path.exists(drugs_file):
-        logger.warning(f"Drug catalog file not found: {drugs_file}")
-        logger.warning("Run 'python manage.py export_rag_data' in Django to generate data")
-        return
-    
-    try:
-        with open(drugs_file, 'r', encoding='utf-8') as f:
-            drugs = json.load(f)
-        
-        # Prepare documents for ChromaDB
-        documents = []
-        metadatas = []
-        ids = []
-        
-        for drug in drugs:
-            # Create searchable text
-            doc_text = f"""
+    return None
+
+
+def get_content_hash(drug: Dict[str, Any]) -> str:
+    """Hash of the drug fields, same as `content_hash` written by the Django export"""
+    content = {key: value for key, value in drug.items() if key != 'content_hash'}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def build_document(drug: Dict[str, Any]):
+    """Searchable text and metadata of one drug"""
+    doc_text = f"""
 اسم الدواء: {drug['name']}
 الاسم الإنجليزي: {drug['e_name']}
 الشركة: {drug['company']}
@@ -79,35 +82,136 @@ async def load_data():
 السعر: {drug['public_price']} جنيه
 الشكل الصيدلي: {drug['shape']}
 """
-            
-            documents.append(doc_text.strip())
-            metadatas.append({
-                'id': drug['id'],
-                'name': drug['name'],
-                'e_name': drug['e_name'],
-                'company': drug['company'],
-                'price': float(drug['public_price']),
-                'category': drug['category']
-            })
-            ids.append(str(drug['id']))
+    
+    metadata = {
+        'id': drug['id'],
+        'name': drug['name'],
+        'e_name': drug['e_name'],
+        'company': drug['company'],
+        'price': float(drug['public_price']),
+        'category': drug['category'],
+        'content_hash': drug.get('content_hash') or get_content_hash(drug),
+    }
+    
+    return doc_text.strip(), metadata
+
+
+def get_indexed_hashes() -> Dict[str, str]:
+    """Content hash of every document in the collection, by id (no embeddings are loaded)"""
+    indexed = _collection.get(include=['metadatas'])
+    
+    return {
+        doc_id: (metadata or {}).get('content_hash')
+        for doc_id, metadata in zip(indexed['ids'], indexed['metadatas'] or [])
+    }
+
+
+async def sync_drugs(drugs: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Bring the collection in line with `drugs`, keyed on product id and content hash.
+    
+    Only new and changed products are embedded (upsert), products that are no longer
+    in the catalog are deleted, unchanged products are left untouched.
+    """
+    indexed_hashes = await run_inference("rag", get_indexed_hashes)
+    
+    documents = []
+    metadatas = []
+    ids = []
+    created = 0
+    
+    for drug in drugs:
+        doc_id = str(drug['id'])
+        content_hash = drug.get('content_hash') or get_content_hash(drug)
         
-        # Add to collection in batches
-        batch_size = 100
-        for i in range(0, len(documents), batch_size):
-            batch_docs = documents[i:i+batch_size]
-            batch_metas = metadatas[i:i+batch_size]
-            batch_ids = ids[i:i+batch_size]
+        if indexed_hashes.get(doc_id) == content_hash:
+            continue
+        
+        if doc_id not in indexed_hashes:
+            created += 1
+        
+        doc_text, metadata = build_document({**drug, 'content_hash': content_hash})
+        documents.append(doc_text)
+        metadatas.append(metadata)
+        ids.append(doc_id)
+    
+    deleted_ids = list(set(indexed_hashes) - {str(drug['id']) for drug in drugs})
+    
+    # Upsert in batches
+    batch_size = 100
+    for i in range(0, len(documents), batch_size):
+        await run_inference(
+            "rag",
+            _collection.upsert,
+            documents=documents[i:i+batch_size],
+            metadatas=metadatas[i:i+batch_size],
+            ids=ids[i:i+batch_size]
+        )
+    
+    for i in range(0, len(deleted_ids), batch_size):
+        await run_inference("rag", _collection.delete, ids=deleted_ids[i:i+batch_size])
+    
+    return {
+        'created': created,
+        'updated': len(ids) - created,
+        'deleted': len(deleted_ids),
+        'unchanged': len(drugs) - len(ids),
+    }
+
+
+async def load_data(force: bool = False) -> Dict[str, Any]:
+    """
+    Sync the drug catalog exported as JSON into ChromaDB
+    
+    The file is skipped when it did not change since the last sync, unless `force`.
+    """
+    global _collection, _synced_mtime
+    
+    drugs_file = get_drugs_file()
+    
+    if drugs_file is None:
+        logger.warning("Drug catalog file not found")
+        logger.warning("Run 'python manage.py sync_rag_data' in Django to generate data")
+        return {'success': False, 'error': 'Drug catalog file not found'}
+    
+    mtime = os.path.getmtime(drugs_file)
+    if not force and mtime == _synced_mtime:
+        return {'success': True, 'skipped': True}
+    
+    async with _sync_lock:
+        try:
+            logger.info(f"Syncing drug catalog from {drugs_file} into ChromaDB...")
+            
+            with open(drugs_file, 'r', encoding='utf-8') as f:
+                drugs = json.load(f)
+            
+            stats = await sync_drugs(drugs)
+            _synced_mtime = mtime
             
-            _collection.add(
-                documents=batch_docs,
-                metadatas=batch_metas,
-                ids=batch_ids
+            logger.info(
+                f"✓ Drug catalog synced: {stats['created']} new, {stats['updated']} changed, "
+                f"{stats['deleted']} deleted, {stats['unchanged']} unchanged"
             )
+            
+            return {'success': True, **stats}
         
-        logger.info(f"✓ Loaded {len(documents)} drugs into ChromaDB")
-    
-    except Exception as e:
-        logger.error(f"Error loading data: {str(e)}", exc_info=True)
+        except ExecutorQueueFull:
+            raise
+        except Exception as e:
+            logger.error(f"Error loading data: {str(e)}", exc_info=True)
+            return {'success': False, 'error': str(e)}
+
+
+async def periodic_sync():
+    """Background loop picking up new catalog exports every RAG_SYNC_INTERVAL seconds"""
+    while True:
+        await asyncio.sleep(settings.RAG_SYNC_INTERVAL)
+        
+        try:
+            if _collection is not None:
+                await load_data()
+        except Exception as e:
+            logger.error(f"Periodic RAG sync error: {str(e)}")
 
 
 async def query(query_text: str, top_k: int = 5) -> Dict[str, Any]:
@@ -130,7 +234,9 @@ async def query(query_text: str, top_k: int = 5) -> Dict[str, Any]:
         logger.info(f"Querying RAG: '{query_text}' (top_k={top_k})")
         
         # Query ChromaDB
-        results = _collection.query(
+        results = await run_inference(
+            "rag",
+            _collection.query,
             query_texts=[query_text],
             n_results=top_k
         )
@@ -154,6 +260,8 @@ async def query(query_text: str, top_k: int = 5) -> Dict[str, Any]:
             'count': len(formatted_results)
         }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"RAG query error: {str(e)}", exc_info=True)
         return {
@@ -5,6 +5,7 @@ import whisper
 import io
 import logging
 from config import settings
+from inference_executor import ExecutorQueueFull, run_inference
 from typing import Dict, Any
 
 logger = logging.getLogger(__name__)
@@ -22,10 +23,12 @@ def initialize():
         logger.info("Whisper model loaded successfully")
 
 
-def transcribe(audio_bytes: bytes, language: str = "ar") -> Dict[str, Any]:
+async def transcribe(audio_bytes: bytes, language: str = "ar") -> Dict[str, Any]:
     """
     Transcribe audio bytes to text
     
+    Whisper runs on the STT executor, never on the event loop
+    
     Args:
         audio_bytes: Audio file bytes
         language: Language code (ar, en, etc.)
@@ -36,7 +39,7 @@ def transcribe(audio_bytes: bytes, language: str = "ar") -> Dict[str, Any]:
     global _model
     
     if _model is None:
-        initialize()
+        await run_inference("stt", initialize)
     
     try:
         # Save bytes to temporary file-like object
@@ -45,7 +48,9 @@ def transcribe(audio_bytes: bytes, language: str = "ar") -> Dict[str, Any]:
         
         # Transcribe
         logger.info(f"Transcribing audio ({len(audio_bytes)} bytes) in language: {language}")
-        result = _model.transcribe(
+        result = await run_inference(
+            "stt",
+            _model.transcribe,
             audio_file,
             language=language,
             fp16=False  # Use FP32 for CPU compatibility
@@ -63,6 +68,8 @@ def transcribe(audio_bytes: bytes, language: str = "ar") -> Dict[str, Any]:
             'duration': None  # Whisper doesn't return duration
         }
     
+    except ExecutorQueueFull:
+        raise
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}", exc_info=True)
         return {
@@ -6,6 +6,7 @@ import io
 import logging
 import base64
 from config import settings
+from inference_executor import run_inference
 
 logger = logging.getLogger(__name__)
 
@@ -56,10 +57,8 @@ async def text_to_speech_async(text: str, language: str = "ar", slow: bool = Fal
     """
     Async version of text_to_speech
     
-    Note: gTTS is synchronous, but we wrap it for async context
+    Note: gTTS is synchronous, it runs on the TTS executor
     In production, consider using an async TTS service
     """
-    import asyncio
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, text_to_speech, text, language, slow)
+    return await run_inference("tts", text_to_speech, text, language, slow)
 
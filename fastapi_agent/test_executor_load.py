@@ -0,0 +1,119 @@
+"""
+Load test for the inference executor using stub models
+
+Heavy stub "model" calls (blocking sleep, like Whisper/Ollama) run next to many
+lightweight requests. Through the executor the lightweight latency stays flat and
+saturated models answer 503; calling the stub directly in the route stalls everything.
+
+Run: python test_executor_load.py
+"""
+import asyncio
+import statistics
+import sys
+import os
+import time
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+
+import inference_executor
+from inference_executor import run_inference
+
+STUB_MODEL_SECONDS = 0.3
+LIGHT_REQUESTS = 50
+HEAVY_LEVELS = [0, 4, 16, 64]
+
+
+def stub_transcribe(audio_bytes: bytes) -> dict:
+    """Blocking stub standing in for whisper `transcribe`"""
+    time.sleep(STUB_MODEL_SECONDS)
+    return {"text": "stub", "bytes": len(audio_bytes)}
+
+
+app = FastAPI()
+
+
+@app.get("/ping")
+async def ping():
+    return {"status": "ok"}
+
+
+@app.post("/transcribe")
+async def transcribe():
+    return await run_inference("stt", stub_transcribe, b"audio")
+
+
+@app.post("/transcribe/blocking")
+async def transcribe_blocking():
+    # The old pattern: blocking model call directly inside the async route
+    return stub_transcribe(b"audio")
+
+
+async def light_latencies(client: httpx.AsyncClient) -> list:
+    latencies = []
+    for _ in range(LIGHT_REQUESTS):
+        started_at = time.monotonic()
+        response = await client.get("/ping")
+        assert response.status_code == 200
+        latencies.append(1000 * (time.monotonic() - started_at))
+        await asyncio.sleep(0.01)
+    return latencies
+
+
+async def run_level(client: httpx.AsyncClient, heavy: int, path: str) -> dict:
+    heavy_calls = [asyncio.create_task(client.post(path)) for _ in range(heavy)]
+    await asyncio.sleep(0)  # let the heavy calls start first
+
+    latencies = await light_latencies(client)
+    responses = await asyncio.gather(*heavy_calls)
+
+    return {
+        "p50": statistics.median(latencies),
+        "p95": statistics.quantiles(latencies, n=20)[-1],
+        "ok": sum(r.status_code == 200 for r in responses),
+        "busy": sum(r.status_code == 503 for r in responses),
+    }
+
+
+async def test_executor_load():
+    """Compare lightweight latency with and without the executor"""
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        print("🧪 Inference executor load test\n")
+
+        results = {}
+        for path in ("/transcribe", "/transcribe/blocking"):
+            print(f"📝 Heavy endpoint: {path}")
+            for heavy in HEAVY_LEVELS:
+                if path.endswith("blocking") and heavy > 16:
+                    continue  # would take minutes, the point is already made
+                result = await run_level(client, heavy, path)
+                results[(path, heavy)] = result
+                print(
+                    f"   heavy={heavy:>3}  ping p50={result['p50']:7.1f}ms  p95={result['p95']:7.1f}ms  "
+                    f"ok={result['ok']:>3}  503={result['busy']:>3}"
+                )
+            print("-" * 50)
+
+        print(f"Executor stats: {inference_executor.get_stats()}")
+
+    baseline = results[("/transcribe", 0)]["p95"]
+    loaded = max(results[("/transcribe", heavy)]["p95"] for heavy in HEAVY_LEVELS)
+    blocked = results[("/transcribe/blocking", 16)]["p95"]
+
+    assert loaded < max(10 * baseline, 50), f"Latency grew under load: {baseline:.1f}ms -> {loaded:.1f}ms"
+    assert results[("/transcribe", 64)]["busy"] > 0, "A saturated model should answer 503"
+    assert blocked > STUB_MODEL_SECONDS * 1000, "Blocking baseline should stall the event loop"
+
+    print(f"\n✅ Lightweight p95 stays flat: {baseline:.1f}ms idle, {loaded:.1f}ms at worst under load "
+          f"(blocking baseline: {blocked:.1f}ms)")
+
+    inference_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_executor_load())
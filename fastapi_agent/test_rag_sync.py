@@ -0,0 +1,120 @@
+"""
+Incremental sync test for the RAG service using an in-memory collection
+
+Only new and changed drugs are embedded (upserted), removed drugs are deleted and
+unchanged drugs are left alone. The content hash must match the one written by the
+Django export (market/tests.py uses the same sample drug and hash).
+
+Run: python test_rag_sync.py
+"""
+import asyncio
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import inference_executor
+from services import rag_service
+
+SAMPLE_DRUG = {
+    "id": 987654,
+    "name": "بانادول اكسترا",
+    "e_name": "Panadol Extra",
+    "company": "جلاكسو",
+    "company_english": "GSK",
+    "category": "مسكنات",
+    "category_english": "Painkillers",
+    "public_price": "45.50",
+    "effective_material": "Paracetamol",
+    "letter": "P",
+    "shape": "اقراص",
+    "needed": False,
+    "is_illegal": False,
+    "fridge": False,
+}
+SAMPLE_HASH = "77f2e73a7dbac46d60a3268a5ba9cb8f6c8710fd"
+
+
+class FakeCollection:
+    """Stands in for the ChromaDB collection, records what gets embedded"""
+
+    def __init__(self):
+        self.documents = {}
+        self.upserted = []
+        self.deleted = []
+
+    def get(self, include=None):
+        ids = list(self.documents)
+        return {"ids": ids, "metadatas": [self.documents[doc_id]["metadata"] for doc_id in ids]}
+
+    def upsert(self, documents, metadatas, ids):
+        for doc_id, document, metadata in zip(ids, documents, metadatas):
+            self.documents[doc_id] = {"document": document, "metadata": metadata}
+        self.upserted.extend(ids)
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.documents.pop(doc_id, None)
+        self.deleted.extend(ids)
+
+
+def exported(drug):
+    """A drug as written by the Django export"""
+    return {**drug, "content_hash": rag_service.get_content_hash(drug)}
+
+
+async def sync(collection, drugs):
+    collection.upserted, collection.deleted = [], []
+    return await rag_service.sync_drugs(drugs)
+
+
+async def test_rag_sync():
+    print("=" * 60)
+    print("RAG incremental sync")
+    print("=" * 60)
+
+    assert rag_service.get_content_hash(SAMPLE_DRUG) == SAMPLE_HASH, "Hash differs from the Django export"
+    assert rag_service.get_content_hash(exported(SAMPLE_DRUG)) == SAMPLE_HASH, "content_hash must not be hashed"
+
+    collection = FakeCollection()
+    rag_service._collection = collection
+
+    brufen = {**SAMPLE_DRUG, "id": 987655, "name": "بروفين", "e_name": "Brufen", "public_price": "30.00"}
+    drugs = [exported(SAMPLE_DRUG), exported(brufen)]
+
+    stats = await sync(collection, drugs)
+    print(f"Initial sync: {stats}")
+    assert stats == {"created": 2, "updated": 0, "deleted": 0, "unchanged": 0}
+    assert sorted(collection.upserted) == ["987654", "987655"]
+    assert collection.documents["987654"]["metadata"]["content_hash"] == SAMPLE_HASH
+
+    stats = await sync(collection, drugs)
+    print(f"Same catalog: {stats}")
+    assert stats == {"created": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+    assert collection.upserted == [] and collection.deleted == [], "Unchanged drugs must not be embedded again"
+
+    # Older exports have no content_hash, the agent hashes the drug itself
+    stats = await sync(collection, [SAMPLE_DRUG, brufen])
+    print(f"Catalog without hashes: {stats}")
+    assert stats == {"created": 0, "updated": 0, "deleted": 0, "unchanged": 2}
+    assert collection.upserted == []
+
+    augmentin = {**SAMPLE_DRUG, "id": 987656, "name": "اوجمنتين", "e_name": "Augmentin", "public_price": "80.00"}
+    drugs = [exported({**SAMPLE_DRUG, "public_price": "50.00"}), exported(augmentin)]
+
+    stats = await sync(collection, drugs)
+    print(f"Price change, new and removed drug: {stats}")
+    assert stats == {"created": 1, "updated": 1, "deleted": 1, "unchanged": 0}
+    assert sorted(collection.upserted) == ["987654", "987656"]
+    assert collection.deleted == ["987655"]
+    assert sorted(collection.documents) == ["987654", "987656"]
+    assert collection.documents["987654"]["metadata"]["price"] == 50.0
+
+    print("\n✅ Only new, changed and removed drugs reach the collection")
+
+    inference_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(test_rag_sync())
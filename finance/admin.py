@@ -1,5 +1,6 @@
 from django.contrib import admin
 from core.admin.abstract_admin import DefaultBaseAdminItems
+from core.views.abstract_paginations import EstimatedCountPaginator
 from finance.models import Account, AccountTransaction, PurchasePayment, SalePayment, Expense
 
 
@@ -20,6 +21,8 @@ class AccountTransactionModelAdmin(DefaultBaseAdminItems):
     autocomplete_fields = ["account"]
     list_select_related = ["account"]
     date_hierarchy = "at"
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(PurchasePayment)
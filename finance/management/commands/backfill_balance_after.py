@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from finance.utils import backfill_balance_after
+
+
+class Command(BaseCommand):
+    help = 'حساب رصيد ما بعد المعاملة لكل معاملات الحسابات | Backfill balance_after of account transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account',
+            type=int,
+            action='append',
+            dest='accounts',
+            help='Only backfill this account id (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of transactions written per update'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            updated = backfill_balance_after(options['accounts'], batch_size=options['batch_size'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated balance_after for {updated} transactions')
+        )
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from finance.models import Account, AccountTransaction
+from finance.utils import iter_balance_after_mismatches
+
+
+class Command(BaseCommand):
+    help = 'التحقق من رصيد ما بعد المعاملة | Check balance_after of account transactions against their amounts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--account',
+            type=int,
+            action='append',
+            dest='accounts',
+            help='Only check this account id (can be repeated)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Maximum number of mismatches to list'
+        )
+
+    def handle(self, *args, **options):
+        accounts = options['accounts']
+        limit = options['limit']
+
+        mismatches = 0
+        for transaction_id, stored, expected in iter_balance_after_mismatches(accounts):
+            mismatches += 1
+            if mismatches <= limit:
+                self.stdout.write(f'Transaction #{transaction_id}: stored {stored}, expected {expected}')
+
+        # The balance after the last transaction of an account should be its current balance
+        last_balance_after = (
+            AccountTransaction.objects.filter(account=models.OuterRef('pk'))
+            .order_by('-at', '-id')
+            .values('balance_after')[:1]
+        )
+        account_queryset = Account.objects.annotate(last_balance_after=models.Subquery(last_balance_after))
+        if accounts:
+            account_queryset = account_queryset.filter(pk__in=accounts)
+
+        account_queryset = account_queryset.exclude(last_balance_after__isnull=True).exclude(
+            last_balance_after=models.F('balance')
+        )
+
+        account_mismatches = 0
+        for account in account_queryset.iterator():
+            account_mismatches += 1
+            if account_mismatches <= limit:
+                self.stdout.write(
+                    f'Account #{account.pk}: balance {account.balance}, last balance_after {account.last_balance_after}'
+                )
+
+        if mismatches or account_mismatches:
+            raise CommandError(
+                f'{mismatches} transactions and {account_mismatches} accounts are out of sync, '
+                'run backfill_balance_after to repair the transactions'
+            )
+
+        self.stdout.write(self.style.SUCCESS('All transaction balances are consistent'))
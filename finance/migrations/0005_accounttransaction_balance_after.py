@@ -0,0 +1,22 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0004_expense'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounttransaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=20, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='accounttransaction',
+            index=models.Index(fields=['account', 'at', 'id'], name='account_txn_statement_idx'),
+        ),
+    ]
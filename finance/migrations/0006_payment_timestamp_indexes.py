@@ -0,0 +1,21 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0005_accounttransaction_balance_after'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchasepayment',
+            index=models.Index(fields=['timestamp'], name='purchase_payment_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salepayment',
+            index=models.Index(fields=['timestamp'], name='sale_payment_timestamp_idx'),
+        ),
+    ]
@@ -66,13 +66,19 @@ class AccountTransaction(models.Model):
     object_id = models.PositiveBigIntegerField(null=True, blank=True)
     related_object = GenericForeignKey("content_type", "object_id")
     at = models.DateTimeField()
+    # رصيد الحساب بعد هذه المعاملة (بترتيب at ثم id)
+    balance_after = models.DecimalField(max_digits=20, decimal_places=2, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.account} | {self.type} | {self.amount} | {self.at}"
 
     class Meta:
-        indexes = [models.Index(fields=["account"]), models.Index(fields=["content_type", "object_id"])]
+        indexes = [
+            models.Index(fields=["account"]),
+            models.Index(fields=["content_type", "object_id"]),
+            models.Index(fields=["account", "at", "id"], name="account_txn_statement_idx"),
+        ]
         ordering = ["-at"]
 
 
@@ -95,7 +101,10 @@ class PurchasePayment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        indexes = [models.Index(fields=["user"])]
+        indexes = [
+            models.Index(fields=["user"]),
+            models.Index(fields=["timestamp"], name="purchase_payment_timestamp_idx"),
+        ]
         ordering = ["-at"]
 
     @property
@@ -130,7 +139,10 @@ class SalePayment(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        indexes = [models.Index(fields=["user"])]
+        indexes = [
+            models.Index(fields=["user"]),
+            models.Index(fields=["timestamp"], name="sale_payment_timestamp_idx"),
+        ]
         ordering = ["-at"]
 
     @property
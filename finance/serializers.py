@@ -283,7 +283,7 @@ class UserFinancialSummarySerializer(BaseSerializer):
     user_name = serializers.CharField(read_only=True)
     username = serializers.CharField(read_only=True)
     role = serializers.CharField(read_only=True)
-    role_label = serializers.CharField(read_only=True)
+    role_label = serializers.CharField(source="get_role_display", read_only=True)
     
     # Purchase & Sale Totals
     total_purchases = serializers.DecimalField(max_digits=20, decimal_places=2, read_only=True)
@@ -1,3 +1,166 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.choices import Role
+from finance.choices import AccountTransactionTypeChoice, PaymentMethodChoice
+from finance.models import Account, AccountTransaction, PurchasePayment, SalePayment
+from finance.utils import (
+    backfill_balance_after,
+    create_transaction,
+    delete_trasaction,
+    iter_balance_after_mismatches,
+    update_transaction,
+)
+from invoices.models import PurchaseInvoice, PurchaseReturnInvoice, SaleInvoice, SaleReturnInvoice
+
+User = get_user_model()
+
+
+class BalanceAfterTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="+201000000002", name="Pharmacy", role=Role.STORE)
+        self.account, _ = Account.objects.get_or_create(user=user)
+        self.now = timezone.now()
+
+    def add(self, type, amount, days_ago):
+        return create_transaction(
+            {
+                "account": self.account,
+                "type": type,
+                "amount": Decimal(amount),
+                "at": self.now - timedelta(days=days_ago),
+            }
+        )
+
+    def balances(self):
+        return list(
+            AccountTransaction.objects.filter(account=self.account)
+            .order_by("at", "id")
+            .values_list("balance_after", flat=True)
+        )
+
+    def assertConsistent(self):
+        self.account.refresh_from_db()
+        self.assertEqual(list(iter_balance_after_mismatches([self.account])), [])
+        self.assertEqual(self.balances()[-1], self.account.balance)
+
+    def test_balance_after_follows_changes(self):
+        purchase = self.add(AccountTransactionTypeChoice.PURCHASE_INVOICE, "100.00", days_ago=3)
+        self.add(AccountTransactionTypeChoice.PURCHASE_PAYMENT, "40.00", days_ago=1)
+        self.assertEqual(self.balances(), [Decimal("100.00"), Decimal("60.00")])
+
+        # A backdated transaction shifts the balances after it
+        self.add(AccountTransactionTypeChoice.SALE_RETURN, "10.00", days_ago=2)
+        self.assertEqual(self.balances(), [Decimal("100.00"), Decimal("110.00"), Decimal("70.00")])
+        self.assertConsistent()
+
+        update_transaction(purchase, Decimal("150.00"))
+        self.assertEqual(purchase.balance_after, Decimal("150.00"))
+        self.assertEqual(self.balances(), [Decimal("150.00"), Decimal("160.00"), Decimal("120.00")])
+        self.assertConsistent()
+
+        delete_trasaction(purchase)
+        self.assertEqual(self.balances(), [Decimal("10.00"), Decimal("-30.00")])
+        self.assertConsistent()
+
+    def test_backfill_repairs_balances(self):
+        self.add(AccountTransactionTypeChoice.PURCHASE_INVOICE, "100.00", days_ago=2)
+        self.add(AccountTransactionTypeChoice.SALE_PAYMENT, "25.00", days_ago=1)
+        AccountTransaction.objects.update(balance_after=None)
+
+        self.assertEqual(len(list(iter_balance_after_mismatches())), 2)
+        self.assertEqual(backfill_balance_after(), 2)
+        self.assertEqual(self.balances(), [Decimal("100.00"), Decimal("125.00")])
+        self.assertConsistent()
+
+
+class UserFinancialSummaryAPIViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username="+201000000099", name="Admin", role=Role.MANAGER, is_superuser=True)
+        )
+        self.users = 0
+
+    def create_user(self, purchases=(), sales=(), purchase_returns=(), sale_returns=(), paid=(), received=()):
+        self.users += 1
+        user = User.objects.create_user(username=f"+20100000{self.users:04d}", name=f"User {self.users}", role=Role.STORE)
+        Account.objects.get_or_create(user=user)
+        invoice = {"items_count": 1, "total_quantity": 1}
+
+        for total_price in purchases:
+            PurchaseInvoice.objects.create(user=user, total_price=Decimal(total_price), **invoice)
+        for total_price in sales:
+            SaleInvoice.objects.create(user=user, total_price=Decimal(total_price), **invoice)
+        for total_price in purchase_returns:
+            PurchaseReturnInvoice.objects.create(user=user, total_price=Decimal(total_price), **invoice)
+        for total_price in sale_returns:
+            SaleReturnInvoice.objects.create(user=user, total_price=Decimal(total_price), **invoice)
+        for amount in paid:
+            PurchasePayment.objects.create(user=user, method=PaymentMethodChoice.CASH, amount=Decimal(amount), at=timezone.now())
+        for amount in received:
+            SalePayment.objects.create(user=user, method=PaymentMethodChoice.CASH, amount=Decimal(amount), at=timezone.now())
+
+        return user
+
+    def get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("finance:user-financial-summary-view"), {"ps": 50})
+
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_totals_per_user(self):
+        small = self.create_user(purchases=["100.00"], paid=["40.00"])
+        big = self.create_user(
+            purchases=["300.00", "200.00"],
+            sales=["150.00"],
+            purchase_returns=["50.00"],
+            sale_returns=["25.00"],
+            paid=["100.00", "60.00"],
+            received=["70.00"],
+        )
+        idle = self.create_user()
+
+        data, _ = self.get()
+        results = {row["user_id"]: row for row in data["results"]}
+
+        self.assertEqual([row["user_id"] for row in data["results"]], [big.pk, small.pk, idle.pk])
+        self.assertEqual(
+            {name: Decimal(value) for name, value in results[big.pk].items() if name.startswith("total_")},
+            {
+                "total_purchases": Decimal("500.00"),
+                "total_sales": Decimal("150.00"),
+                "total_purchase_returns": Decimal("50.00"),
+                "total_sale_returns": Decimal("25.00"),
+                "total_cash_paid": Decimal("160.00"),
+                "total_cash_received": Decimal("70.00"),
+            },
+        )
+        self.assertEqual(Decimal(results[big.pk]["transaction_volume"]), Decimal("575.00"))
+        self.assertEqual(Decimal(results[small.pk]["transaction_volume"]), Decimal("100.00"))
+        self.assertEqual(Decimal(results[idle.pk]["total_purchases"]), Decimal("0.00"))
+        self.assertEqual(results[big.pk]["role_label"], big.get_role_display())
+
+        self.assertEqual(data["grand_totals"]["total_purchases"], Decimal("600.00"))
+        self.assertEqual(data["grand_totals"]["total_cash_paid"], Decimal("200.00"))
+        self.assertEqual(data["grand_totals"]["total_transaction_volume"], Decimal("675.00"))
+
+    def test_queries_do_not_grow_with_users(self):
+        self.create_user(purchases=["100.00"], sales=["50.00"], paid=["10.00"])
+        _, small = self.get()
+
+        for _ in range(5):
+            self.create_user(purchases=["100.00"], sale_returns=["5.00"], received=["20.00"])
+        data, large = self.get()
 
-# Create your tests here.
+        self.assertEqual(len(data["results"]), 6)
+        self.assertEqual(small, large)
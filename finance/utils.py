@@ -18,6 +18,99 @@ def get_arithmatic_operation(transaction):
         return "subtract"
 
 
+def get_signed_amount(transaction, amount=None):
+    """
+    The amount of the transaction with the sign it has on the account balance.
+    """
+    if amount is None:
+        amount = transaction.amount
+
+    if get_arithmatic_operation(transaction) == "add":
+        return amount
+    return -amount
+
+
+def get_signed_amount_expression():
+    """
+    SQL equivalent of `get_signed_amount` for `AccountTransaction` querysets.
+    """
+    return models.Case(
+        models.When(type__in=POSTIVE_AFFECTING_TRANSACTIONS, then=models.F("amount")),
+        default=-models.F("amount"),
+        output_field=models.DecimalField(max_digits=20, decimal_places=2),
+    )
+
+
+def get_running_balances(queryset=None):
+    """
+    Annotate transactions with `running_balance`, the balance of their account right after
+    each one of them, computed from the amounts with a single window function.
+    """
+    AccountTransaction = get_model("finance", "AccountTransaction")
+
+    if queryset is None:
+        queryset = AccountTransaction.objects.all()
+
+    return queryset.annotate(
+        running_balance=models.Window(
+            expression=models.Sum(get_signed_amount_expression()),
+            partition_by=[models.F("account_id")],
+            order_by=[models.F("at").asc(), models.F("id").asc()],
+        )
+    ).order_by("account_id", "at", "id")
+
+
+def get_following_transactions(transaction, include_self=False):
+    """
+    Transactions of the same account that come after `transaction` in statement order (`at`, `id`).
+    """
+    AccountTransaction = get_model("finance", "AccountTransaction")
+
+    following = models.Q(at__gt=transaction.at) | models.Q(at=transaction.at, pk__gt=transaction.pk)
+    if include_self:
+        following |= models.Q(pk=transaction.pk)
+
+    return AccountTransaction.objects.filter(following, account_id=transaction.account_id)
+
+
+def shift_balance_after(transaction, delta, include_self=False):
+    if delta:
+        get_following_transactions(transaction, include_self=include_self).update(
+            balance_after=models.F("balance_after") + delta
+        )
+
+
+def affect_balance_after(operation, transaction, old_amount=None):
+    """
+    Keep the materialized `balance_after` of the account transactions consistent.
+    Only the changed transaction and the ones after it are touched, with one update.
+    """
+    AccountTransaction = get_model("finance", "AccountTransaction")
+
+    if operation == "add":
+        preceding = models.Q(at__lt=transaction.at) | models.Q(at=transaction.at, pk__lt=transaction.pk)
+        previous_balance = (
+            AccountTransaction.objects.filter(preceding, account_id=transaction.account_id)
+            .order_by("-at", "-id")
+            .values_list("balance_after", flat=True)
+            .first()
+        )
+        signed_amount = get_signed_amount(transaction)
+
+        transaction.balance_after = (previous_balance or 0) + signed_amount
+        transaction.save(update_fields=["balance_after"])
+        shift_balance_after(transaction, signed_amount)
+
+    elif operation == "update":
+        if old_amount is not None:
+            delta = get_signed_amount(transaction) - get_signed_amount(transaction, old_amount)
+            shift_balance_after(transaction, delta, include_self=True)
+            transaction.refresh_from_db(fields=["balance_after"])
+
+    elif operation == "remove":
+        shift_balance_after(transaction, -get_signed_amount(transaction))
+
+
 def affect_account(account, operation, transaction, old_amount=None):
     arethmatic_operation = get_arithmatic_operation(transaction)
 
@@ -40,6 +133,8 @@ def affect_account(account, operation, transaction, old_amount=None):
         else:
             account.balance += transaction.amount
 
+    affect_balance_after(operation, transaction, old_amount)
+
     if account.credit_limit is not None:
         account.remaining_credit = account.credit_limit + account.balance
     else:
@@ -171,3 +266,44 @@ def delete_payment(payment, update_account=True):
             delete_trasaction(transaction)
 
     payment.delete()
+
+
+def iter_balance_after_mismatches(accounts=None, chunk_size=2000):
+    """
+    Yield `(transaction_id, stored, expected)` for every transaction whose stored
+    `balance_after` differs from the balance recomputed from the amounts.
+    """
+    AccountTransaction = get_model("finance", "AccountTransaction")
+    queryset = AccountTransaction.objects.all()
+
+    if accounts is not None:
+        queryset = queryset.filter(account__in=accounts)
+
+    transactions = get_running_balances(queryset).values_list("id", "balance_after", "running_balance")
+
+    for transaction_id, stored, expected in transactions.iterator(chunk_size=chunk_size):
+        if stored != expected:
+            yield transaction_id, stored, expected
+
+
+def backfill_balance_after(accounts=None, batch_size=1000):
+    """
+    Recompute and store `balance_after` for every transaction that is missing or out of sync.
+    Returns the number of updated transactions.
+    """
+    AccountTransaction = get_model("finance", "AccountTransaction")
+
+    updated = 0
+    batch = []
+
+    for transaction_id, _, expected in iter_balance_after_mismatches(accounts):
+        batch.append(AccountTransaction(pk=transaction_id, balance_after=expected))
+
+        if len(batch) >= batch_size:
+            updated += AccountTransaction.objects.bulk_update(batch, ["balance_after"])
+            batch = []
+
+    if batch:
+        updated += AccountTransaction.objects.bulk_update(batch, ["balance_after"])
+
+    return updated
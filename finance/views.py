@@ -3,13 +3,16 @@ from rest_framework.generics import ListAPIView, CreateAPIView, UpdateAPIView, D
 from rest_framework import filters
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.apps import apps
 from django.contrib.auth import get_user_model
 from accounts.permissions import *
-from core.views.mixins import PDFFileMixin
+from core.views.abstract_paginations import EstimatedCountPagination
 from core.views.renderers import PDFRenderer
+from exports.choices import ExportJobKindChoice
+from exports.mixins import PDFExportJobMixin
 from django.utils.translation import activate
-from finance.choices import NEGATIVE_AFFECTING_TRANSACTIONS, POSTIVE_AFFECTING_TRANSACTIONS, SafeTransactionTypeChoice
+from finance.choices import SafeTransactionTypeChoice
 from finance.filters import AccountTransactionFilter, PurchasePaymentFilter, SalePaymentFilter
 from finance.models import Account, AccountTransaction, PurchasePayment, SafeTransaction, SalePayment, Expense
 from finance.serializers import (
@@ -65,6 +68,7 @@ class AccountUpdateAPIView(UpdateAPIView):
 class AccountTransactionListAPIView(ListAPIView):
     permission_classes = [StaffRoleAuthentication]
     serializer_class = AccountTransactionReadSerializer
+    pagination_class = EstimatedCountPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = AccountTransactionFilter
     ordering = ("-at",)
@@ -103,82 +107,16 @@ class AccountTransactionListAPIView(ListAPIView):
     
     def list(self, request, *args, **kwargs):
         """
-        Override list to add running balance calculation
+        Newest transactions first, each one with the stored balance of its account after it
         """
-        from finance.choices import NEGATIVE_AFFECTING_TRANSACTIONS, POSTIVE_AFFECTING_TRANSACTIONS
-        
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Get account from query params to calculate running balance
-        account_id = request.query_params.get('account', None)
-        user_id = request.query_params.get('user', None)
-        
-        # Order by date (oldest first) to calculate running balance
-        transactions = queryset.order_by('at', 'id')
-        
-        # Calculate running balance if filtering by specific account/user
-        if account_id or user_id:
-            # Get the account
-            account = None
-            if account_id:
-                try:
-                    account = Account.objects.get(pk=account_id)
-                except Account.DoesNotExist:
-                    pass
-            elif user_id:
-                try:
-                    from django.contrib.auth import get_user_model
-                    User = get_user_model()
-                    user_obj = User.objects.get(pk=user_id)
-                    account = getattr(user_obj, 'account', None)
-                except:
-                    pass
-            
-            if account:
-                # Get all transactions for this account ordered by date
-                all_transactions = AccountTransaction.objects.filter(
-                    account=account
-                ).order_by('at', 'id')
-                
-                # Calculate running balance for each transaction
-                running_balance = Decimal('0.00')
-                transaction_balances = {}
-                
-                for txn in all_transactions:
-                    # Determine if this transaction increases or decreases balance
-                    if txn.type in NEGATIVE_AFFECTING_TRANSACTIONS:
-                        running_balance -= txn.amount
-                    elif txn.type in POSTIVE_AFFECTING_TRANSACTIONS:
-                        running_balance += txn.amount
-                    
-                    transaction_balances[txn.id] = running_balance
-                
-                # Add balance_after to each transaction in queryset
-                transactions_list = list(transactions)
-                for txn in transactions_list:
-                    txn.balance_after = transaction_balances.get(txn.id, Decimal('0.00'))
-                
-                # Reverse to show newest first
-                transactions_list.reverse()
-                
-                # Paginate if needed
-                page = self.paginate_queryset(transactions_list)
-                if page is not None:
-                    serializer = self.get_serializer(page, many=True)
-                    return self.get_paginated_response(serializer.data)
-                
-                serializer = self.get_serializer(transactions_list, many=True)
-                return Response(serializer.data)
-        
-        # If no specific account, return without running balance
-        # Order by newest first for display
-        transactions = queryset.order_by('-at', '-id')
-        page = self.paginate_queryset(transactions)
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-at', '-id')
+
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(transactions, many=True)
+
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
@@ -788,7 +726,7 @@ class AccountsPayableAPIView(GenericAPIView):
         })
 
 
-class AccountStatementPDFAPIView(PDFFileMixin, GenericAPIView):
+class AccountStatementPDFAPIView(PDFExportJobMixin, GenericAPIView):
     """
     طباعة كشف الحساب PDF
     Account Statement PDF Export
@@ -801,8 +739,9 @@ class AccountStatementPDFAPIView(PDFFileMixin, GenericAPIView):
     renderer_classes = [PDFRenderer]
     serializer_class = AccountStatementPDFSerializer
     template_name = "finance/pdf/account_statement.html"
+    export_kind = ExportJobKindChoice.ACCOUNT_STATEMENT_PDF
     
-    def get_template_context(self):
+    def get_template_context(self, request=None):
         return {
             "timestamp": timezone.now().strftime("%d-%m-%Y %H:%M"),
             "customer_name": self.customer_name,
@@ -815,8 +754,6 @@ class AccountStatementPDFAPIView(PDFFileMixin, GenericAPIView):
         return f"Account Statement - {self.customer_name} - {NOW}.pdf"
     
     def get(self, request, *args, **kwargs):
-        from finance.choices import NEGATIVE_AFFECTING_TRANSACTIONS, POSTIVE_AFFECTING_TRANSACTIONS
-        
         activate("ar")
         
         # Get user_id from query params
@@ -874,34 +811,23 @@ class AccountStatementPDFAPIView(PDFFileMixin, GenericAPIView):
         if type_filter:
             queryset = queryset.filter(type=type_filter)
         
-        # Order by date (oldest first) for running balance calculation
-        transactions = queryset.order_by('at', 'id')
+        # Newest first, the running balance is stored on each transaction
+        transactions = queryset.prefetch_related('related_object').order_by('-at', '-id')
         
-        # Calculate running balance
-        running_balance = Decimal('0.00')
         statement_data = []
         
         for txn in transactions:
-            # Determine if this transaction increases or decreases balance
-            if txn.type in NEGATIVE_AFFECTING_TRANSACTIONS:
-                running_balance -= txn.amount
-            elif txn.type in POSTIVE_AFFECTING_TRANSACTIONS:
-                running_balance += txn.amount
-            
             statement_data.append({
                 'transaction_date': txn.at.strftime("%Y-%m-%d %H:%M"),
                 'type_label': txn.get_type_display(),
                 'amount': txn.amount,
-                'balance_after': running_balance,
+                'balance_after': txn.balance_after,
                 'remarks': getattr(txn.related_object, 'remarks', '') if txn.related_object else '',
             })
         
-        # Reverse to show newest first in PDF
-        statement_data.reverse()
-        
         # Serialize
         serializer = self.get_serializer(statement_data, many=True)
-        return Response(serializer.data)
+        return self.export_pdf(serializer.data)
 
 
 class UserFinancialSummaryAPIView(GenericAPIView):
@@ -975,143 +901,105 @@ class UserFinancialSummaryAPIView(GenericAPIView):
                 case _:
                     users = users.none()
         
-        # Build financial summary data
-        summary_data = []
-        
-        # Import invoice models
+        # Only users with an account have a financial summary
+        users = users.filter(account__isnull=False)
+
+        date_from = self.parse_date(date_from)
+        date_to = self.parse_date(date_to)
+
+        # Every total is a correlated subquery aggregated per user, so the whole
+        # summary (including sorting and pagination) is a single query.
         PurchaseInvoice = get_model('invoices', 'PurchaseInvoice')
         SaleInvoice = get_model('invoices', 'SaleInvoice')
         PurchaseReturnInvoice = get_model('invoices', 'PurchaseReturnInvoice')
         SaleReturnInvoice = get_model('invoices', 'SaleReturnInvoice')
-        
-        for user_obj in users:
-            # Skip if no account
-            if not hasattr(user_obj, 'account'):
-                continue
-            
-            account = user_obj.account
-            
-            # Base querysets with date filtering
-            purchase_invoices = PurchaseInvoice.objects.filter(user=user_obj)
-            sale_invoices = SaleInvoice.objects.filter(user=user_obj)
-            purchase_returns = PurchaseReturnInvoice.objects.filter(user=user_obj)
-            sale_returns = SaleReturnInvoice.objects.filter(user=user_obj)
-            purchase_payments = PurchasePayment.objects.filter(user=user_obj)
-            sale_payments = SalePayment.objects.filter(user=user_obj)
-            
-            # Apply date filters
-            if date_from:
-                try:
-                    date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-                    purchase_invoices = purchase_invoices.filter(created_at__date__gte=date_from_obj)
-                    sale_invoices = sale_invoices.filter(created_at__date__gte=date_from_obj)
-                    purchase_returns = purchase_returns.filter(created_at__date__gte=date_from_obj)
-                    sale_returns = sale_returns.filter(created_at__date__gte=date_from_obj)
-                    purchase_payments = purchase_payments.filter(at__date__gte=date_from_obj)
-                    sale_payments = sale_payments.filter(at__date__gte=date_from_obj)
-                except ValueError:
-                    pass
-            
-            if date_to:
-                try:
-                    date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-                    purchase_invoices = purchase_invoices.filter(created_at__date__lte=date_to_obj)
-                    sale_invoices = sale_invoices.filter(created_at__date__lte=date_to_obj)
-                    purchase_returns = purchase_returns.filter(created_at__date__lte=date_to_obj)
-                    sale_returns = sale_returns.filter(created_at__date__lte=date_to_obj)
-                    purchase_payments = purchase_payments.filter(at__date__lte=date_to_obj)
-                    sale_payments = sale_payments.filter(at__date__lte=date_to_obj)
-                except ValueError:
-                    pass
-            
-            # Calculate totals
-            total_purchases = purchase_invoices.aggregate(
-                total=models.Sum('total_price')
-            )['total'] or Decimal('0.00')
-            
-            total_sales = sale_invoices.aggregate(
-                total=models.Sum('total_price')
-            )['total'] or Decimal('0.00')
-            
-            total_purchase_returns = purchase_returns.aggregate(
-                total=models.Sum('total_price')
-            )['total'] or Decimal('0.00')
-            
-            total_sale_returns = sale_returns.aggregate(
-                total=models.Sum('total_price')
-            )['total'] or Decimal('0.00')
-            
-            total_cash_paid = purchase_payments.aggregate(
-                total=models.Sum('amount')
-            )['total'] or Decimal('0.00')
-            
-            total_cash_received = sale_payments.aggregate(
-                total=models.Sum('amount')
-            )['total'] or Decimal('0.00')
-            
-            # Calculate transaction volume
+
+        totals = {
+            'total_purchases': (PurchaseInvoice, 'total_price', 'created_at'),
+            'total_sales': (SaleInvoice, 'total_price', 'created_at'),
+            'total_purchase_returns': (PurchaseReturnInvoice, 'total_price', 'created_at'),
+            'total_sale_returns': (SaleReturnInvoice, 'total_price', 'created_at'),
+            'total_cash_paid': (PurchasePayment, 'amount', 'at'),
+            'total_cash_received': (SalePayment, 'amount', 'at'),
+        }
+
+        users = users.annotate(
+            **{
+                name: self.get_total_subquery(model, field, date_field, date_from, date_to)
+                for name, (model, field, date_field) in totals.items()
+            }
+        ).annotate(
             # حجم التعامل = المشتريات + المبيعات - المرتجعات
-            transaction_volume = (
-                total_purchases + total_sales - 
-                total_purchase_returns - total_sale_returns
-            )
-            
-            # Apply minimum volume filter
-            if min_volume:
-                try:
-                    min_volume_decimal = Decimal(min_volume)
-                    if transaction_volume < min_volume_decimal:
-                        continue
-                except (ValueError, TypeError):
-                    pass
-            
-            # Get role label
+            transaction_volume=(
+                models.F('total_purchases') + models.F('total_sales')
+                - models.F('total_purchase_returns') - models.F('total_sale_returns')
+            ),
+            user_id=models.F('id'),
+            user_name=models.F('name'),
+            current_balance=models.F('account__balance'),
+        )
+
+        # Apply minimum volume filter
+        if min_volume:
             try:
-                role_label = user_obj.get_role_display()
-            except Exception:
-                role_label = user_obj.role
-            
-            entry = {
-                'user_id': user_obj.id,
-                'user_name': user_obj.name,
-                'username': str(user_obj.username),
-                'role': user_obj.role,
-                'role_label': role_label,
-                'total_purchases': total_purchases,
-                'total_sales': total_sales,
-                'total_purchase_returns': total_purchase_returns,
-                'total_sale_returns': total_sale_returns,
-                'total_cash_paid': total_cash_paid,
-                'total_cash_received': total_cash_received,
-                'transaction_volume': transaction_volume,
-                'current_balance': account.balance,
-            }
-            
-            summary_data.append(entry)
-        
+                users = users.filter(transaction_volume__gte=Decimal(min_volume))
+            except (ArithmeticError, ValueError, TypeError):
+                pass
+
         # Sort by transaction volume (descending)
-        summary_data.sort(key=lambda x: x['transaction_volume'], reverse=True)
-        
+        users = users.order_by('-transaction_volume', 'id')
+
         # Calculate grand totals
         grand_totals = {
-            'total_purchases': sum(x['total_purchases'] for x in summary_data),
-            'total_sales': sum(x['total_sales'] for x in summary_data),
-            'total_purchase_returns': sum(x['total_purchase_returns'] for x in summary_data),
-            'total_sale_returns': sum(x['total_sale_returns'] for x in summary_data),
-            'total_cash_paid': sum(x['total_cash_paid'] for x in summary_data),
-            'total_cash_received': sum(x['total_cash_received'] for x in summary_data),
-            'total_transaction_volume': sum(x['transaction_volume'] for x in summary_data),
+            name: value or Decimal('0.00')
+            for name, value in users.aggregate(
+                **{name: models.Sum(name) for name in totals},
+                total_transaction_volume=models.Sum('transaction_volume'),
+            ).items()
         }
-        
-        # Serialize data
-        serializer = self.get_serializer(summary_data, many=True)
-        
+
+        page = self.paginate_queryset(users)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            response.data['grand_totals'] = grand_totals
+            return response
+
+        serializer = self.get_serializer(users, many=True)
+
         return Response({
-            'count': len(summary_data),
+            'count': len(serializer.data),
             'grand_totals': grand_totals,
             'results': serializer.data
         })
 
+    @staticmethod
+    def parse_date(value):
+        if not value:
+            return None
+
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    @staticmethod
+    def get_total_subquery(model, field, date_field, date_from=None, date_to=None):
+        queryset = model.objects.filter(user=models.OuterRef('pk'))
+
+        if date_from:
+            queryset = queryset.filter(**{f'{date_field}__date__gte': date_from})
+        if date_to:
+            queryset = queryset.filter(**{f'{date_field}__date__lte': date_to})
+
+        total = queryset.order_by().values('user').annotate(total=models.Sum(field)).values('total')
+
+        return Coalesce(
+            models.Subquery(total, output_field=models.DecimalField(max_digits=20, decimal_places=2)),
+            models.Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=20, decimal_places=2),
+        )
+
 
 class MyAccountSummaryAPIView(GenericAPIView):
     """
@@ -1336,8 +1224,6 @@ class MyAccountStatementAPIView(GenericAPIView):
     serializer_class = AccountTransactionReadSerializer
     
     def get(self, request, *args, **kwargs):
-        from finance.choices import NEGATIVE_AFFECTING_TRANSACTIONS, POSTIVE_AFFECTING_TRANSACTIONS
-        
         user = request.user
         
         # Get user's account
@@ -1378,8 +1264,8 @@ class MyAccountStatementAPIView(GenericAPIView):
             except ValueError:
                 pass  # Invalid date format, skip filter
         
-        # Order by date (oldest first) for running balance calculation
-        transactions = queryset.order_by('at', 'id')
+        # Order by date (oldest first), the running balance is stored on each transaction
+        transactions = queryset.prefetch_related('related_object').order_by('at', 'id')
         
         # Apply limit if specified
         if limit:
@@ -1390,24 +1276,16 @@ class MyAccountStatementAPIView(GenericAPIView):
             except ValueError:
                 pass  # Invalid limit, ignore
         
-        # Calculate running balance
-        running_balance = Decimal('0.00')
         statement_data = []
         
         for txn in transactions:
-            # Determine if this transaction increases or decreases balance
-            if txn.type in NEGATIVE_AFFECTING_TRANSACTIONS:
-                running_balance -= txn.amount
-            elif txn.type in POSTIVE_AFFECTING_TRANSACTIONS:
-                running_balance += txn.amount
-            
             statement_data.append({
                 'id': txn.id,
                 'transaction_date': txn.at,
                 'type': txn.type,
                 'type_label': txn.get_type_display(),
                 'amount': txn.amount,
-                'balance_after': running_balance,
+                'balance_after': txn.balance_after,
                 'remarks': getattr(txn.related_object, 'remarks', '') if txn.related_object else '',
                 'related_object_type': txn.content_type.model if txn.content_type else None,
                 'related_object_id': txn.object_id,
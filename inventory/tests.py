@@ -1,3 +1,92 @@
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+
+from inventory.models import InventoryItem
+from inventory.utils import create_inventory_item, deduct_products_amounts, get_or_create_main_inventory
+from market.models import Category, Company, Product
+
+
+class DeductProductsAmountsTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        self.inventory = get_or_create_main_inventory()
+        self.products = [
+            Product.objects.create(
+                name=f"Product {index}",
+                e_name=f"Product {index}",
+                public_price=Decimal("100.00"),
+                company=company,
+                category=category,
+                shape="اقراص",
+            )
+            for index in range(3)
+        ]
+
+        # Two lots per product, the second one with the higher discount is consumed first
+        for product in self.products:
+            for discount in ("10.00", "20.00"):
+                self.add_lot(product, Decimal(discount), quantity=10)
+
+    def add_lot(self, product, discount, quantity):
+        price = (Decimal("100.00") * (1 - discount / 100)).quantize(Decimal("0.00"))
+        return create_inventory_item(
+            {
+                "inventory": self.inventory,
+                "product": product,
+                "purchase_discount_percentage": discount,
+                "purchase_price": price,
+                "selling_discount_percentage": discount,
+                "selling_price": price,
+                "quantity": quantity,
+                "remaining_quantity": quantity,
+                "purchase_sub_total": price * quantity,
+                "selling_sub_total": price * quantity,
+            }
+        )
+
+    def assertTotalsMatchItems(self):
+        self.inventory.refresh_from_db()
+        items = InventoryItem.objects.filter(inventory=self.inventory)
+        self.assertEqual(self.inventory.total_items, items.count())
+        self.assertEqual(self.inventory.total_quantity, sum(item.remaining_quantity for item in items))
+        self.assertEqual(self.inventory.total_purchase_price, sum(item.purchase_sub_total for item in items))
+        self.assertEqual(self.inventory.total_selling_price, sum(item.selling_sub_total for item in items))
+
+    def test_deducts_in_allocation_order_with_constant_queries(self):
+        first, second, third = self.products
+
+        with CaptureQueriesContext(connection) as queries:
+            deduct_products_amounts([(first, 4), (second, 12), (third.pk, 5), (third, 5)], self.inventory)
+
+        # lock + bulk update + delete (+ its cascade lookups) + totals update + refresh + products statistics
+        self.assertLessEqual(len(queries), 10)
+
+        remaining = dict(
+            InventoryItem.objects.filter(product=first).values_list("selling_discount_percentage", "remaining_quantity")
+        )
+        self.assertEqual(remaining, {Decimal("20.00"): 6, Decimal("10.00"): 10})
+
+        self.assertEqual(
+            list(InventoryItem.objects.filter(product=second).values_list("remaining_quantity", flat=True)), [8]
+        )
+        self.assertEqual(
+            list(InventoryItem.objects.filter(product=third).values_list("remaining_quantity", flat=True)), [10]
+        )
+        self.assertEqual(self.inventory.total_quantity, 60 - 26)
+        self.assertTotalsMatchItems()
+
+    def test_shortage_changes_nothing(self):
+        first, second, _ = self.products
+
+        with self.assertRaises(ValidationError) as context:
+            deduct_products_amounts([(first, 5), (second, 21)], self.inventory)
 
-# Create your tests here.
+        self.assertEqual(str(context.exception.detail["inventory_issues"][0]["shortage"]), "1")
+        self.assertEqual(InventoryItem.objects.filter(inventory=self.inventory).count(), 6)
+        self.assertEqual(sum(InventoryItem.objects.values_list("remaining_quantity", flat=True)), 60)
+        self.assertTotalsMatchItems()
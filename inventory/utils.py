@@ -1,8 +1,11 @@
+from collections import defaultdict
 from decimal import Decimal
 from django.apps import apps
+from django.db.models import F
 from rest_framework.exceptions import ValidationError
 
 from inventory.choices import InventoryTypeChoice
+from market.utils import affect_products_statistics
 
 get_model = apps.get_model
 
@@ -53,57 +56,127 @@ def affect_inventory(inventory, operation, item, old_quantity=None, old_purchase
     return inventory
 
 
-def deduct_product_amount(product, quantity, inventory=None):
+def deduct_products_amounts(products_quantities, inventory=None):
+    """
+    Deduct `(product, quantity)` pairs from the inventory lots in one locked pass.
+
+    All candidate lots of all products are locked with a single `select_for_update`, consumed in
+    allocation order (highest selling discount first, oldest lot first) in memory, then written
+    with one `bulk_update`, one delete and one update of the inventory totals.
+    Nothing is changed when any product is short.
+    """
+    Inventory = get_model("inventory", "Inventory")
+    InventoryItem = get_model("inventory", "InventoryItem")
+
     if inventory is None:
         inventory = get_or_create_main_inventory()
 
-    items = inventory.items.filter(product=product).order_by("-selling_discount_percentage")
-    total_available_quantity = sum(item.remaining_quantity for item in items)
+    products = {}
+    required = defaultdict(int)
+
+    for product, quantity in products_quantities:
+        product_id = getattr(product, "pk", product)
+        products.setdefault(product_id, product)
+        required[product_id] += quantity
+
+    required = {product_id: quantity for product_id, quantity in required.items() if quantity > 0}
+
+    if not required:
+        return inventory
+
+    lots = defaultdict(list)
+    for item in (
+        InventoryItem.objects.select_for_update()
+        .filter(inventory=inventory, product_id__in=required)
+        .order_by("product_id", "-selling_discount_percentage", "id")
+    ):
+        lots[item.product_id].append(item)
+
+    inventory_issues = []
+    for product_id, quantity in required.items():
+        available_quantity = sum(item.remaining_quantity for item in lots[product_id])
+
+        if available_quantity < quantity:
+            inventory_issues.append(
+                {
+                    "product_id": product_id,
+                    "required": quantity,
+                    "available": available_quantity,
+                    "shortage": quantity - available_quantity,
+                }
+            )
+
+    if inventory_issues:
+        product = products[inventory_issues[0]["product_id"]]
+        raise ValidationError(
+            {
+                "detail": f"Not enough quantity available for product {product}.",
+                "inventory_issues": inventory_issues,
+            }
+        )
 
-    if total_available_quantity < quantity:
-        raise ValidationError({"detail": f"Not enough quantity available for product {product}."})
+    updated_items = []
+    deleted_item_ids = []
+    deducted_quantities = defaultdict(int)
+    deducted_quantity = 0
+    deducted_purchase_price = Decimal("0.00")
+    deducted_selling_price = Decimal("0.00")
 
-    remaining_duction_quantity = quantity
-    item_index = 0
+    for product_id, quantity in required.items():
+        remaining_duction_quantity = quantity
 
-    while remaining_duction_quantity > 0:
-        item = items[item_index]
+        for item in lots[product_id]:
+            if remaining_duction_quantity == 0:
+                break
 
-        if item.remaining_quantity >= remaining_duction_quantity:
-            if item.remaining_quantity == remaining_duction_quantity:
-                affect_inventory(item.inventory, "remove", item)
-                item.delete()
+            if item.remaining_quantity <= remaining_duction_quantity:
+                remaining_duction_quantity -= item.remaining_quantity
+                deducted_quantities[product_id] += item.remaining_quantity
+                deducted_quantity += item.remaining_quantity
+                deducted_purchase_price += item.purchase_sub_total
+                deducted_selling_price += item.selling_sub_total
+                deleted_item_ids.append(item.pk)
 
             else:
-                old_quantity = item.remaining_quantity
-                old_purchase_price = item.purchase_sub_total
-                old_selling_price = item.selling_sub_total
+                purchase_price = Decimal(remaining_duction_quantity * item.purchase_price).quantize(Decimal("0.00"))
+                selling_price = Decimal(remaining_duction_quantity * item.selling_price).quantize(Decimal("0.00"))
 
                 item.remaining_quantity -= remaining_duction_quantity
-                item.purchase_sub_total -= Decimal(remaining_duction_quantity * item.purchase_price).quantize(
-                    Decimal("0.00")
-                )
-                item.selling_sub_total -= Decimal(remaining_duction_quantity * item.selling_price).quantize(
-                    Decimal("0.00")
-                )
-                item.save()
-                affect_inventory(
-                    item.inventory,
-                    "update",
-                    item,
-                    old_quantity=old_quantity,
-                    old_purchase_price=old_purchase_price,
-                    old_selling_price=old_selling_price,
-                )
-
-            remaining_duction_quantity = 0
-
-        else:
-            remaining_duction_quantity -= item.remaining_quantity
-            affect_inventory(item.inventory, "remove", item)
-            item.delete()
-
-        item_index += 1
+                item.purchase_sub_total -= purchase_price
+                item.selling_sub_total -= selling_price
+                updated_items.append(item)
+
+                deducted_quantities[product_id] += remaining_duction_quantity
+                deducted_quantity += remaining_duction_quantity
+                deducted_purchase_price += purchase_price
+                deducted_selling_price += selling_price
+                remaining_duction_quantity = 0
+
+    if updated_items:
+        InventoryItem.objects.bulk_update(
+            updated_items, ["remaining_quantity", "purchase_sub_total", "selling_sub_total"]
+        )
+
+    if deleted_item_ids:
+        InventoryItem.objects.filter(pk__in=deleted_item_ids).delete()
+
+    Inventory.objects.filter(pk=inventory.pk).update(
+        total_items=F("total_items") - len(deleted_item_ids),
+        total_quantity=F("total_quantity") - deducted_quantity,
+        total_purchase_price=F("total_purchase_price") - deducted_purchase_price,
+        total_selling_price=F("total_selling_price") - deducted_selling_price,
+    )
+    inventory.refresh_from_db(fields=["total_items", "total_quantity", "total_purchase_price", "total_selling_price"])
+
+    affect_products_statistics(
+        (product_id, "total_in_stock", -quantity) for product_id, quantity in deducted_quantities.items()
+    )
+
+    return inventory
+
+
+def deduct_product_amount(product, quantity, inventory=None):
+    return deduct_products_amounts([(product, quantity)], inventory)
 
 
 # Inventory Item
@@ -121,6 +194,8 @@ def create_inventory_item(data, raise_exception=False, update_inventory=True):
     if update_inventory:
         affect_inventory(inventory, "add", inventory_item)
 
+    affect_products_statistics([(inventory_item.product_id, "total_in_stock", inventory_item.remaining_quantity)])
+
     return inventory_item
 
 
@@ -146,6 +221,7 @@ def create_inventory_from_invoice_item(invoice_item, inventory=None, raise_excep
 
 def update_inventory_item(inventory_item, data, update_inventory=True):
     product = inventory_item.product
+    old_remaining_quantity = inventory_item.remaining_quantity
 
     data.pop("inventory", None)
     data.pop("product", None)
@@ -218,6 +294,10 @@ def update_inventory_item(inventory_item, data, update_inventory=True):
 
     inventory_item.save()
 
+    affect_products_statistics(
+        [(inventory_item.product_id, "total_in_stock", inventory_item.remaining_quantity - old_remaining_quantity)]
+    )
+
     if update_inventory and update_sub_total:
         affect_inventory(
             inventory_item.inventory,
@@ -235,6 +315,8 @@ def delete_inventory_item(inventory_item, update_inventory=True):
     if update_inventory:
         affect_inventory(inventory_item.inventory, "remove", inventory_item)
 
+    affect_products_statistics([(inventory_item.product_id, "total_in_stock", -inventory_item.remaining_quantity)])
+
     inventory_item.delete()
 
 
@@ -0,0 +1,29 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchaseinvoice',
+            index=models.Index(fields=['created_at'], name='purchase_invoice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchasereturninvoice',
+            index=models.Index(fields=['created_at'], name='purchase_return_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleinvoice',
+            index=models.Index(fields=['created_at'], name='sale_invoice_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='salereturninvoice',
+            index=models.Index(fields=['created_at'], name='sale_return_created_idx'),
+        ),
+    ]
@@ -37,6 +37,11 @@ class PurchaseInvoice(models.Model):
     def __str__(self):
         return f"Invoice {self.pk}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="purchase_invoice_created_idx"),
+        ]
+
     @property
     def transaction_data(self):
         from django.apps import apps
@@ -152,6 +157,11 @@ class PurchaseReturnInvoice(models.Model):
     def __str__(self):
         return f"Purchase Return Invoice {self.pk}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="purchase_return_created_idx"),
+        ]
+
     @property
     def transaction_data(self):
         from django.apps import apps
@@ -219,6 +229,7 @@ class SaleInvoice(models.Model):
             models.Index(fields=["seller"]),
             models.Index(fields=["user"]),
             models.Index(fields=["user", "seller"]),
+            models.Index(fields=["created_at"], name="sale_invoice_created_idx"),
         ]
 
     @property
@@ -318,6 +329,11 @@ class SaleReturnInvoice(models.Model):
     def __str__(self):
         return f"Sale Return Invoice {self.pk}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="sale_return_created_idx"),
+        ]
+
     @property
     def transaction_data(self):
         from django.apps import apps
@@ -56,7 +56,7 @@ from django.apps import apps
 from django.db import transaction, models
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from offers.utils import deconstuct_offer, delete_offer
+from offers.utils import deconstuct_offer, delete_offer, lock_offers
 
 get_model = apps.get_model
 
@@ -1071,6 +1071,7 @@ class SaleInvoiceCreateSerializer(BaseModelSerializer):
 
     def create(self, validated_data):
         with transaction.atomic():
+            lock_offers([(item["offer"].pk, item["quantity"]) for item in validated_data["items"]])
             instance = create_sale_invoice(validated_data)
         return instance
 
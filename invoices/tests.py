@@ -1,3 +1,113 @@
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.choices import Role
+from invoices.models import PurchaseInvoice, PurchaseInvoiceItem, SaleInvoiceItem
+from invoices.utils import create_sale_invoice
+from market.models import Category, Company, Product
+from offers.models import Offer
+from offers.utils import deconstuct_offer
+from profiles.models import UserProfile
+
+User = get_user_model()
+
+
+class CreateSaleInvoiceTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Company")
+        self.category = Category.objects.create(name="Category")
+        self.pharmacy = User.objects.create_user(username="+201000000010", name="Pharmacy", role=Role.PHARMACY)
+        UserProfile.objects.get_or_create(user=self.pharmacy)
+        self.sellers = [
+            User.objects.create_user(username=f"+20100000002{index}", name=f"Store {index}", role=Role.STORE)
+            for index in range(2)
+        ]
+        self.products = 0
+
+    def create_offer(self, seller):
+        self.products += 1
+        product = Product.objects.create(
+            name=f"Product {self.products}",
+            e_name=f"Product {self.products}",
+            public_price=Decimal("100.00"),
+            company=self.company,
+            category=self.category,
+            shape="اقراص",
+        )
+        return Offer.objects.create(
+            product=product,
+            user=seller,
+            available_amount=100,
+            remaining_amount=100,
+            purchase_discount_percentage=Decimal("20.00"),
+            purchase_price=Decimal("80.00"),
+            selling_discount_percentage=Decimal("15.00"),
+            selling_price=Decimal("85.00"),
+            is_max=True,
+        )
+
+    def checkout(self, offers_per_seller, quantity=2):
+        offers = [
+            Offer.objects.select_related("user", "product").get(pk=self.create_offer(seller).pk)
+            for seller in self.sellers
+            for _ in range(offers_per_seller)
+        ]
+        items = [
+            {
+                **deconstuct_offer(offer),
+                "offer": offer,
+                "quantity": quantity,
+                "remaining_quantity": quantity,
+                "sub_total": offer.selling_price * quantity,
+            }
+            for offer in offers
+        ]
+        data = {
+            "user": self.pharmacy,
+            "seller": self.pharmacy,
+            "items": items,
+            "items_count": len(items),
+            "total_quantity": quantity * len(items),
+            "total_price": sum(item["sub_total"] for item in items),
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            invoice = create_sale_invoice(data)
+
+        return invoice, offers, len(queries)
+
+    def test_items_are_grouped_by_seller(self):
+        existing = PurchaseInvoice.objects.create(
+            user=self.sellers[0], items_count=1, total_quantity=5, total_price=Decimal("400.00")
+        )
+
+        invoice, offers, _ = self.checkout(offers_per_seller=3)
+
+        self.assertEqual(SaleInvoiceItem.objects.filter(invoice=invoice).count(), 6)
+        self.assertEqual(PurchaseInvoice.objects.count(), 2)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.items_count, 4)
+        self.assertEqual(existing.total_quantity, 11)
+        self.assertEqual(existing.total_price, Decimal("880.00"))
+
+        created = PurchaseInvoice.objects.get(user=self.sellers[1])
+        self.assertEqual(created.items_count, 3)
+        self.assertEqual(created.total_quantity, 6)
+        self.assertEqual(created.total_price, Decimal("480.00"))
+
+        self.assertFalse(PurchaseInvoiceItem.objects.filter(sale_invoice_item__isnull=True).exists())
+        for offer in offers:
+            offer.refresh_from_db()
+            self.assertEqual(offer.remaining_amount, 98)
+
+    def test_queries_do_not_grow_with_cart_size(self):
+        _, _, small = self.checkout(offers_per_seller=1)
+        PurchaseInvoice.objects.all().delete()
+        _, _, large = self.checkout(offers_per_seller=5)
 
-# Create your tests here.
+        self.assertEqual(small, large)
@@ -1,12 +1,11 @@
-from copy import deepcopy
 from decimal import Decimal
 from django.apps import apps
-from django.db.models import Sum
+from django.db.models import F, Sum
 from finance.utils import create_transaction, delete_trasaction, get_transaction, update_transaction
 from inventory.utils import (
     create_inventory_from_invoice_item,
     create_inventory_item,
-    deduct_product_amount,
+    deduct_products_amounts,
     delete_inventory_item,
     get_or_create_main_inventory,
 )
@@ -18,9 +17,10 @@ from invoices.choices import (
     SaleInvoiceStatusChoice,
     SaleReturnInvoiceStatusChoice,
 )
+from market.utils import affect_products_statistics
 from rest_framework.exceptions import ValidationError
 
-from offers.utils import affect_offer, delete_offer
+from offers.utils import affect_offer, affect_offers, delete_offer
 
 get_model = apps.get_model
 
@@ -53,6 +53,19 @@ def get_purchase_invoice(user):
     return PurchaseInvoice.objects.filter(user=user, status=PurchaseInvoiceStatusChoice.PLACED).first()
 
 
+def get_purchase_invoices(users):
+    """The placed purchase invoice of each of `users` (by user id), fetched with one query."""
+    PurchaseInvoice = get_model("invoices", "PurchaseInvoice")
+    invoices = {}
+
+    for invoice in PurchaseInvoice.objects.filter(user__in=users, status=PurchaseInvoiceStatusChoice.PLACED).order_by(
+        "pk"
+    ):
+        invoices.setdefault(invoice.user_id, invoice)
+
+    return invoices
+
+
 def create_purchase_invoice(data):
     items = data.pop("items", [])
     PurchaseInvoice = get_model("invoices", "PurchaseInvoice")
@@ -65,6 +78,14 @@ def create_purchase_invoice(data):
     return invoice
 
 
+def affect_invoice_products_statistics(invoice, field, sign=1, product_field="product"):
+    """Add (or subtract with `sign=-1`) the quantities of the invoice items to `field` of their products statistics"""
+    affect_products_statistics(
+        (product_id, field, sign * quantity)
+        for product_id, quantity in invoice.items.values_list(product_field, "quantity")
+    )
+
+
 def lock_purchase_invoice(invoice):
     invoice.status = PurchaseInvoiceStatusChoice.LOCKED
     invoice.save()
@@ -80,6 +101,8 @@ def unlock_purchase_invoice(invoice):
         if transaction is not None:
             delete_trasaction(transaction)
 
+        affect_invoice_products_statistics(invoice, "total_purchases", sign=-1)
+
     invoice.status = PurchaseInvoiceStatusChoice.PLACED
     invoice.save()
     return invoice
@@ -91,6 +114,7 @@ def close_purchase_invoice(invoice, supplier_invoice_number, update_account=True
     if pending_action_items.exists():
         raise ValidationError({"detail": "Cannot close invoice with pending action items."})
 
+    old_status = invoice.status
     invoice.status = PurchaseInvoiceStatusChoice.CLOSED
     invoice.supplier_invoice_number = supplier_invoice_number
     invoice.save()
@@ -98,10 +122,16 @@ def close_purchase_invoice(invoice, supplier_invoice_number, update_account=True
     if update_account:
         create_transaction(invoice.transaction_data)
 
+    if old_status != invoice.status:
+        affect_invoice_products_statistics(invoice, "total_purchases")
+
     return invoice
 
 
 def open_purchase_invoice(invoice, update_account=True):
+    if invoice.status == PurchaseInvoiceStatusChoice.CLOSED:
+        affect_invoice_products_statistics(invoice, "total_purchases", sign=-1)
+
     invoice.status = PurchaseInvoiceStatusChoice.LOCKED
     invoice.save()
 
@@ -287,17 +317,28 @@ def create_purchase_return_invoice(data):
 
 
 def close_purchase_return_invoice(invoice, update_account=True, update_inventory=True):
+    old_status = invoice.status
     invoice.status = PurchaseReturnInvoiceStatusChoice.CLOSED
     invoice.save()
 
     if update_account:
         create_transaction(invoice.transaction_data)
 
+    if old_status != invoice.status:
+        affect_invoice_products_statistics(
+            invoice, "total_purchases_returned", product_field="purchase_invoice_item__product"
+        )
+
     if update_inventory:
         inventory = get_or_create_main_inventory()
 
-        for item in invoice.items.select_related("purchase_invoice_item__product").all():
-            deduct_product_amount(item.purchase_invoice_item.product, item.quantity, inventory)
+        deduct_products_amounts(
+            [
+                (item.purchase_invoice_item.product, item.quantity)
+                for item in invoice.items.select_related("purchase_invoice_item__product").all()
+            ],
+            inventory,
+        )
 
     return invoice
 
@@ -357,17 +398,20 @@ def delete_purchase_return_invoice_item(item, update_invoice=True, update_item=T
 
 
 # SALE INVOICES
-def create_sale_invoice(data):
+def create_sale_invoice(data, update_purchase_invoice=True):
     items = data.pop("items", [])
     SaleInvoice = get_model("invoices", "SaleInvoice")
+    SaleInvoiceItem = get_model("invoices", "SaleInvoiceItem")
     invoice = SaleInvoice.objects.create(**data)
 
     invoice.user.profile.latest_invoice_date = invoice.created_at
     invoice.user.profile.save()
 
-    for item in items:
-        item["invoice"] = invoice
-        create_sale_invoice_item(item, update_invoice=False)
+    # The invoice counters come computed with the items (SaleInvoiceCreateSerializer)
+    instances = SaleInvoiceItem.objects.bulk_create([SaleInvoiceItem(invoice=invoice, **item) for item in items])
+
+    if update_purchase_invoice:
+        create_purchase_invoice_items_from_sale_items(instances)
 
     return invoice
 
@@ -405,18 +449,29 @@ def close_sale_invoice(invoice, update_account=True, update_inventory=True):
         inventory = get_or_create_main_inventory()
         inventory_issues = []
         
+        # Required quantity per product (a product can appear on several lines)
+        products = {}
+        required_quantities = {}
         for item in invoice.items.select_related('product').all():
-            available_quantity = InventoryItem.objects.filter(
-                inventory=inventory,
-                product=item.product
-            ).aggregate(total=Sum('remaining_quantity'))['total'] or 0
+            products[item.product_id] = item.product
+            required_quantities[item.product_id] = required_quantities.get(item.product_id, 0) + item.quantity
+        
+        available_quantities = dict(
+            InventoryItem.objects.filter(inventory=inventory, product_id__in=required_quantities)
+            .values('product_id')
+            .annotate(total=Sum('remaining_quantity'))
+            .values_list('product_id', 'total')
+        )
+        
+        for product_id, required_quantity in required_quantities.items():
+            available_quantity = available_quantities.get(product_id) or 0
             
-            if available_quantity < item.quantity:
-                shortage = item.quantity - available_quantity
+            if available_quantity < required_quantity:
+                shortage = required_quantity - available_quantity
                 inventory_issues.append({
-                    "product_id": item.product.id,
-                    "product_name": item.product.name,
-                    "required": item.quantity,
+                    "product_id": product_id,
+                    "product_name": products[product_id].name,
+                    "required": required_quantity,
                     "available": available_quantity,
                     "shortage": shortage
                 })
@@ -437,13 +492,21 @@ def close_sale_invoice(invoice, update_account=True, update_inventory=True):
 
     if update_inventory and old_status != invoice.status:
         inventory = get_or_create_main_inventory()
-        for item in invoice.items.all():
-            deduct_product_amount(item.product, item.quantity, inventory)
+        deduct_products_amounts(
+            [(item.product_id, item.quantity) for item in invoice.items.all()],
+            inventory,
+        )
+
+    if old_status != invoice.status:
+        affect_invoice_products_statistics(invoice, "total_sold")
 
     return invoice
 
 
 def open_sale_invoice(invoice, update_account=True):
+    if invoice.status == SaleInvoiceStatusChoice.CLOSED:
+        affect_invoice_products_statistics(invoice, "total_sold", sign=-1)
+
     invoice.status = SaleInvoiceStatusChoice.PLACED
     invoice.save()
 
@@ -457,6 +520,74 @@ def open_sale_invoice(invoice, update_account=True):
 
 
 # SALE INVOICE ITEMS
+def create_purchase_invoice_items_from_sale_items(sale_items):
+    """
+    Add the sale invoice items to the placed purchase invoice of each seller (the offer owner),
+    creating the missing ones.
+
+    The placed invoices of all sellers are resolved with one query, the items are written with one
+    `bulk_create` and the counters of every purchase invoice are computed once.
+    """
+    PurchaseInvoice = get_model("invoices", "PurchaseInvoice")
+    PurchaseInvoiceItem = get_model("invoices", "PurchaseInvoiceItem")
+
+    items_by_seller = {}
+    for sale_item in sale_items:
+        items_by_seller.setdefault(sale_item.offer.user_id, []).append(sale_item)
+
+    purchase_invoices = get_purchase_invoices(items_by_seller.keys())
+    purchase_invoice_items = []
+
+    for seller_id, seller_sale_items in items_by_seller.items():
+        seller_items = [
+            PurchaseInvoiceItem(
+                product=sale_item.product,
+                offer=sale_item.offer,
+                sale_invoice_item=sale_item,
+                product_expiry_date=sale_item.product_expiry_date,
+                operating_number=sale_item.operating_number,
+                purchase_discount_percentage=sale_item.purchase_discount_percentage,
+                purchase_price=sale_item.purchase_price,
+                selling_discount_percentage=sale_item.selling_discount_percentage,
+                selling_price=sale_item.selling_price,
+                quantity=sale_item.quantity,
+                remaining_quantity=sale_item.remaining_quantity,
+                sub_total=Decimal(sale_item.offer.purchase_price * sale_item.quantity).quantize(Decimal("0.00")),
+            )
+            for sale_item in seller_sale_items
+        ]
+
+        items_count = len(seller_items)
+        total_quantity = sum(item.quantity for item in seller_items)
+        total_price = sum(item.sub_total for item in seller_items)
+        purchase_invoice = purchase_invoices.get(seller_id)
+
+        if purchase_invoice is None:
+            purchase_invoice = PurchaseInvoice.objects.create(
+                user=seller_sale_items[0].offer.user,
+                items_count=items_count,
+                total_quantity=total_quantity,
+                total_price=total_price,
+            )
+
+        else:
+            PurchaseInvoice.objects.filter(pk=purchase_invoice.pk).update(
+                items_count=F("items_count") + items_count,
+                total_quantity=F("total_quantity") + total_quantity,
+                total_price=F("total_price") + total_price,
+            )
+
+        for item in seller_items:
+            item.invoice = purchase_invoice
+
+        purchase_invoice_items.extend(seller_items)
+
+    PurchaseInvoiceItem.objects.bulk_create(purchase_invoice_items)
+    affect_offers("add", purchase_invoice_items)
+
+    return purchase_invoice_items
+
+
 def create_sale_invoice_item(data, update_invoice=True, update_purchase_invoice=True):
     SaleInvoiceItem = get_model("invoices", "SaleInvoiceItem")
     instance = SaleInvoiceItem.objects.create(**data)
@@ -465,31 +596,7 @@ def create_sale_invoice_item(data, update_invoice=True, update_purchase_invoice=
         affect_invoice(instance.invoice, "add", instance)
 
     if update_purchase_invoice:
-        offer = instance.offer
-        user = offer.user
-        purchase_invoice_item_data = deepcopy(data)
-
-        purchase_invoice_item_data.pop("invoice", None)
-        purchase_invoice_item_data["sale_invoice_item"] = instance
-
-        purchase_price = offer.purchase_price
-        sub_total = Decimal(purchase_price * instance.quantity).quantize(Decimal("0.00"))
-        purchase_invoice_item_data["sub_total"] = sub_total
-        purchase_invoice = get_purchase_invoice(user)
-
-        if purchase_invoice is None:
-            purchase_invoice_data = {
-                "user": user,
-                "items_count": 1,
-                "total_quantity": instance.quantity,
-                "total_price": sub_total,
-                "items": [purchase_invoice_item_data],
-            }
-            purchase_invoice = create_purchase_invoice(purchase_invoice_data)
-
-        else:
-            purchase_invoice_item_data["invoice"] = purchase_invoice
-            create_purchase_invoice_item(purchase_invoice_item_data)
+        create_purchase_invoice_items_from_sale_items([instance])
 
     return instance
 
@@ -593,12 +700,16 @@ def create_sale_return_invoice(data):
 
 
 def close_sale_return_invoice(invoice, update_account=True, update_inventory=True):
+    old_status = invoice.status
     invoice.status = SaleReturnInvoiceStatusChoice.CLOSED
     invoice.save()
 
     if update_account:
         create_transaction(invoice.transaction_data)
 
+    if old_status != invoice.status:
+        affect_invoice_products_statistics(invoice, "total_sales_returned", product_field="sale_invoice_item__product")
+
     if update_inventory:
         inventory = get_or_create_main_inventory()
 
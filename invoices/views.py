@@ -9,8 +9,9 @@ from rest_framework.generics import (
 )
 from accounts.permissions import *
 from core.views.abstract_api_views import BulkUpdateAPIView
-from core.views.mixins import PDFFileMixin
 from core.views.renderers import PDFRenderer
+from exports.choices import ExportJobKindChoice
+from exports.mixins import PDFExportJobMixin
 from invoices.choices import (
     PurchaseInvoiceStatusChoice,
     PurchaseReturnInvoiceStatusChoice,
@@ -666,12 +667,13 @@ class SaleInvoiceRetrieveAPIView(RetrieveAPIView):
         return queryset
 
 
-class SaleInvoiceDownloadAPIView(PDFFileMixin, RetrieveAPIView):
+class SaleInvoiceDownloadAPIView(PDFExportJobMixin, RetrieveAPIView):
     permission_classes = [SalesRoleAuthentication | ManagerRoleAuthentication]
     renderer_classes = [PDFRenderer]
     serializer_class = SaleInvoicePDFSerializer
     template_name = "invoices/sale_invoice.html"
     template_context = {}
+    export_kind = ExportJobKindChoice.SALE_INVOICE_PDF
 
     def get_queryset(self):
         user = self.request.user
@@ -767,6 +769,10 @@ class SaleInvoiceDownloadAPIView(PDFFileMixin, RetrieveAPIView):
         activate("ar")
         return super().get(request, *args, **kwargs)
 
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        return self.export_pdf(serializer.data)
+
 
 class SaleInvoiceCheckCloseabilityAPIView(RetrieveAPIView):
     """
@@ -420,6 +420,7 @@ class ProductMatchCacheAdmin(admin.ModelAdmin):
         from django.utils import timezone
         from datetime import timedelta
         
+        ProductMatchCache.flush_access_counts()
         cutoff_date = timezone.now() - timedelta(days=30)
         old_entries = ProductMatchCache.objects.filter(
             last_accessed__lt=cutoff_date
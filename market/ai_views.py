@@ -6,8 +6,8 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Q, Count, Sum
-from market.models import Product, StoreProductCode
+from django.db.models import Q, Count, F, Func, OuterRef, Subquery, Sum
+from market.models import Category, Company, Product, StoreProductCode
 from market.ai_serializers import (
     DrugSearchResponseSerializer,
     DrugStockCheckSerializer,
@@ -28,7 +28,10 @@ class DrugSearchAPIView(APIView):
     
     def get(self, request):
         query = request.query_params.get('q', '').strip()
-        limit = int(request.query_params.get('limit', 10))
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            limit = 10
         
         if not query:
             return Response({
@@ -38,22 +41,32 @@ class DrugSearchAPIView(APIView):
             }, status=status.HTTP_200_OK)
         
         # Search in name, e_name, effective_material, company, category
-        products = Product.objects.filter(
-            Q(name__icontains=query) |
-            Q(e_name__icontains=query) |
-            Q(effective_material__icontains=query) |
-            Q(company__name__icontains=query) |
-            Q(company__e_name__icontains=query) |
-            Q(category__name__icontains=query)
-        ).select_related('company', 'category')[:limit]
+        # Product columns are matched with the UPPER(...) trigram indexes, companies and categories
+        # are small and resolved to id lists so the whole filter stays on market_product indexes
+        companies = Company.objects.filter(Q(name__icontains=query) | Q(e_name__icontains=query))
+        categories = Category.objects.filter(name__icontains=query)
+        stock_count = (
+            StoreProductCode.objects.filter(product=OuterRef('pk'))
+            .order_by()
+            .annotate(count=Func(F('id'), function='COUNT'))
+            .values('count')
+        )
+        
+        products = (
+            Product.objects.filter(
+                Q(name__icontains=query) |
+                Q(e_name__icontains=query) |
+                Q(effective_material__icontains=query) |
+                Q(company__in=companies) |
+                Q(category__in=categories)
+            )
+            .select_related('company', 'category')
+            .annotate(stock_count=Subquery(stock_count))
+            .order_by('name', 'id')[:limit]
+        )
         
         results = []
         for product in products:
-            # Check if in stock (has codes)
-            stock_count = StoreProductCode.objects.filter(
-                product=product
-            ).count()
-            
             results.append({
                 'id': product.id,
                 'name': product.name,
@@ -63,8 +76,8 @@ class DrugSearchAPIView(APIView):
                 'public_price': float(product.public_price),
                 'effective_material': product.effective_material,
                 'shape': product.shape,
-                'in_stock': stock_count > 0,
-                'available_quantity': stock_count
+                'in_stock': product.stock_count > 0,
+                'available_quantity': product.stock_count
             })
         
         return Response({
@@ -50,6 +50,9 @@ class Command(BaseCommand):
         """Clean up old cache entries"""
         cutoff_date = timezone.now() - timedelta(days=days)
         
+        # Write the buffered hits first so recently used entries are kept
+        ProductMatchCache.flush_access_counts()
+        
         old_entries = ProductMatchCache.objects.filter(
             last_accessed__lt=cutoff_date
         )
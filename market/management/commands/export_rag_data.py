@@ -6,8 +6,8 @@ import json
 import os
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from market.models import Product, Company, Category
-from market.ai_serializers import DrugDetailSerializer
+from market.models import Company, Category
+from market.utils_pkg.rag_export import export_rag_drugs
 
 
 class Command(BaseCommand):
@@ -49,26 +49,14 @@ class Command(BaseCommand):
         self.stdout.write(self.style.SUCCESS('✓ Export completed successfully!'))
     
     def export_drugs(self, output_dir, output_format):
-        """Export all drugs/products to JSON"""
+        """Export all drugs/products to JSON (with the content hash used for incremental sync)"""
         self.stdout.write('Exporting drugs catalog...')
         
-        products = Product.objects.select_related('company', 'category').all()
-        serializer = DrugDetailSerializer(products, many=True)
-        
-        output_file = os.path.join(output_dir, f'drugs.{output_format}')
-        
-        if output_format == 'json':
-            # Standard JSON array
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(serializer.data, f, ensure_ascii=False, indent=2)
-        else:
-            # JSON Lines format (one JSON object per line)
-            with open(output_file, 'w', encoding='utf-8') as f:
-                for item in serializer.data:
-                    f.write(json.dumps(item, ensure_ascii=False) + '\n')
+        stats = export_rag_drugs(output_dir, output_format, force=True)
+        total = stats['created'] + stats['updated'] + stats['unchanged']
         
         self.stdout.write(
-            self.style.SUCCESS(f'  ✓ Exported {len(serializer.data)} products to {output_file}')
+            self.style.SUCCESS(f"  ✓ Exported {total} products to {stats['output_file']}")
         )
     
     def export_policies(self, output_dir):
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from market.utils import rebuild_products_statistics, verify_products_statistics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the products statistics (purchases, sales, returns, stock) from the invoices and the inventory'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare the stored statistics with recomputed ones, nothing is written'
+        )
+        parser.add_argument(
+            '--products',
+            nargs='+',
+            type=int,
+            help='Only these product ids'
+        )
+
+    def handle(self, *args, **options):
+        product_ids = options['products']
+
+        if not options['verify']:
+            written = rebuild_products_statistics(product_ids)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics of {written} products'))
+            return
+
+        differences = verify_products_statistics(product_ids)
+
+        for product_id, field, stored, expected in differences:
+            self.stdout.write(f'Product {product_id}: {field} is {stored}, expected {expected}')
+
+        if differences:
+            raise CommandError(f'{len(differences)} statistics differ, run rebuild_product_statistics to fix them')
+
+        self.stdout.write(self.style.SUCCESS('Products statistics are up to date'))
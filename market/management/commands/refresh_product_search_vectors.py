@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from market.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored full text search vector of products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only fill products that have no search vector yet'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.all()
+        if options['missing_only']:
+            queryset = queryset.filter(search_vector__isnull=True)
+
+        updated = queryset.update_search_vector()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated search vector for {updated} products')
+        )
@@ -0,0 +1,38 @@
+"""
+Django management command to sync the RAG catalog export incrementally
+Usage: python manage.py sync_rag_data
+"""
+from django.core.management.base import BaseCommand
+
+from market.utils_pkg.rag_export import export_rag_drugs, get_rag_data_dir
+
+
+class Command(BaseCommand):
+    help = 'Export the drug catalog for RAG when products were added, changed or deleted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output-dir',
+            type=str,
+            default=None,
+            help='Output directory for the exported catalog (default: settings.RAG_DATA_DIR or rag_data/)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Write the export even when nothing changed'
+        )
+
+    def handle(self, *args, **options):
+        output_dir = options['output_dir'] or get_rag_data_dir()
+        stats = export_rag_drugs(output_dir, force=options['force'])
+
+        self.stdout.write(
+            f"{stats['created']} new, {stats['updated']} changed, "
+            f"{stats['deleted']} deleted, {stats['unchanged']} unchanged products"
+        )
+
+        if stats['written']:
+            self.stdout.write(self.style.SUCCESS(f"✓ Catalog exported to {stats['output_file']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Catalog unchanged, nothing to sync'))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVector
 from django.db.models import OuterRef, Case, When, F, Count, Q, Value, Subquery
 from django.db.models.functions import Greatest
 from django.apps import apps
@@ -13,7 +14,25 @@ from accounts.choices import Role
 get_model = apps.get_model
 
 
+def product_search_vector():
+    company_name = Subquery(get_model("market", "Company").objects.filter(pk=OuterRef("company_id")).values("name")[:1])
+    return (
+        SearchVector("name", weight="A", config="arabic")
+        + SearchVector("effective_material", weight="B", config="arabic")
+        + SearchVector(company_name, weight="C", config="arabic")
+        + SearchVector("e_name", weight="D", config="arabic")
+    )
+
+
 class ProductQuerySet(models.QuerySet):
+    def update_search_vector(self):
+        from core.utils import bump_search_cache_version
+
+        updated = self.update(search_vector=product_search_vector())
+        # Searchable fields changed, cached search results are stale
+        bump_search_cache_version("catalog")
+        return updated
+
     def with_max_offer_discount_percentage(self):
         # store_offer_subquery = get_model("market", "StoreOffer").objects.filter(is_max=True, product=OuterRef("pk"))[
         #     :1
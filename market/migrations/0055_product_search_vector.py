@@ -0,0 +1,35 @@
+# Generated manually for stored Full Text Search vector
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('market', '0054_product_fts_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='prod_search_vector_idx'),
+        ),
+        # Backfill with the same weights as ProductQuerySet.update_search_vector
+        migrations.RunSQL(
+            sql=(
+                "UPDATE market_product AS p SET search_vector = "
+                "setweight(to_tsvector('arabic', coalesce(p.name, '')), 'A') || "
+                "setweight(to_tsvector('arabic', coalesce(p.effective_material, '')), 'B') || "
+                "setweight(to_tsvector('arabic', coalesce(c.name, '')), 'C') || "
+                "setweight(to_tsvector('arabic', coalesce(p.e_name, '')), 'D') "
+                "FROM market_company AS c WHERE c.id = p.company_id;"
+            ),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated manually on 2026-10-18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0055_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStatistics',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics', related_query_name='statistics', serialize=False, to='market.product')),
+                ('total_purchases', models.IntegerField(default=0)),
+                ('total_purchases_returned', models.IntegerField(default=0)),
+                ('total_sold', models.IntegerField(default=0)),
+                ('total_sales_returned', models.IntegerField(default=0)),
+                ('total_in_stock', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations
+
+
+def rebuild_product_statistics(apps, schema_editor):
+    # Same as `manage.py rebuild_product_statistics`, so the statistics are exact right after deploy
+    from market.utils import rebuild_products_statistics
+
+    rebuild_products_statistics()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('market', '0057_product_upper_trigram_indexes'),
+        ('invoices', '0002_invoice_created_at_indexes'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_product_statistics, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from accounts.models import Pharmacy, Store
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Upper
 from market import managers
 from market.choices import SHAPE_CHOICES, LETTER_CHOICES, UPLOAD_STATUS_CHOICES, ACTION_CHOICES
 from market.validators import StoreProductCodeFileValidator, ProductMatchCacheValidator, store_product_code_file_validator
@@ -15,6 +19,7 @@ class Company(models.Model):
 
     class Meta:
         verbose_name_plural = _("Companies")
+        indexes = [GinIndex(fields=["name"], name="company_name_trgm", opclasses=["gin_trgm_ops"])]
 
     def __str__(self):
         return f"{self.name}"
@@ -37,7 +42,17 @@ class Product(models.Model):
         return f"{self.name}"
 
     class Meta:
-        indexes = [models.Index(fields=["name", "e_name"], name="market_product_name_idx")]
+        indexes = [
+            models.Index(fields=["name", "e_name"], name="market_product_name_idx"),
+            GinIndex(fields=["name"], name="prod_name_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["e_name"], name="prod_ename_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["effective_material"], name="prod_effective_material_trgm", opclasses=["gin_trgm_ops"]),
+            GinIndex(fields=["search_vector"], name="prod_search_vector_idx"),
+            # Back `icontains` (UPPER(column) LIKE UPPER('%...%')) of the AI drug search
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="prod_name_upper_trgm"),
+            GinIndex(OpClass(Upper("e_name"), name="gin_trgm_ops"), name="prod_ename_upper_trgm"),
+            GinIndex(OpClass(Upper("effective_material"), name="gin_trgm_ops"), name="prod_material_upper_trgm"),
+        ]
 
     name = models.CharField(max_length=200)
     e_name = models.CharField(max_length=200)
@@ -53,10 +68,38 @@ class Product(models.Model):
     instances = models.ManyToManyField("self", blank=True)
     is_illegal = models.BooleanField(default=False)
     fridge = models.BooleanField(default=False)
+    # Weighted name/effective material/company/e_name vector, kept up to date by market.signals
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = managers.ProductManager.from_queryset(managers.ProductQuerySet)()
 
 
+class ProductStatistics(models.Model):
+    """
+    Purchases, sales, returns and stock of a product, kept up to date by the invoice and inventory flows
+    (`market.utils.affect_products_statistics`) and rebuilt with `rebuild_product_statistics`.
+    """
+
+    FIELDS = ("total_purchases", "total_purchases_returned", "total_sold", "total_sales_returned", "total_in_stock")
+
+    def __str__(self):
+        return f"{self.product} statistics"
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="statistics",
+        related_query_name="statistics",
+    )
+    total_purchases = models.IntegerField(default=0)
+    total_purchases_returned = models.IntegerField(default=0)
+    total_sold = models.IntegerField(default=0)
+    total_sales_returned = models.IntegerField(default=0)
+    total_in_stock = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 class ProductCode(models.Model):
     def __str__(self) -> str:
         return f"{self.code} - {self.product}"
@@ -259,10 +302,50 @@ class ProductMatchCache(models.Model):
     def __str__(self):
         return f"{self.search_name} -> {self.product.name} ({self.confidence_score:.2f})"
     
+    ACCESS_BUFFER_KEY = "product_match_cache_access"
+
     def increment_access(self):
-        """Increment access count and update last_accessed"""
-        self.access_count += 1
-        self.save(update_fields=['access_count', 'last_accessed'])
+        """
+        Count a hit of this entry without writing it, the hits are buffered in the cache
+        and written by `flush_access_counts` (market.tasks.flush_product_match_cache_access)
+        """
+        from core.utils import push_to_cache_buffer
+
+        push_to_cache_buffer(self.ACCESS_BUFFER_KEY, (self.pk, timezone.now()))
+
+    @classmethod
+    def flush_access_counts(cls, batch_size=5000):
+        """
+        Add the buffered hits to `access_count` and move `last_accessed` to the latest hit,
+        one update per batch. Returns the number of flushed hits.
+        """
+        from core.utils import drain_cache_buffer
+
+        flushed = 0
+
+        for hits in drain_cache_buffer(cls.ACCESS_BUFFER_KEY, batch_size):
+            counts = {}
+            last_accessed = {}
+
+            for entry_id, accessed_at in hits:
+                counts[entry_id] = counts.get(entry_id, 0) + 1
+                last_accessed[entry_id] = max(accessed_at, last_accessed.get(entry_id, accessed_at))
+
+            # Entries deleted since their hits are simply not matched
+            cls.objects.filter(pk__in=counts).update(
+                access_count=models.Case(
+                    *[models.When(pk=entry_id, then=models.F('access_count') + count) for entry_id, count in counts.items()],
+                    default=models.F('access_count'),
+                ),
+                last_accessed=models.Case(
+                    *[models.When(pk=entry_id, then=models.Value(accessed_at)) for entry_id, accessed_at in last_accessed.items()],
+                    default=models.F('last_accessed'),
+                    output_field=models.DateTimeField(),
+                ),
+            )
+            flushed += len(hits)
+
+        return flushed
 
 
 class PharmacyProductWishList(models.Model):
@@ -99,6 +99,41 @@ def handle_upload_failed(upload):
             logger.error(f"Failed to send failure notification: {e}")
 
 
+PRODUCT_SEARCH_FIELDS = {'name', 'e_name', 'effective_material', 'company', 'company_id'}
+
+
+@receiver(post_save, sender='market.Product')
+def refresh_product_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Keep the stored search vector in sync when searchable product fields change
+    """
+    if update_fields is not None and not PRODUCT_SEARCH_FIELDS.intersection(update_fields):
+        return
+
+    sender.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender='market.Company')
+def refresh_company_products_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Company name is part of the product search vector
+    """
+    if created or (update_fields is not None and 'name' not in update_fields):
+        return
+
+    from .models import Product
+    Product.objects.filter(company=instance).update_search_vector()
+
+
+@receiver(post_delete, sender='market.Product')
+def expire_product_search_cache(sender, instance, **kwargs):
+    """
+    Deleted products must leave the cached search results
+    """
+    from core.utils import bump_search_cache_version
+    bump_search_cache_version('catalog')
+
+
 @receiver(post_save, sender='market.StoreProductCode')
 def handle_store_product_code_change(sender, instance, created, **kwargs):
     """
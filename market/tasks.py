@@ -6,6 +6,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows of a store-code upload matched and written per batch
+UPLOAD_CHUNK_SIZE = 1000
+
 
 @shared_task(bind=True, max_retries=3)
 def cleanup_old_product_match_cache(self, days_old=30):
@@ -18,6 +21,9 @@ def cleanup_old_product_match_cache(self, days_old=30):
     try:
         from .models import ProductMatchCache
         
+        # Write the buffered hits first so recently used entries are kept
+        ProductMatchCache.flush_access_counts()
+        
         cutoff_date = timezone.now() - timedelta(days=days_old)
         
         # Delete cache entries that haven't been accessed in the specified days
@@ -42,6 +48,39 @@ def cleanup_old_product_match_cache(self, days_old=30):
         raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
 
 
+@shared_task
+def flush_product_match_cache_access():
+    """
+    Write the buffered ProductMatchCache hits (access_count / last_accessed) in bulk
+    """
+    from .models import ProductMatchCache
+
+    flushed = ProductMatchCache.flush_access_counts()
+
+    if flushed:
+        logger.info(f"Flushed {flushed} ProductMatchCache hits")
+
+    return {'success': True, 'flushed': flushed}
+
+
+@shared_task
+def sync_rag_data(force=False):
+    """
+    Export the drug catalog for the AI agent RAG index when products were added,
+    changed or deleted; the agent then embeds only those products
+    """
+    from .utils_pkg.rag_export import export_rag_drugs
+
+    stats = export_rag_drugs(force=force)
+
+    logger.info(
+        f"RAG catalog sync: {stats['created']} new, {stats['updated']} changed, "
+        f"{stats['deleted']} deleted, written={stats['written']}"
+    )
+
+    return stats
+
+
 @shared_task(bind=True, max_retries=3)
 def cleanup_old_upload_files(self, days_old=90):
     """
@@ -92,122 +131,57 @@ def cleanup_old_upload_files(self, days_old=90):
 def process_upload_file(upload_id):
     """
     Process uploaded file for store product codes with flexible matching
+
+    The file is streamed in chunks of ``UPLOAD_CHUNK_SIZE`` rows. Each chunk
+    resolves its existing store codes with one query and is written with bulk
+    statements, together with its CodeChangeLog entries.
     """
     try:
-        from .models import StoreProductCodeUpload, StoreProductCode, Product
-        import pandas as pd
-        from django.db import transaction
-        from difflib import SequenceMatcher
+        from .models import StoreProductCodeUpload, Product
+        from .utils_pkg.matching_index import ProductMatchIndex
         
-        upload = StoreProductCodeUpload.objects.get(id=upload_id)
+        upload = StoreProductCodeUpload.objects.select_related('store').get(id=upload_id)
         upload.status = 'processing'
         upload.save()
         
-        # Read the uploaded file
-        if upload.file.name.endswith('.xlsx'):
-            df = pd.read_excel(upload.file.path)
-        elif upload.file.name.endswith('.csv'):
-            df = pd.read_csv(upload.file.path)
-        else:
-            raise ValueError("Unsupported file format")
-        
+        total_rows = 0
         successful_rows = 0
         failed_rows = 0
         errors = []
         results = []
         
-        # Process each row
-        for index, row in df.iterrows():
-            try:
-                product_name = str(row['product_name']).strip()
-                code = int(row['code'])
-                price = float(row['price']) if 'price' in row and pd.notna(row['price']) else None
-                
-                # Flexible search for product by name
-                product, match_score = find_product_by_flexible_name(
-                    product_name, 
-                    threshold=0.8  # 80% match minimum
-                )
-                
-                # Check if product exists
-                if not product:
-                    error_msg = f"المنتج '{product_name}' غير موجود في قاعدة البيانات"
-                    errors.append(f"Row {index + 2}: {error_msg}")
+        # Build the matcher once and share it across all rows
+        match_index = ProductMatchIndex(Product.objects.only('id', 'name', 'e_name', 'public_price'))
+        
+        for chunk in iter_upload_file_chunks(upload.file, chunk_size=UPLOAD_CHUNK_SIZE):
+            chunk_results = process_upload_chunk(upload, chunk, match_index)
+            
+            for result in chunk_results:
+                if result['status'] == 'success':
+                    successful_rows += 1
+                else:
                     failed_rows += 1
-                    results.append({
-                        'row': index + 2,
-                        'product_name': product_name,
-                        'code': code,
-                        'status': 'failed',
-                        'error': error_msg
-                    })
-                    continue
-                
-                # Check price match (if provided)
-                if price is not None:
-                    if not is_price_match(price, product.public_price, tolerance=0.1):
-                        error_msg = f"السعر غير متطابق. السعر في الملف: {price}, السعر في النظام: {product.public_price}"
-                        errors.append(f"Row {index + 2}: {error_msg}")
-                        failed_rows += 1
-                        results.append({
-                            'row': index + 2,
-                            'product_name': product_name,
-                            'code': code,
-                            'status': 'failed',
-                            'error': error_msg
-                        })
-                        continue
-                
-                # Create or update product code
-                with transaction.atomic():
-                    store_code, created = StoreProductCode.objects.update_or_create(
-                        product=product,
-                        store=upload.store,
-                        defaults={'code': code}
-                    )
-                
-                successful_rows += 1
-                results.append({
-                    'row': index + 2,
-                    'product_name': product_name,
-                    'code': code,
-                    'status': 'success',
-                    'product_id': product.id,
-                    'matched_name': product.name,
-                    'match_score': round(match_score, 2),
-                    'price': float(product.public_price),
-                    'price_difference': round(abs(price - product.public_price), 2) if price else 0,
-                    'flexibility_used': match_score < 1.0 or (price and abs(price - product.public_price) > 0.01)
-                })
-                
-            except Exception as e:
-                error_msg = f"خطأ في معالجة الصف: {str(e)}"
-                errors.append(f"Row {index + 2}: {error_msg}")
-                failed_rows += 1
-                results.append({
-                    'row': index + 2,
-                    'product_name': str(row.get('product_name', '')),
-                    'code': str(row.get('code', '')),
-                    'status': 'failed',
-                    'error': error_msg
-                })
+                    errors.append(f"Row {result['row']}: {result['error']}")
+            
+            total_rows += len(chunk)
+            results.extend(chunk_results)
         
         # Update statistics
         upload.status = 'completed'
         upload.processed_at = timezone.now()
-        upload.total_rows = len(df)
+        upload.total_rows = total_rows
         upload.successful_rows = successful_rows
         upload.failed_rows = failed_rows
         upload.error_log = '\n'.join(errors)
         upload.results = results
         upload.save()
         
-        logger.info(f"Successfully processed upload {upload_id}: {successful_rows}/{len(df)} successful")
+        logger.info(f"Successfully processed upload {upload_id}: {successful_rows}/{total_rows} successful")
         
         return {
             'success': True,
             'upload_id': upload_id,
-            'total_rows': len(df),
+            'total_rows': total_rows,
             'successful_rows': successful_rows,
             'failed_rows': failed_rows
         }
@@ -227,32 +201,230 @@ def process_upload_file(upload_id):
         raise exc
 
 
-def find_product_by_flexible_name(product_name, threshold=0.8):
+def iter_upload_file_chunks(file, chunk_size=UPLOAD_CHUNK_SIZE):
     """
-    Find product with flexible name matching using fuzzy string matching
+    Stream an uploaded .xlsx or .csv file as lists of ``(row_number, row)``
+
+    ``row_number`` is the line in the sheet (the header is row 1) and ``row``
+    maps column names to cell values, with empty cells as ``None``.
     """
-    from .models import Product
-    from difflib import SequenceMatcher
+    if file.name.endswith('.xlsx'):
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(file.path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None) or ()
+            columns = [str(name).strip() if name is not None else None for name in header]
+            
+            chunk = []
+            for row_number, values in enumerate(rows, start=2):
+                if all(value is None or value == '' for value in values):
+                    continue
+                chunk.append((row_number, dict(zip(columns, values))))
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+        finally:
+            workbook.close()
+    
+    elif file.name.endswith('.csv'):
+        import pandas as pd
+        
+        for df in pd.read_csv(file.path, chunksize=chunk_size):
+            df = df.astype(object).where(df.notna(), None)
+            yield [(index + 2, row) for index, row in zip(df.index, df.to_dict('records'))]
+    
+    else:
+        raise ValueError("Unsupported file format")
+
+
+def process_upload_chunk(upload, chunk, match_index):
+    """
+    Match, validate and upsert one chunk of upload rows
+
+    Returns the per-row results in file order.
+    """
+    from .models import StoreProductCode
+    
+    results = {}
+    pending = {}
+    
+    for row_number, row in chunk:
+        try:
+            product_name = str(row['product_name'] if row['product_name'] is not None else '').strip()
+            code = int(row['code'])
+            price = float(row['price']) if row.get('price') is not None else None
+            
+            # Flexible search for product by name
+            product, match_score = find_product_by_flexible_name(
+                product_name,
+                threshold=0.8,  # 80% match minimum
+                index=match_index
+            )
+            
+            # Check if product exists
+            if not product:
+                error_msg = f"المنتج '{product_name}' غير موجود في قاعدة البيانات"
+                results[row_number] = {
+                    'row': row_number,
+                    'product_name': product_name,
+                    'code': code,
+                    'status': 'failed',
+                    'error': error_msg
+                }
+                continue
+            
+            public_price = float(product.public_price)
+            
+            # Check price match (if provided)
+            if price is not None:
+                if not is_price_match(price, public_price, tolerance=0.1):
+                    error_msg = f"السعر غير متطابق. السعر في الملف: {price}, السعر في النظام: {product.public_price}"
+                    results[row_number] = {
+                        'row': row_number,
+                        'product_name': product_name,
+                        'code': code,
+                        'status': 'failed',
+                        'error': error_msg
+                    }
+                    continue
+            
+            # Same checks StoreProductCode.save() runs
+            StoreProductCode(product=product, store=upload.store, code=code).clean()
+            
+            results[row_number] = {
+                'row': row_number,
+                'product_name': product_name,
+                'code': code,
+                'status': 'success',
+                'product_id': product.id,
+                'matched_name': product.name,
+                'match_score': round(match_score, 2),
+                'price': public_price,
+                'price_difference': round(abs(price - public_price), 2) if price else 0,
+                'flexibility_used': match_score < 1.0 or bool(price and abs(price - public_price) > 0.01)
+            }
+            # Later rows for the same product win, as with sequential upserts
+            pending[product.id] = (row_number, code)
+            
+        except Exception as e:
+            error_msg = f"خطأ في معالجة الصف: {str(e)}"
+            results[row_number] = {
+                'row': row_number,
+                'product_name': str(row.get('product_name', '')),
+                'code': str(row.get('code', '')),
+                'status': 'failed',
+                'error': error_msg
+            }
+    
+    if pending:
+        try:
+            upsert_store_product_codes(upload, {product_id: code for product_id, (_, code) in pending.items()})
+        except Exception as e:
+            logger.error(f"Error writing upload {upload.id} chunk: {e}")
+            error_msg = f"خطأ في حفظ الأكواد: {str(e)}"
+            for result in results.values():
+                if result['status'] == 'success':
+                    result.update(status='failed', error=error_msg)
+    
+    return [results[row_number] for row_number, _ in chunk]
+
+
+def upsert_store_product_codes(upload, codes):
+    """
+    Write ``{product_id: code}`` for the upload's store with bulk statements
+
+    Existing codes are fetched in one query, new ones are bulk inserted and changed
+    ones (including codes inserted concurrently since the fetch) are bulk updated.
+    A CodeChangeLog entry is recorded for every created or changed code.
+    """
+    from .models import StoreProductCode, CodeChangeLog
+    from django.db import transaction
     
-    products = Product.objects.all()
-    best_match = None
-    best_score = 0
+    now = timezone.now()
+    reason = f"Upload #{upload.id}"
     
-    for product in products:
-        # Compare Arabic name
-        arabic_score = SequenceMatcher(None, product_name.lower(), product.name.lower()).ratio()
+    def update(store_code, code):
+        logs.append(CodeChangeLog(
+            store_product_code=store_code,
+            old_code=store_code.code,
+            new_code=code,
+            action='update',
+            changed_by_id=upload.uploaded_by_id,
+            reason=reason,
+        ))
+        store_code.code = code
+        store_code.updated_at = now
+        to_update.append(store_code)
+    
+    with transaction.atomic():
+        existing = {
+            store_code.product_id: store_code
+            for store_code in StoreProductCode.objects.select_for_update().filter(
+                store=upload.store, product_id__in=codes.keys()
+            )
+        }
         
-        # Compare English name
-        english_score = SequenceMatcher(None, product_name.lower(), product.e_name.lower()).ratio()
+        to_update = []
+        to_create = []
+        logs = []
+        created = 0
         
-        # Take the highest score
-        score = max(arabic_score, english_score)
+        for product_id, code in codes.items():
+            store_code = existing.get(product_id)
+            if store_code is None:
+                to_create.append(StoreProductCode(product_id=product_id, store=upload.store, code=code))
+            elif store_code.code != code:
+                update(store_code, code)
         
-        if score > best_score and score >= threshold:
-            best_score = score
-            best_match = product
+        if to_create:
+            StoreProductCode.objects.bulk_create(to_create, ignore_conflicts=True)
+            
+            # Rows carrying our created_at were inserted here, the others were inserted
+            # concurrently since the fetch and are updated like existing codes
+            inserted_at = {store_code.product_id: store_code.created_at for store_code in to_create}
+            for store_code in StoreProductCode.objects.select_for_update().filter(
+                store=upload.store, product_id__in=inserted_at.keys()
+            ):
+                code = codes[store_code.product_id]
+                if store_code.created_at == inserted_at[store_code.product_id]:
+                    created += 1
+                    logs.append(CodeChangeLog(
+                        store_product_code=store_code,
+                        new_code=code,
+                        action='create',
+                        changed_by_id=upload.uploaded_by_id,
+                        reason=reason,
+                    ))
+                elif store_code.code != code:
+                    update(store_code, code)
+        
+        if to_update:
+            StoreProductCode.objects.bulk_update(to_update, ['code', 'updated_at'])
+        
+        CodeChangeLog.objects.bulk_create(logs)
+    
+    return {'created': created, 'updated': len(to_update)}
+
+
+def find_product_by_flexible_name(product_name, threshold=0.8, index=None):
+    """
+    Find product with flexible name matching using fuzzy string matching
+
+    The best match is the product whose Arabic or English name has the highest
+    SequenceMatcher ratio. Pass a prebuilt ``ProductMatchIndex`` when matching
+    many names against the catalog, otherwise one is built for this call.
+    """
+    from .models import Product
+    from .utils_pkg.matching_index import ProductMatchIndex
+    
+    if index is None:
+        index = ProductMatchIndex(Product.objects.all())
     
-    return best_match, best_score
+    return index.find(product_name, threshold=threshold)
 
 
 def is_price_match(file_price, system_price, tolerance=0.1):
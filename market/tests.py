@@ -1,3 +1,482 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from difflib import SequenceMatcher
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from accounts.choices import Role
+
+from inventory.utils import create_inventory_item, deduct_products_amounts, delete_inventory_item
+from market.models import (
+    Category,
+    CodeChangeLog,
+    Company,
+    Product,
+    ProductMatchCache,
+    ProductStatistics,
+    StoreProductCode,
+)
+from market.tasks import process_upload_chunk
+from market.utils import verify_products_statistics
+from market.utils_pkg.matching_index import ProductMatchIndex
+from market.utils_pkg.rag_export import MANIFEST_FILE, export_rag_drugs, get_content_hash, iter_rag_drugs
+from market.views import ProductListAPIView
+
+
+def full_scan(products, product_name, threshold):
+    best_match = None
+    best_score = 0
+
+    for product in products:
+        arabic_score = SequenceMatcher(None, product_name.lower(), product.name.lower()).ratio()
+        english_score = SequenceMatcher(None, product_name.lower(), product.e_name.lower()).ratio()
+        score = max(arabic_score, english_score)
+
+        if score > best_score and score >= threshold:
+            best_score = score
+            best_match = product
+
+    return best_match, best_score
+
+
+class ProductMatchIndexTest(SimpleTestCase):
+    def setUp(self):
+        names = [
+            ("بانادول اكسترا", "Panadol Extra"),
+            ("بانادول ادفانس", "Panadol Advance"),
+            ("بانادول كولد اند فلو", "Panadol Cold & Flu"),
+            ("اوجمنتين 1 جم", "Augmentin 1g"),
+            ("اوجمنتين 625 مجم", "Augmentin 625mg"),
+            ("كونجستال", "Congestal"),
+            ("فولتارين 50", "Voltaren 50"),
+            ("فولتارين 75 امبول", "Voltaren 75 Amp"),
+            ("ب", "B"),
+            ("", ""),
+            ("بانادول اكسترا", "Panadol Extra Duplicate"),
+        ]
+        self.products = [SimpleNamespace(id=i, name=name, e_name=e_name) for i, (name, e_name) in enumerate(names)]
+        self.index = ProductMatchIndex(self.products)
+
+    def test_matches_full_scan(self):
+        queries = [
+            "Panadol Extra",
+            "panadol extr",
+            "بانادول اكستر",
+            "PANADOL ADVANCED",
+            "Augmentin 1 g",
+            "augmentin 625",
+            "كونجستل",
+            "Voltaren 75",
+            "voltarin 50",
+            "unknown product",
+            "ب",
+            "",
+            "a",
+        ]
+        for threshold in (0.8, 0.6, 0.95):
+            for query in queries:
+                with self.subTest(query=query, threshold=threshold):
+                    expected_product, expected_score = full_scan(self.products, query, threshold)
+                    product, score = self.index.find(query, threshold=threshold)
+                    self.assertIs(product, expected_product)
+                    self.assertEqual(score, expected_score)
+
+    def test_ties_go_to_first_product(self):
+        product, score = self.index.find("بانادول اكسترا")
+        self.assertIs(product, self.products[0])
+        self.assertEqual(score, 1.0)
+
+    def test_no_match_below_threshold(self):
+        self.assertEqual(self.index.find("zzzz"), (None, 0))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+class ProductMatchCacheAccessTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        product = Product.objects.create(
+            name="Product",
+            e_name="Product",
+            public_price=Decimal("100.00"),
+            company=company,
+            category=category,
+            shape="اقراص",
+        )
+        self.entries = [
+            ProductMatchCache.objects.create(search_name=f"product {index}", product=product, confidence_score=0.9)
+            for index in range(2)
+        ]
+
+    def test_hits_are_written_in_one_update(self):
+        first, second = self.entries
+        last_accessed = first.last_accessed
+
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                first.increment_access()
+            second.increment_access()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(ProductMatchCache.flush_access_counts(), 6)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.access_count, 5)
+        self.assertEqual(second.access_count, 1)
+        self.assertGreater(first.last_accessed, last_accessed)
+
+        second.delete()
+        first.increment_access()
+        self.assertEqual(ProductMatchCache.flush_access_counts(), 1)
+        self.assertEqual(ProductMatchCache.flush_access_counts(), 0)
+
+        first.refresh_from_db()
+        self.assertEqual(first.access_count, 6)
+
+
+class ProductStatisticsTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        self.products = [
+            Product.objects.create(
+                name=f"Product {index}",
+                e_name=f"Product {index}",
+                public_price=Decimal("100.00"),
+                company=company,
+                category=category,
+                shape="اقراص",
+            )
+            for index in range(2)
+        ]
+
+    def add_lot(self, product, quantity):
+        return create_inventory_item(
+            {
+                "product": product,
+                "purchase_discount_percentage": Decimal("10.00"),
+                "purchase_price": Decimal("90.00"),
+                "selling_discount_percentage": Decimal("10.00"),
+                "selling_price": Decimal("90.00"),
+                "quantity": quantity,
+                "remaining_quantity": quantity,
+                "purchase_sub_total": Decimal("90.00") * quantity,
+                "selling_sub_total": Decimal("90.00") * quantity,
+            }
+        )
+
+    def test_inventory_flows_keep_stock_up_to_date(self):
+        first, second = self.products
+        self.add_lot(first, 10)
+        lot = self.add_lot(first, 5)
+        self.add_lot(second, 3)
+
+        deduct_products_amounts([(first, 12), (second, 1)])
+        lot.refresh_from_db()
+        delete_inventory_item(lot)
+
+        stock = dict(ProductStatistics.objects.values_list("product_id", "total_in_stock"))
+        self.assertEqual(stock, {first.pk: 0, second.pk: 2})
+        self.assertEqual(verify_products_statistics(), [])
+
+    def test_rebuild_and_verify_command(self):
+        first, _ = self.products
+        self.add_lot(first, 7)
+        ProductStatistics.objects.filter(product=first).update(total_in_stock=1, total_sold=4)
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_product_statistics", "--verify")
+
+        call_command("rebuild_product_statistics")
+        call_command("rebuild_product_statistics", "--verify")
+
+        statistics = ProductStatistics.objects.get(product=first)
+        self.assertEqual((statistics.total_in_stock, statistics.total_sold), (7, 0))
+
+
+class DrugSearchAPIViewTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(username="+201000000050", name="Agent", role=Role.PHARMACY))
+        store = User.objects.create_user(username="+201000000051", name="Store", role=Role.STORE)
+
+        company = Company.objects.create(name="GSK", e_name="GlaxoSmithKline")
+        other_company = Company.objects.create(name="Pharco")
+        category = Category.objects.create(name="Painkillers")
+
+        self.products = []
+        for index in range(6):
+            product = Product.objects.create(
+                name=f"Panadol {index}",
+                e_name=f"Panadol {index}",
+                public_price=Decimal("50.00"),
+                company=company if index % 2 else other_company,
+                category=category,
+                shape="اقراص",
+            )
+            StoreProductCode.objects.bulk_create(
+                [StoreProductCode(product=product, store_id=store.pk, code=index * 10 + code) for code in range(index)]
+            )
+            self.products.append(product)
+
+    def search(self, query, limit):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("market:ai-drug-search"), {"q": query, "limit": limit})
+
+        self.assertEqual(response.status_code, 200)
+        return response.data, len(queries)
+
+    def test_queries_do_not_grow_with_results(self):
+        small, small_queries = self.search("panadol", 1)
+        large, large_queries = self.search("panadol", 6)
+
+        self.assertEqual(small["count"], 1)
+        self.assertEqual(large["count"], 6)
+        self.assertEqual(small_queries, large_queries)
+        self.assertEqual([result["available_quantity"] for result in large["results"]], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([result["in_stock"] for result in large["results"]][:2], [False, True])
+
+    def test_matches_company_names(self):
+        data, _ = self.search("glaxo", 10)
+
+        self.assertEqual([result["id"] for result in data["results"]], [self.products[index].id for index in (1, 3, 5)])
+
+
+class ProductSearchTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Company")
+        self.category = Category.objects.create(name="Category")
+
+    def create_product(self, name, e_name="Xyz", effective_material="", company=None):
+        return Product.objects.create(
+            name=name,
+            e_name=e_name,
+            effective_material=effective_material,
+            public_price=Decimal("100.00"),
+            company=company or self.company,
+            category=self.category,
+            shape="اقراص",
+        )
+
+    def matches(self, query):
+        return set(Product.objects.filter(search_vector=SearchQuery(query, config="arabic")))
+
+    def search(self, query, search_mode="hybrid", min_similarity=0.2):
+        return list(ProductListAPIView().search(Product.objects.all(), query, search_mode, min_similarity))
+
+    def test_search_vector_follows_changes(self):
+        product = self.create_product("Panadol")
+        self.assertEqual(self.matches("panadol"), {product})
+
+        product.name = "Brufen"
+        product.save()
+        self.assertEqual(self.matches("panadol"), set())
+        self.assertEqual(self.matches("brufen"), {product})
+
+        # Company name is part of the vector
+        self.company.name = "Glaxo"
+        self.company.save()
+        self.assertEqual(self.matches("glaxo"), {product})
+
+        Product.objects.update(search_vector=None)
+        self.assertEqual(self.matches("brufen"), set())
+        Product.objects.all().update_search_vector()
+        self.assertEqual(self.matches("brufen"), {product})
+
+    def test_prefix_matches_rank_first(self):
+        contains = self.create_product("Extra Panadol")
+        prefix = self.create_product("Panadol Extra")
+        self.create_product("Brufen")
+
+        self.assertEqual(self.search("panadol"), [prefix, contains])
+        self.assertEqual(self.search("panadol", "fts"), [prefix, contains])
+
+    def test_trigram_uses_min_similarity(self):
+        # similarity("panadol", "panadolextraforte tablets") is about 0.26, under the pg_trgm default of 0.3
+        product = self.create_product("Panadolextraforte tablets")
+
+        self.assertEqual(self.search("panadol", "trigram", 0.2), [product])
+        self.assertEqual(self.search("panadol", "trigram", 0.3), [])
+        self.assertEqual(self.search("panadol", "hybrid", 0.2), [product])
+
+    def test_trigram_matches_company_name(self):
+        company = Company.objects.create(name="Glaxosmithkline")
+        product = self.create_product("Brufen", company=company)
+        self.create_product("Congestal")
+
+        self.assertEqual(self.search("glaxosmithklin", "trigram"), [product])
+        self.assertEqual(self.search("glaxosmithklin", "hybrid"), [product])
+
+
+class StoreProductCodeUploadTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        User = get_user_model()
+        self.store = User.objects.create_user(username="+201000000060", name="Store", role=Role.STORE)
+        self.products = {
+            name: Product.objects.create(
+                name=name,
+                e_name=name,
+                public_price=Decimal("100.00"),
+                company=company,
+                category=category,
+                shape="اقراص",
+            )
+            for name in ("Panadol", "Brufen", "Congestal", "Augmentin")
+        }
+        StoreProductCode.objects.create(product=self.products["Brufen"], store=self.store, code=20)
+        StoreProductCode.objects.create(product=self.products["Congestal"], store=self.store, code=30)
+
+    def test_chunk_logs_created_and_updated_codes(self):
+        upload = SimpleNamespace(id=7, store=self.store, uploaded_by_id=self.store.pk)
+        chunk = [
+            (2, {"product_name": "Panadol", "code": 10}),
+            (3, {"product_name": "Brufen", "code": 21}),
+            (4, {"product_name": "Congestal", "code": 30}),
+            (5, {"product_name": "Augmentin", "code": 40}),
+            # Later rows of the same product win
+            (6, {"product_name": "Panadol", "code": 11}),
+        ]
+        bulk_create = StoreProductCode.objects.bulk_create
+
+        def insert_concurrently(objs, **kwargs):
+            # Another upload inserts Augmentin between the fetch of the existing codes and the insert
+            StoreProductCode.objects.create(product=self.products["Augmentin"], store=self.store, code=44)
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(StoreProductCode.objects, "bulk_create", side_effect=insert_concurrently):
+            results = process_upload_chunk(upload, chunk, ProductMatchIndex(Product.objects.all()))
+
+        self.assertEqual([result["status"] for result in results], ["success"] * 5)
+        self.assertEqual(
+            dict(StoreProductCode.objects.filter(store=self.store).values_list("product__name", "code")),
+            {"Panadol": 11, "Brufen": 21, "Congestal": 30, "Augmentin": 40},
+        )
+        self.assertEqual(
+            set(
+                CodeChangeLog.objects.values_list(
+                    "store_product_code__product__name", "action", "old_code", "new_code", "reason"
+                )
+            ),
+            {
+                ("Panadol", "create", None, 11, "Upload #7"),
+                ("Brufen", "update", 20, 21, "Upload #7"),
+                ("Augmentin", "update", 44, 40, "Upload #7"),
+            },
+        )
+
+
+# The agent checks the same drug hashes to the same value (fastapi_agent/test_rag_sync.py)
+RAG_SAMPLE_DRUG = {
+    "id": 987654,
+    "name": "بانادول اكسترا",
+    "e_name": "Panadol Extra",
+    "company": "جلاكسو",
+    "company_english": "GSK",
+    "category": "مسكنات",
+    "category_english": "Painkillers",
+    "public_price": "45.50",
+    "effective_material": "Paracetamol",
+    "letter": "P",
+    "shape": "اقراص",
+    "needed": False,
+    "is_illegal": False,
+    "fridge": False,
+}
+RAG_SAMPLE_HASH = "77f2e73a7dbac46d60a3268a5ba9cb8f6c8710fd"
+
+
+class RagExportTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="جلاكسو", e_name="GSK")
+        self.category = Category.objects.create(name="مسكنات", e_name="Painkillers")
+        self.product = Product.objects.create(
+            id=RAG_SAMPLE_DRUG["id"],
+            name="بانادول اكسترا",
+            e_name="Panadol Extra",
+            public_price=Decimal("45.50"),
+            company=self.company,
+            category=self.category,
+            effective_material="Paracetamol",
+            letter="P",
+            shape="اقراص",
+        )
+        self.output_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def read(self, name):
+        with open(os.path.join(self.output_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+
+    def export(self):
+        return export_rag_drugs(self.output_dir)
+
+    def assertStats(self, stats, created=0, updated=0, deleted=0, unchanged=0, written=True):
+        self.assertEqual(
+            {key: stats[key] for key in ("created", "updated", "deleted", "unchanged", "written")},
+            {"created": created, "updated": updated, "deleted": deleted, "unchanged": unchanged, "written": written},
+        )
+
+    def test_content_hash_matches_the_agent(self):
+        drug = next(iter_rag_drugs())
+
+        self.assertEqual({key: value for key, value in drug.items() if key != "content_hash"}, RAG_SAMPLE_DRUG)
+        self.assertEqual(drug["content_hash"], RAG_SAMPLE_HASH)
+        self.assertEqual(get_content_hash(RAG_SAMPLE_DRUG), RAG_SAMPLE_HASH)
+
+    def test_export_is_incremental(self):
+        self.assertStats(self.export(), created=1)
+
+        drugs = self.read("drugs.json")
+        # The agent reads the file back, the hash must survive the JSON round trip
+        self.assertEqual([get_content_hash(drug) for drug in drugs], [drug["content_hash"] for drug in drugs])
+        self.assertEqual(self.read(MANIFEST_FILE), {"987654": RAG_SAMPLE_HASH})
+
+        mtime = os.path.getmtime(os.path.join(self.output_dir, "drugs.json"))
+        self.assertStats(self.export(), unchanged=1, written=False)
+        self.assertEqual(os.path.getmtime(os.path.join(self.output_dir, "drugs.json")), mtime)
+
+        self.product.public_price = Decimal("50.00")
+        self.product.save()
+        Product.objects.create(
+            name="بروفين",
+            e_name="Brufen",
+            public_price=Decimal("30.00"),
+            company=self.company,
+            category=self.category,
+            shape="اقراص",
+        )
+        self.assertStats(self.export(), created=1, updated=1)
+        self.assertNotEqual(self.read(MANIFEST_FILE)["987654"], RAG_SAMPLE_HASH)
+
+        self.product.delete()
+        self.assertStats(self.export(), deleted=1, unchanged=1)
+        self.assertEqual([drug["e_name"] for drug in self.read("drugs.json")], ["Brufen"])
+
+    def test_sync_command_reports_unchanged_catalog(self):
+        self.export()
+        out = StringIO()
+        call_command("sync_rag_data", output_dir=self.output_dir, stdout=out)
+
+        self.assertIn("0 new, 0 changed, 0 deleted, 1 unchanged products", out.getvalue())
+        self.assertIn("nothing to sync", out.getvalue())
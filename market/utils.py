@@ -19,3 +19,155 @@ def update_product(product, data, affect_offers=True, update_carts=True):
         update_offer_product_public_price(product, update_carts=update_carts)
 
     return product
+
+
+# Product statistics
+def affect_products_statistics(changes):
+    """
+    Add `(product, field, quantity)` changes (negative to subtract) to the products statistics.
+
+    Missing rows are created, then all the changes are applied with one conditional update.
+    """
+    from collections import defaultdict
+    from django.db import models
+    from django.utils import timezone
+
+    ProductStatistics = get_model("market", "ProductStatistics")
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    for product, field, quantity in changes:
+        if quantity:
+            deltas[getattr(product, "pk", product)][field] += quantity
+
+    if not deltas:
+        return
+
+    ProductStatistics.objects.bulk_create(
+        [ProductStatistics(product_id=product_id) for product_id in deltas], ignore_conflicts=True
+    )
+
+    fields = {field for product_deltas in deltas.values() for field in product_deltas}
+    ProductStatistics.objects.filter(product_id__in=deltas).update(
+        updated_at=timezone.now(),
+        **{
+            field: models.Case(
+                *[
+                    models.When(product_id=product_id, then=models.F(field) + product_deltas[field])
+                    for product_id, product_deltas in deltas.items()
+                    if product_deltas.get(field)
+                ],
+                default=models.F(field),
+            )
+            for field in fields
+        },
+    )
+
+
+def compute_products_statistics(product_ids=None):
+    """
+    The statistics of products (all of them when `product_ids` is None) computed from the invoices and
+    the inventory with one grouped aggregate per source, `{product_id: {field: value}}`.
+    """
+    from collections import defaultdict
+    from django.db import models
+    from invoices.choices import (
+        PurchaseInvoiceStatusChoice,
+        PurchaseReturnInvoiceStatusChoice,
+        SaleInvoiceStatusChoice,
+        SaleReturnInvoiceStatusChoice,
+    )
+
+    sources = [
+        ("total_purchases", "invoices", "PurchaseInvoiceItem", "product", PurchaseInvoiceStatusChoice.CLOSED),
+        (
+            "total_purchases_returned",
+            "invoices",
+            "PurchaseReturnInvoiceItem",
+            "purchase_invoice_item__product",
+            PurchaseReturnInvoiceStatusChoice.CLOSED,
+        ),
+        ("total_sold", "invoices", "SaleInvoiceItem", "product", SaleInvoiceStatusChoice.CLOSED),
+        (
+            "total_sales_returned",
+            "invoices",
+            "SaleReturnInvoiceItem",
+            "sale_invoice_item__product",
+            SaleReturnInvoiceStatusChoice.CLOSED,
+        ),
+        ("total_in_stock", "inventory", "InventoryItem", "product", None),
+    ]
+
+    statistics = defaultdict(lambda: dict.fromkeys(get_model("market", "ProductStatistics").FIELDS, 0))
+
+    for field, app_label, model_name, product_field, status in sources:
+        queryset = get_model(app_label, model_name).objects.all()
+
+        if status is not None:
+            queryset = queryset.filter(invoice__status=status)
+        if product_ids is not None:
+            queryset = queryset.filter(**{f"{product_field}__in": product_ids})
+
+        quantity_field = "remaining_quantity" if field == "total_in_stock" else "quantity"
+        rows = (
+            queryset.order_by()
+            .values_list(product_field)
+            .annotate(total=models.Sum(quantity_field))
+            .values_list(product_field, "total")
+        )
+
+        for product_id, total in rows:
+            statistics[product_id][field] = total or 0
+
+    return statistics
+
+
+def rebuild_products_statistics(product_ids=None):
+    """Recompute the statistics of products from scratch, returns the number of written rows"""
+    ProductStatistics = get_model("market", "ProductStatistics")
+
+    statistics = compute_products_statistics(product_ids)
+    queryset = ProductStatistics.objects.all()
+
+    if product_ids is not None:
+        queryset = queryset.filter(product_id__in=product_ids)
+
+    # Products without any activity anymore
+    queryset.exclude(product_id__in=list(statistics)).update(**dict.fromkeys(ProductStatistics.FIELDS, 0))
+
+    ProductStatistics.objects.bulk_create(
+        [ProductStatistics(product_id=product_id, **values) for product_id, values in statistics.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["product"],
+        update_fields=[*ProductStatistics.FIELDS, "updated_at"],
+    )
+
+    return len(statistics)
+
+
+def verify_products_statistics(product_ids=None):
+    """
+    Compare the stored statistics with recomputed ones.
+
+    Returns `[(product_id, field, stored, expected)]` for every difference.
+    """
+    ProductStatistics = get_model("market", "ProductStatistics")
+
+    expected = compute_products_statistics(product_ids)
+    stored = ProductStatistics.objects.all()
+
+    if product_ids is not None:
+        stored = stored.filter(product_id__in=product_ids)
+
+    stored = {row["product_id"]: row for row in stored.values("product_id", *ProductStatistics.FIELDS)}
+    differences = []
+
+    for product_id in sorted(set(expected) | set(stored)):
+        for field in ProductStatistics.FIELDS:
+            stored_value = stored.get(product_id, {}).get(field, 0)
+            expected_value = expected[product_id][field] if product_id in expected else 0
+
+            if stored_value != expected_value:
+                differences.append((product_id, field, stored_value, expected_value))
+
+    return differences
@@ -6,6 +6,20 @@ from market.models import Product, ProductMatchCache
 from django.utils import timezone
 from datetime import timedelta
 
+
+def normalize_text(text):
+    """تطبيع النص لإزالة الاختلافات غير المهمة"""
+    if not text:
+        return ""
+
+    text = str(text).strip()
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\w\s]', '', text)
+    text = text.lower()
+
+    return text
+
+
 class AdvancedProductMatcher:
     def __init__(self, threshold=75, cache_days=30):
         self.threshold = threshold
@@ -13,15 +27,7 @@ class AdvancedProductMatcher:
         
     def normalize_text(self, text):
         """تطبيع النص لإزالة الاختلافات غير المهمة"""
-        if not text:
-            return ""
-        
-        text = str(text).strip()
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\w\s]', '', text)
-        text = text.lower()
-        
-        return text
+        return normalize_text(text)
     
     def arabic_similarity(self, text1, text2):
         """حساب التشابه للنصوص العربية"""
@@ -67,6 +73,8 @@ class AdvancedProductMatcher:
             ).order_by('-confidence_score').first()
             
             if cache_entry and cache_entry.confidence_score >= self.threshold/100:
+                # Buffered, the hit itself doesn't write to the database
+                cache_entry.increment_access()
                 return cache_entry.product, cache_entry.confidence_score * 100
         except Exception:
             pass
@@ -0,0 +1,212 @@
+# market/utils_pkg/matching_index.py
+"""
+In-memory product name index used by bulk store-code uploads.
+
+The index is built once per upload and answers the same question as the old
+per-row catalog scan in ``market.tasks.find_product_by_flexible_name``: the
+product whose Arabic or English name has the highest ``SequenceMatcher`` ratio
+against the searched name (first product wins ties).  Instead of comparing
+every row against every product, candidates are pruned with a character
+bigram index whose bounds are exact upper limits of the ratio, so the result
+and the confidence are identical to the full scan.
+"""
+import math
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+from .matching_engine import normalize_text
+
+EPSILON = 1e-9
+
+# Entries sharing the most normalized tokens with the query are scored first
+# so the pruning threshold is raised before the bigram pass runs.
+SEED_SIZE = 8
+SEED_MAX_POSTINGS = 1000
+
+# SequenceMatcher enables its "autojunk" heuristic for sequences this long,
+# in which case equal strings are not guaranteed to score 1.0.
+AUTOJUNK_LENGTH = 200
+
+
+def _bigrams(text):
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def _ratio_upper_bound(query_length, text_length, shared_bigrams):
+    """
+    Upper bound of ``SequenceMatcher(None, query, text).ratio()``.
+
+    With ``M`` matched characters split into ``k`` matching blocks, at least
+    ``M - k`` bigram positions of the query also occur in the text, and two
+    consecutive blocks are always separated by an unmatched character, so
+    ``k - 1 <= L - 2M``.  Together: ``M <= (shared + L + 1) / 3``.
+    """
+    total = query_length + text_length
+    if total == 0:
+        return 1.0
+
+    matched = min(query_length, text_length, (shared_bigrams + total + 1) / 3)
+    return 2.0 * matched / total
+
+
+class ProductMatchIndex:
+    """
+    Prebuilt matcher over a product catalog.
+
+    ``products`` is iterated once; its order is the tie-breaking order, exactly
+    like the iteration order of the full scan it replaces.
+    """
+
+    def __init__(self, products):
+        self.products = []
+        self._texts = []
+        self._owners = []
+        self._exact = {}
+        self._by_length = defaultdict(list)
+        self._bigram_postings = defaultdict(list)
+        self._token_postings = defaultdict(list)
+        self._memo = {}
+
+        for product in products:
+            position = len(self.products)
+            self.products.append(product)
+
+            for value in (product.name, product.e_name):
+                self._add_entry(position, (value or "").lower())
+
+    def __len__(self):
+        return len(self.products)
+
+    def _add_entry(self, position, text):
+        entry = len(self._texts)
+        self._texts.append(text)
+        self._owners.append(position)
+
+        self._exact.setdefault(text, position)
+        self._by_length[len(text)].append(entry)
+
+        for bigram in set(_bigrams(text)):
+            self._bigram_postings[bigram].append(entry)
+
+        for token in set(normalize_text(text).split()):
+            self._token_postings[token].append(entry)
+
+    def find(self, product_name, threshold=0.8):
+        """
+        Return ``(product, score)`` for the best match scoring at least
+        ``threshold``, or ``(None, 0)`` when nothing qualifies.
+        """
+        query = str(product_name).lower()
+        key = (query, threshold)
+        if key not in self._memo:
+            self._memo[key] = self._find(query, threshold)
+
+        position, score = self._memo[key]
+        if position is None:
+            return None, 0
+        return self.products[position], score
+
+    def _find(self, query, threshold):
+        if len(query) < AUTOJUNK_LENGTH and query in self._exact and threshold <= 1.0:
+            return self._exact[query], 1.0
+
+        best = [None, 0.0]
+
+        def consider(entry):
+            position = self._owners[entry]
+            matcher = SequenceMatcher(None, query, self._texts[entry])
+            floor = max(threshold, best[1])
+            if matcher.real_quick_ratio() < floor - EPSILON or matcher.quick_ratio() < floor - EPSILON:
+                return
+
+            score = matcher.ratio()
+            if score < threshold:
+                return
+            if score > best[1] or (score == best[1] and best[0] is not None and position < best[0]):
+                best[0], best[1] = position, score
+
+        for entry in self._seed_entries(query):
+            consider(entry)
+
+        candidates = self._candidate_entries(query, max(threshold, best[1]))
+        candidates.sort(key=lambda item: (-item[1], self._owners[item[0]]))
+
+        for entry, upper_bound in candidates:
+            if upper_bound < best[1] - EPSILON:
+                break
+            if best[0] is not None and upper_bound < best[1] + EPSILON and self._owners[entry] > best[0]:
+                continue
+            consider(entry)
+
+        return best[0], best[1]
+
+    def _seed_entries(self, query):
+        shared = defaultdict(int)
+        for token in set(normalize_text(query).split()):
+            postings = self._token_postings.get(token, ())
+            if len(postings) > SEED_MAX_POSTINGS:
+                continue
+            for entry in postings:
+                shared[entry] += 1
+
+        ranked = sorted(shared.items(), key=lambda item: (-item[1], self._owners[item[0]]))
+        return [entry for entry, _ in ranked[:SEED_SIZE]]
+
+    def _candidate_entries(self, query, threshold):
+        """
+        Return ``(entry, upper_bound)`` pairs for every entry that can still
+        reach ``threshold``.
+        """
+        query_length = len(query)
+
+        if threshold <= EPSILON:
+            lengths = list(self._by_length)
+        else:
+            min_length = math.ceil(threshold * query_length / (2 - threshold) - EPSILON)
+            max_length = math.floor(query_length * (2 - threshold) / threshold + EPSILON)
+            lengths = [length for length in self._by_length if min_length <= length <= max_length]
+
+        if not lengths:
+            return []
+
+        # Fewest shared bigram positions an entry of an allowed length needs.
+        required = min(
+            math.ceil((1.5 * threshold - 1) * (query_length + length) - 1 - EPSILON)
+            for length in (min(lengths), max(lengths))
+        )
+
+        query_bigrams = defaultdict(int)
+        for bigram in _bigrams(query):
+            query_bigrams[bigram] += 1
+
+        if required < 1 or not query_bigrams:
+            return [
+                (entry, _ratio_upper_bound(query_length, length, query_length))
+                for length in lengths
+                for entry in self._by_length[length]
+            ]
+
+        # Prefix filtering: an entry sharing none of the rarer bigrams can
+        # match at most the skipped (most common) positions, which is fewer
+        # than required, so only postings of the rarer bigrams are walked.
+        ordered = sorted(query_bigrams, key=lambda bigram: len(self._bigram_postings.get(bigram, ())))
+        skipped = 0
+        while ordered and skipped + query_bigrams[ordered[-1]] < required:
+            skipped += query_bigrams[ordered.pop()]
+
+        hits = defaultdict(int)
+        for bigram in ordered:
+            for entry in self._bigram_postings.get(bigram, ()):
+                hits[entry] += query_bigrams[bigram]
+
+        allowed = set(lengths)
+        candidates = []
+        for entry, shared in hits.items():
+            length = len(self._texts[entry])
+            if length not in allowed:
+                continue
+            upper_bound = _ratio_upper_bound(query_length, length, shared + skipped)
+            if upper_bound >= threshold - EPSILON:
+                candidates.append((entry, upper_bound))
+
+        return candidates
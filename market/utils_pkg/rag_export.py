@@ -0,0 +1,115 @@
+# market/utils_pkg/rag_export.py
+"""
+Export of the drug catalog used by the AI agent RAG index
+(``fastapi_agent/services/rag_service.py``).
+
+Every exported drug carries a ``content_hash`` of its fields.  The agent keys its
+index on product id plus that hash, so only new or changed products are embedded
+again and products missing from the export are deleted.  A manifest of the last
+export (``drugs.manifest.json``) lets an export that changes nothing leave the
+file untouched, in which case the agent has nothing to sync.
+"""
+import hashlib
+import json
+import os
+
+from django.conf import settings
+
+EXPORT_CHUNK_SIZE = 2000
+MANIFEST_FILE = "drugs.manifest.json"
+
+
+def get_rag_data_dir():
+    return getattr(settings, "RAG_DATA_DIR", os.path.join(settings.BASE_DIR, "rag_data"))
+
+
+def get_content_hash(drug):
+    """
+    Same hash as ``rag_service.get_content_hash`` on the agent side.
+    """
+    content = {key: value for key, value in drug.items() if key != "content_hash"}
+    payload = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def iter_rag_drugs(chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Serialized drugs with their ``content_hash``, streamed in chunks of products.
+    """
+    from market.ai_serializers import DrugDetailSerializer
+    from market.models import Product
+
+    products = Product.objects.select_related("company", "category").order_by("id")
+
+    batch = []
+    for product in products.iterator(chunk_size=chunk_size):
+        batch.append(product)
+        if len(batch) >= chunk_size:
+            yield from _serialize(DrugDetailSerializer, batch)
+            batch = []
+
+    if batch:
+        yield from _serialize(DrugDetailSerializer, batch)
+
+
+def _serialize(serializer_class, products):
+    for item in serializer_class(products, many=True).data:
+        drug = dict(item)
+        drug["content_hash"] = get_content_hash(drug)
+        yield drug
+
+
+def _write_atomic(path, write):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def export_rag_drugs(output_dir=None, output_format="json", force=False):
+    """
+    Export the catalog to ``<output_dir>/drugs.<format>`` when it changed since the last export.
+
+    Returns the number of created, updated, deleted and unchanged products compared with
+    the previous export and whether the file was written.
+    """
+    output_dir = output_dir or get_rag_data_dir()
+    os.makedirs(output_dir, exist_ok=True)
+
+    output_file = os.path.join(output_dir, f"drugs.{output_format}")
+    manifest_file = os.path.join(output_dir, MANIFEST_FILE)
+
+    previous_hashes = {}
+    if os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            previous_hashes = json.load(f)
+
+    drugs = list(iter_rag_drugs())
+    hashes = {str(drug["id"]): drug["content_hash"] for drug in drugs}
+
+    created = len(hashes.keys() - previous_hashes.keys())
+    deleted = len(previous_hashes.keys() - hashes.keys())
+    updated = sum(1 for key, value in hashes.items() if key in previous_hashes and previous_hashes[key] != value)
+
+    stats = {
+        "created": created,
+        "updated": updated,
+        "deleted": deleted,
+        "unchanged": len(hashes) - created - updated,
+        "output_file": output_file,
+        "written": False,
+    }
+
+    if not (force or created or updated or deleted or not os.path.exists(output_file)):
+        return stats
+
+    if output_format == "json":
+        _write_atomic(output_file, lambda f: json.dump(drugs, f, ensure_ascii=False, indent=2))
+    else:
+        # JSON Lines format (one JSON object per line)
+        _write_atomic(output_file, lambda f: f.writelines(json.dumps(drug, ensure_ascii=False) + "\n" for drug in drugs))
+
+    _write_atomic(manifest_file, lambda f: json.dump(hashes, f))
+    stats["written"] = True
+
+    return stats
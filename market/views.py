@@ -22,14 +22,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 
 from core.permissions import AllAuthenticatedUsers, SmartRolePermission
+from core.utils import (
+    filter_by_ranked_ids,
+    get_ranked_search_ids,
+    get_search_cache_key,
+    set_trigram_similarity_threshold,
+)
 from accounts.choices import Role
 from accounts.permissions import StaffRoleAuthentication, ManagerRoleAuthentication
-from invoices.choices import (
-    PurchaseInvoiceStatusChoice,
-    SaleInvoiceStatusChoice, 
-    PurchaseReturnInvoiceStatusChoice,
-    SaleReturnInvoiceStatusChoice
-)
 from core.views.abstract_paginations import CustomPageNumberPagination, LargePageNumberPagination
 from market.filters import ProductFilter, ProductCodeFilter
 from market.models import Category, Company, PharmacyProductWishList, Product, ProductCode, StoreProductCodeUpload, Store
@@ -107,13 +107,56 @@ class ProductListAPIView(ListAPIView):
     ]
     ordering = ["name"]
 
-    def get_queryset(self):
-        from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+    def search(self, queryset, search_query, search_mode, min_similarity):
+        """Rank `queryset` with PostgreSQL FTS + Trigram"""
+        from django.contrib.postgres.search import SearchQuery, SearchRank
         from django.contrib.postgres.search import TrigramSimilarity
         from django.db.models import F, Value, Q, Case, When, IntegerField
-        from django.core.cache import cache
-        import hashlib
-        
+
+        # Stored, GIN-indexed vector (Arabic config, weighted name/material/company/e_name)
+        query = SearchQuery(search_query, config='arabic', search_type='websearch')
+        queryset = queryset.annotate(rank=SearchRank(F('search_vector'), query))
+        fts_match = Q(search_vector=query)
+
+        # Trigram similarity for fuzzy matching
+        trig = (
+            TrigramSimilarity('name', search_query) * 1.0 +
+            TrigramSimilarity('effective_material', search_query) * 0.8 +
+            TrigramSimilarity('company__name', search_query) * 0.6 +
+            TrigramSimilarity('e_name', search_query) * 0.4
+        )
+        queryset = queryset.annotate(sim=trig)
+        # Index-backed candidates (pg_trgm %), the weighted score is computed on them only:
+        # a match needs at least one of the scored fields as similar as `min_similarity`
+        trigram_match = (
+            Q(name__trigram_similar=search_query) |
+            Q(effective_material__trigram_similar=search_query) |
+            Q(company__name__trigram_similar=search_query) |
+            Q(e_name__trigram_similar=search_query)
+        )
+
+        if search_mode != 'fts':
+            # `%` must accept the same matches as `min_similarity`
+            set_trigram_similarity_threshold(min_similarity, queryset.db)
+
+        if search_mode == 'fts':
+            queryset = queryset.filter(fts_match).order_by('-rank')
+        elif search_mode == 'trigram':
+            queryset = queryset.filter(trigram_match, sim__gte=min_similarity).order_by('-sim')
+        else:  # hybrid
+            queryset = queryset.filter(fts_match | (trigram_match & Q(sim__gte=min_similarity)))
+            queryset = queryset.annotate(score=F('rank')*1.0 + F('sim')*0.7).order_by('-score')
+
+        # Partial prefix match boost
+        return queryset.annotate(
+            starts=Case(
+                When(name__istartswith=search_query, then=Value(1)), 
+                default=Value(0), 
+                output_field=IntegerField()
+            )
+        ).order_by('-starts', '-score' if search_mode == 'hybrid' else '-rank' if search_mode == 'fts' else '-sim')
+
+    def get_queryset(self):
         user = self.request.user
         queryset = Product.objects.with_has_image().select_related('company', 'category')
         
@@ -127,56 +170,16 @@ class ProductListAPIView(ListAPIView):
             min_similarity = 0.2
         
         if search_query:
-            # Redis Cache for search results
-            cache_key_raw = f"search_products_{search_query}_{search_mode}_{min_similarity}_{user.role if hasattr(user, 'role') else 'anon'}"
-            cache_key = hashlib.md5(cache_key_raw.encode()).hexdigest()
-            
-            cached_ids = cache.get(cache_key)
-            if cached_ids is not None:
-                # Return cached results maintaining order
-                queryset = queryset.filter(id__in=cached_ids)
-                preserved_order = Case(*[When(id=pk, then=pos) for pos, pk in enumerate(cached_ids)])
-                return queryset.order_by(preserved_order)
-            
-            # Arabic config for better stemming (changed from 'simple')
-            vector = (
-                SearchVector('name', weight='A', config='arabic') +
-                SearchVector('effective_material', weight='B', config='arabic') +
-                SearchVector('company__name', weight='C', config='arabic') +
-                SearchVector('e_name', weight='D', config='arabic')
+            # Ranked ids of every page, cached until the catalog changes (see `bump_search_cache_version`)
+            cache_key = get_search_cache_key(("catalog",), "products", search_query, search_mode, min_similarity)
+            ranked_ids = get_ranked_search_ids(
+                cache_key, lambda: self.search(queryset, search_query, search_mode, min_similarity)
             )
-            query = SearchQuery(search_query, config='arabic', search_type='websearch')
-            queryset = queryset.annotate(rank=SearchRank(vector, query))
-
-            # Trigram similarity for fuzzy matching
-            trig = (
-                TrigramSimilarity('name', search_query) * 1.0 +
-                TrigramSimilarity('effective_material', search_query) * 0.8 +
-                TrigramSimilarity('company__name', search_query) * 0.6 +
-                TrigramSimilarity('e_name', search_query) * 0.4
-            )
-            queryset = queryset.annotate(sim=trig)
-
-            if search_mode == 'fts':
-                queryset = queryset.filter(rank__gt=0).order_by('-rank')
-            elif search_mode == 'trigram':
-                queryset = queryset.filter(sim__gte=min_similarity).order_by('-sim')
-            else:  # hybrid
-                queryset = queryset.filter(Q(rank__gt=0) | Q(sim__gte=min_similarity))
-                queryset = queryset.annotate(score=F('rank')*1.0 + F('sim')*0.7).order_by('-score')
 
-            # Partial prefix match boost
-            queryset = queryset.annotate(
-                starts=Case(
-                    When(name__istartswith=search_query, then=Value(1)), 
-                    default=Value(0), 
-                    output_field=IntegerField()
-                )
-            ).order_by('-starts', '-score' if search_mode == 'hybrid' else '-rank' if search_mode == 'fts' else '-sim')
-            
-            # Cache the result IDs for 5 minutes
-            result_ids = list(queryset.values_list('id', flat=True)[:100])  # Cache top 100
-            cache.set(cache_key, result_ids, timeout=300)
+            if ranked_ids is not None:
+                queryset = filter_by_ranked_ids(queryset, ranked_ids)
+            else:
+                queryset = self.search(queryset, search_query, search_mode, min_similarity)
         
         # Fallback to original search for backward compatibility
         search_term = self.request.GET.get('search')
@@ -219,6 +222,16 @@ class ProductListAPIView(ListAPIView):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+
+        # Results count of the search log (core.middleware.search_performance)
+        page = getattr(self.paginator, "page", None)
+        if page is not None:
+            request._request.search_results_count = page.paginator.count
+
+        return response
+
 
 class ProductAlternativeListAPIView(ListAPIView):
     permission_classes = [SmartRolePermission]
@@ -301,69 +314,15 @@ class ProductRetrieveAPIView(RetrieveAPIView):
     serializer_class = ProductReadSerializer
 
     def get_queryset(self):
-        purchases_subquery = (
-            get_model("invoices", "PurchaseInvoiceItem")
-            .objects.filter(
-                invoice__status=PurchaseInvoiceStatusChoice.CLOSED,
-                product=models.OuterRef("pk"),
-            )
-            .values("product")
-            .annotate(total_purchased=models.Sum("quantity"))
-            .values("total_purchased")
-        )
-
-        sales_subquery = (
-            get_model("invoices", "SaleInvoiceItem")
-            .objects.filter(
-                invoice__status=SaleInvoiceStatusChoice.CLOSED,
-                product=models.OuterRef("pk"),
-            )
-            .values("product")
-            .annotate(total_sold=models.Sum("quantity"))
-            .values("total_sold")
-        )
-
-        purchases_returns_subquery = (
-            get_model("invoices", "PurchaseReturnInvoiceItem")
-            .objects.filter(
-                invoice__status=PurchaseReturnInvoiceStatusChoice.CLOSED,
-                purchase_invoice_item__product=models.OuterRef("pk"),
-            )
-            .values("purchase_invoice_item__product")
-            .annotate(total_purchases_returned=models.Sum("quantity"))
-            .values("total_purchases_returned")
+        # Maintained by the invoice and inventory flows (market.utils.affect_products_statistics)
+        return Product.objects.annotate(
+            total_purchases=models.F("statistics__total_purchases"),
+            total_purchases_returned=models.F("statistics__total_purchases_returned"),
+            total_sold=models.F("statistics__total_sold"),
+            total_sales_returned=models.F("statistics__total_sales_returned"),
+            total_in_stock=models.F("statistics__total_in_stock"),
         )
 
-        sales_returns_subquery = (
-            get_model("invoices", "SaleReturnInvoiceItem")
-            .objects.filter(
-                invoice__status=SaleReturnInvoiceStatusChoice.CLOSED,
-                sale_invoice_item__product=models.OuterRef("pk"),
-            )
-            .values("sale_invoice_item__product")
-            .annotate(total_sales_returned=models.Sum("quantity"))
-            .values("total_sales_returned")
-        )
-
-        total_in_stock_subquery = (
-            get_model("inventory", "InventoryItem")
-            .objects.filter(
-                product=models.OuterRef("pk"),
-            )
-            .values("product")
-            .annotate(total_in_stock=models.Sum("remaining_quantity"))
-            .values("total_in_stock")
-        )
-
-        queryset = Product.objects.annotate(
-            total_purchases=models.Subquery(purchases_subquery, output_field=models.IntegerField()),
-            total_purchases_returned=models.Subquery(purchases_returns_subquery, output_field=models.IntegerField()),
-            total_sold=models.Subquery(sales_subquery, output_field=models.IntegerField()),
-            total_sales_returned=models.Subquery(sales_returns_subquery, output_field=models.IntegerField()),
-            total_in_stock=models.Subquery(total_in_stock_subquery, output_field=models.IntegerField()),
-        )
-        return queryset
-
 
 class ProductUpdateAPIView(UpdateAPIView):
     permission_classes = [ManagerRoleAuthentication]
@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from core.admin.abstract_admin import DefaultBaseAdminItems
+from core.views.abstract_paginations import EstimatedCountPaginator
 from notifications.models import Notification, Topic, TopicSubscription, FCMToken
 # from notifications.utils import send_user_fcm_message  # Temporarily disabled
 
@@ -29,6 +30,8 @@ class NotificationModelAdmin(DefaultBaseAdminItems):
     ordering = ("-created_at",)
     date_hierarchy = "created_at"
     autocomplete_fields = ("user", "topic")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("user")
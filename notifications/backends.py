@@ -0,0 +1,115 @@
+"""
+Messaging backends used by `notifications.utils.send_push_notification`
+
+The backend is chosen with the `FCM_MESSAGING_BACKEND` setting (dotted path), by default
+Firebase Cloud Messaging. `LocalMessagingBackend` keeps the messages in memory instead,
+for tests and local development.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# أكواد الأخطاء التي تعني أن التوكن لم يعد صالحاً
+INVALID_TOKEN_ERRORS = {"invalid-registration-token", "registration-token-not-registered"}
+
+
+class BaseMessagingBackend:
+    def is_available(self):
+        return True
+
+    def send_multicast(self, tokens, title, message, data=None, image_url=None, click_action=None):
+        """
+        Send one message to at most 500 `tokens`.
+
+        Returns a list of `(token, error_code)` in the order of `tokens`,
+        `error_code` is None when the message was delivered.
+        """
+        raise NotImplementedError
+
+
+class FirebaseMessagingBackend(BaseMessagingBackend):
+    def is_available(self):
+        from notifications.utils import initialize_firebase
+
+        return initialize_firebase() is not None
+
+    def send_multicast(self, tokens, title, message, data=None, image_url=None, click_action=None):
+        from notifications.utils import messaging
+
+        fcm_message = messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title=title,
+                body=message,
+                image=image_url if image_url else None,
+            ),
+            data=data or {},
+            tokens=tokens,
+            # إعدادات إضافية
+            webpush=messaging.WebpushConfig(
+                notification=messaging.WebpushNotification(
+                    title=title,
+                    body=message,
+                    icon="/icon.png",  # أيقونة من public/
+                    badge="/icon.png",
+                    image=image_url if image_url else None,
+                ),
+                fcm_options=messaging.WebpushFCMOptions(
+                    link=click_action if click_action else None,
+                ),
+            ),
+        )
+
+        # send_each_for_multicast متاحة في الإصدارات الحديثة فقط
+        send = getattr(messaging, "send_each_for_multicast", None) or messaging.send_multicast
+        response = send(fcm_message)
+
+        return [(token, self.get_error_code(resp)) for token, resp in zip(tokens, response.responses)]
+
+    @staticmethod
+    def get_error_code(resp):
+        from notifications.utils import messaging
+
+        if resp.success:
+            return None
+
+        if isinstance(resp.exception, messaging.UnregisteredError):
+            return "registration-token-not-registered"
+
+        return getattr(resp.exception, "code", None) or "unknown"
+
+
+class LocalMessagingBackend(BaseMessagingBackend):
+    """
+    Keeps every sent message in `outbox` instead of calling FCM.
+    Tokens in `invalid_tokens` fail as not registered, `available = False` acts as an FCM outage
+    and a batch containing one of `failing_tokens` raises like a failed FCM request.
+    """
+
+    outbox = []
+    invalid_tokens = set()
+    failing_tokens = set()
+    available = True
+
+    def is_available(self):
+        return self.available
+
+    def send_multicast(self, tokens, title, message, data=None, image_url=None, click_action=None):
+        if self.failing_tokens.intersection(tokens):
+            raise ConnectionError("FCM request failed")
+
+        self.outbox.append(
+            {
+                "tokens": list(tokens),
+                "title": title,
+                "message": message,
+                "data": data or {},
+                "image_url": image_url,
+                "click_action": click_action,
+            }
+        )
+
+        return [
+            (token, "registration-token-not-registered" if token in self.invalid_tokens else None)
+            for token in tokens
+        ]
@@ -0,0 +1,31 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_fcmtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='pushed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        # Existing notifications were already pushed synchronously by the old signal
+        migrations.RunSQL(
+            sql='UPDATE notifications_notification SET pushed_at = created_at WHERE pushed_at IS NULL;',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(
+                condition=models.Q(pushed_at__isnull=True),
+                fields=['id'],
+                name='notification_push_pending_idx',
+            ),
+        ),
+    ]
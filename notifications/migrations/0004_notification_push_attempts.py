@@ -0,0 +1,18 @@
+# Generated manually on 2026-10-18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_notification_pushed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='push_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -23,13 +23,24 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     extra = models.JSONField(blank=True, null=True)
     image_url = models.URLField(default="", blank=True)
+    # وقت إرسال الـ Push Notification (null = لم يتم الإرسال بعد)
+    pushed_at = models.DateTimeField(null=True, blank=True)
+    # عدد محاولات الإرسال الفاشلة، بعد PUSH_MAX_ATTEMPTS يبقى pushed_at محدداً ولا يعاد الإرسال
+    push_attempts = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ["-created_at"]
-        indexes = [models.Index(fields=["user", "is_read", "created_at"])]
+        indexes = [
+            models.Index(fields=["user", "is_read", "created_at"]),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(pushed_at__isnull=True),
+                name="notification_push_pending_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Notification for {self.user}: {self.title}"
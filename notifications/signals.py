@@ -1,11 +1,14 @@
+from django.db import transaction
 from django.dispatch import receiver
 from django.db.models.signals import post_save, post_delete
 from notifications.models import Notification
-from notifications.utils import send_user_fcm_message
 
 
 @receiver(post_save, sender=Notification)
 def on_notification_created(sender, instance, created, **kwargs):
-    if created:
-        if instance.user:
-            send_user_fcm_message(instance)
+    # Push is sent in the background by the outbox, bulk created notifications
+    # are picked up by the periodic run of the same task
+    if created and instance.user_id and instance.pushed_at is None:
+        from notifications.tasks import dispatch_push_notifications
+
+        transaction.on_commit(dispatch_push_notifications.delay, robust=True)
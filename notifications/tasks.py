@@ -8,6 +8,7 @@ from celery import shared_task
 from django.apps import apps
 from django.utils import timezone
 from datetime import timedelta
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -194,6 +195,127 @@ def send_bulk_notifications(self, user_ids, title, message, extra=None, image_ur
         raise self.retry(exc=exc)
 
 
+# عدد الإشعارات التي يتم معالجتها في كل تشغيل للـ outbox
+PUSH_OUTBOX_BATCH_SIZE = 1000
+
+# Failed pushes are retried at most this many times, then the notification is given up on
+PUSH_MAX_ATTEMPTS = 5
+
+
+@shared_task
+def dispatch_push_notifications(limit=PUSH_OUTBOX_BATCH_SIZE):
+    """
+    Outbox task sending the push notifications of every notification not pushed yet.
+    
+    Picks up notifications however they were created (create or bulk_create), claims them
+    with `SKIP LOCKED` so parallel workers never send the same one twice, and sends one
+    multicast (in batches of 500 tokens) per distinct payload.
+    
+    The claim is released only for the notifications whose push failed (FCM unavailable,
+    or the users of a token batch that raised), they are sent again by the next run. After
+    `PUSH_MAX_ATTEMPTS` failed attempts a notification stays claimed and is not retried.
+    
+    Returns:
+        dict: Number of dispatched notifications and push results
+    """
+    from django.db import transaction
+    from django.db.models import F
+    from notifications.utils import send_push_notification
+    
+    Notification = get_model("notifications", "Notification")
+    
+    with transaction.atomic():
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(pushed_at__isnull=True)
+            .order_by("id")
+            .only("id", "user_id", "title", "message", "extra", "image_url", "push_attempts")[:limit]
+        )
+        
+        if not pending:
+            return {"success": True, "dispatched": 0}
+        
+        Notification.objects.filter(pk__in=[n.pk for n in pending]).update(pushed_at=timezone.now())
+    
+    # Notifications with the same content are sent together to all of their users
+    payloads = {}
+    for notification in pending:
+        if notification.user_id is None:
+            continue
+        
+        key = (
+            notification.title,
+            notification.message,
+            json.dumps(notification.extra, sort_keys=True, default=str),
+            notification.image_url,
+        )
+        payloads.setdefault(key, []).append(notification)
+    
+    success_count = 0
+    failure_count = 0
+    failed_notifications = []
+    
+    for (title, message, extra, image_url), notifications in payloads.items():
+        user_ids = {notification.user_id for notification in notifications}
+        notification_ids = [notification.pk for notification in notifications]
+        
+        try:
+            result = send_push_notification(
+                title=title,
+                message=message,
+                user_ids=sorted(user_ids),
+                data=json.loads(extra),
+                image_url=image_url or None,
+            )
+        except Exception as e:
+            logger.error(f"Error sending push notifications {notification_ids}: {e}")
+            result = {"success": 0, "failure": 0, "error": str(e)}
+        
+        success_count += result.get("success", 0)
+        failure_count += result.get("failure", 0)
+        
+        # Nothing was sent when the whole call failed, otherwise only the users of the failed
+        # batches are retried so nobody gets the same push twice (no active tokens: nothing to retry)
+        if result.get("error") not in (None, "No active tokens found"):
+            failed_user_ids = user_ids
+        else:
+            failed_user_ids = set(result.get("failed_user_ids", []))
+        
+        failed_notifications.extend(n for n in notifications if n.user_id in failed_user_ids)
+    
+    retry_ids = [n.pk for n in failed_notifications if n.push_attempts + 1 < PUSH_MAX_ATTEMPTS]
+    given_up_ids = [n.pk for n in failed_notifications if n.push_attempts + 1 >= PUSH_MAX_ATTEMPTS]
+    
+    # Release the claim of the failed notifications for the next run
+    if retry_ids:
+        Notification.objects.filter(pk__in=retry_ids).update(
+            pushed_at=None, push_attempts=F("push_attempts") + 1
+        )
+        logger.warning(f"Push of {len(retry_ids)} notifications failed, they will be retried")
+    
+    if given_up_ids:
+        Notification.objects.filter(pk__in=given_up_ids).update(push_attempts=F("push_attempts") + 1)
+        logger.error(f"Push of notifications {given_up_ids} failed {PUSH_MAX_ATTEMPTS} times, giving up")
+    
+    # More notifications are waiting
+    if not retry_ids and len(pending) == limit:
+        dispatch_push_notifications.delay(limit)
+    
+    dispatched = len(pending) - len(failed_notifications)
+    logger.info(
+        f"Dispatched {dispatched} notifications: {success_count} pushes sent, {failure_count} failed"
+    )
+    
+    return {
+        "success": True,
+        "dispatched": dispatched,
+        "retried": len(retry_ids),
+        "given_up": len(given_up_ids),
+        "sent": success_count,
+        "failed": failure_count,
+    }
+
+
 @shared_task
 def delete_old_read_notifications(days=30):
     """
@@ -4,13 +4,17 @@ Tests for the notifications app.
 This module provides comprehensive tests for notifications functionality.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from notifications.models import Notification, Topic, TopicSubscription
+from notifications.backends import LocalMessagingBackend
+from notifications.models import FCMToken, Notification, Topic, TopicSubscription
+from notifications.tasks import PUSH_MAX_ATTEMPTS, dispatch_push_notifications
 
 
 User = get_user_model()
@@ -190,6 +194,34 @@ class NotificationAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
     
+    def test_list_notifications_counts_once(self):
+        """Test that the paginated list runs a single COUNT query."""
+        self.client.force_authenticate(user=self.pharmacy_user)
+        
+        url = reverse("notifications:notifications-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(sum("COUNT(" in query["sql"].upper() for query in queries.captured_queries), 1)
+    
+    def test_notifications_feed_uses_cursor(self):
+        """Test the infinite scroll feed pages with a cursor and no count."""
+        self.client.force_authenticate(user=self.pharmacy_user)
+        
+        url = reverse("notifications:notifications-feed")
+        response = self.client.get(url, {"ps": 1})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertEqual(response.data["results"][0]["id"], self.notification2.id)
+        
+        response = self.client.get(response.data["links"]["next"])
+        
+        self.assertEqual(response.data["results"][0]["id"], self.notification1.id)
+        self.assertIsNone(response.data["links"]["next"])
+    
     def test_list_unread_notifications(self):
         """Test listing only unread notifications."""
         self.client.force_authenticate(user=self.pharmacy_user)
@@ -451,3 +483,128 @@ class TopicSubscriptionAPITest(APITestCase):
         for topic_data in response.data["data"]:
             self.assertIn("is_subscribed", topic_data)
             self.assertIn("subscription_active", topic_data)
+
+
+@override_settings(FCM_MESSAGING_BACKEND="notifications.backends.LocalMessagingBackend")
+class PushOutboxTest(TestCase):
+    """Test cases for the push notification outbox."""
+    
+    def setUp(self):
+        """Set up users with many device tokens."""
+        LocalMessagingBackend.outbox = []
+        LocalMessagingBackend.invalid_tokens = {"token-0-3", "token-1-7"}
+        LocalMessagingBackend.failing_tokens = set()
+        LocalMessagingBackend.available = True
+        
+        self.users = [
+            User.objects.create_user(username=f"pushuser{i}", password="testpass123", role="PHARMACY")
+            for i in range(3)
+        ]
+        FCMToken.objects.bulk_create(
+            FCMToken(user=user, token=f"token-{i}-{j}")
+            for i, user in enumerate(self.users)
+            for j in range(400)
+        )
+    
+    def test_bulk_created_notifications_are_pushed_in_batches(self):
+        """Bulk created notifications are sent as 500-token multicasts."""
+        Notification.objects.bulk_create(
+            Notification(user=user, title="Offer", message="New offer", extra={"offer_id": 1})
+            for user in self.users
+        )
+        
+        result = dispatch_push_notifications()
+        
+        self.assertEqual(result["dispatched"], 3)
+        self.assertEqual(result["sent"], 1198)
+        self.assertEqual(result["failed"], 2)
+        self.assertEqual([len(m["tokens"]) for m in LocalMessagingBackend.outbox], [500, 500, 200])
+        self.assertEqual(LocalMessagingBackend.outbox[0]["data"], {"offer_id": "1"})
+        self.assertEqual(
+            set(FCMToken.objects.filter(is_active=False).values_list("token", flat=True)),
+            {"token-0-3", "token-1-7"},
+        )
+        self.assertFalse(Notification.objects.filter(pushed_at__isnull=True).exists())
+        
+        # Nothing is sent twice
+        self.assertEqual(dispatch_push_notifications()["dispatched"], 0)
+        self.assertEqual(len(LocalMessagingBackend.outbox), 3)
+    
+    def test_different_payloads_are_sent_separately(self):
+        """Each distinct notification content gets its own multicast."""
+        Notification.objects.create(user=self.users[0], title="A", message="First")
+        Notification.objects.create(user=self.users[1], title="B", message="Second")
+        
+        dispatch_push_notifications()
+        
+        self.assertEqual(
+            sorted((m["title"], len(m["tokens"])) for m in LocalMessagingBackend.outbox),
+            [("A", 400), ("B", 400)],
+        )
+    
+    def test_unavailable_backend_keeps_notifications_pending(self):
+        """Notifications are pushed again once the messaging backend is back."""
+        Notification.objects.create(user=self.users[0], title="A", message="First")
+        Notification.objects.create(user=self.users[1], title="B", message="Second")
+        
+        LocalMessagingBackend.available = False
+        result = dispatch_push_notifications()
+        
+        self.assertEqual(result["dispatched"], 0)
+        self.assertEqual(result["retried"], 2)
+        self.assertEqual(LocalMessagingBackend.outbox, [])
+        self.assertEqual(Notification.objects.filter(pushed_at__isnull=True).count(), 2)
+        
+        LocalMessagingBackend.available = True
+        result = dispatch_push_notifications()
+        
+        self.assertEqual(result["dispatched"], 2)
+        self.assertEqual(result["retried"], 0)
+        self.assertEqual(len(LocalMessagingBackend.outbox), 2)
+        self.assertFalse(Notification.objects.filter(pushed_at__isnull=True).exists())
+    
+    def test_failed_batch_retries_only_its_users(self):
+        """When one of two batches raises, only the users of that batch are pushed again."""
+        Notification.objects.bulk_create(
+            Notification(user=user, title="Offer", message="New offer") for user in self.users[:2]
+        )
+        # 800 tokens ordered by user: the first batch has user 0 and part of user 1, the second the rest of user 1
+        LocalMessagingBackend.failing_tokens = {"token-1-399"}
+        
+        result = dispatch_push_notifications()
+        
+        self.assertEqual(result["dispatched"], 1)
+        self.assertEqual(result["retried"], 1)
+        self.assertEqual([len(m["tokens"]) for m in LocalMessagingBackend.outbox], [500])
+        pending = Notification.objects.get(pushed_at__isnull=True)
+        self.assertEqual(pending.user, self.users[1])
+        self.assertEqual(pending.push_attempts, 1)
+        
+        LocalMessagingBackend.failing_tokens = set()
+        LocalMessagingBackend.outbox = []
+        result = dispatch_push_notifications()
+        
+        # User 0 is not pushed twice
+        self.assertEqual(result["dispatched"], 1)
+        self.assertEqual(
+            {token.split("-")[1] for m in LocalMessagingBackend.outbox for token in m["tokens"]},
+            {"1"},
+        )
+        self.assertFalse(Notification.objects.filter(pushed_at__isnull=True).exists())
+    
+    def test_push_is_given_up_after_max_attempts(self):
+        """A push that keeps failing is not retried forever."""
+        notification = Notification.objects.create(user=self.users[0], title="A", message="First")
+        LocalMessagingBackend.available = False
+        
+        for _ in range(1, PUSH_MAX_ATTEMPTS):
+            self.assertEqual(dispatch_push_notifications()["retried"], 1)
+        
+        result = dispatch_push_notifications()
+        
+        self.assertEqual(result["retried"], 0)
+        self.assertEqual(result["given_up"], 1)
+        notification.refresh_from_db()
+        self.assertIsNotNone(notification.pushed_at)
+        self.assertEqual(notification.push_attempts, PUSH_MAX_ATTEMPTS)
+        self.assertEqual(dispatch_push_notifications()["dispatched"], 0)
@@ -15,6 +15,11 @@ urlpatterns = [
         views.NotificationListAPIView.as_view(),
         name="notifications-list",
     ),
+    path(
+        "notifications/feed/",
+        views.NotificationFeedAPIView.as_view(),
+        name="notifications-feed",
+    ),
     path(
         "notifications/unread/",
         views.UnreadNotificationListAPIView.as_view(),
@@ -17,10 +17,16 @@ except ImportError:
     FIREBASE_AVAILABLE = False
     logging.warning("firebase-admin library not installed. Install it with: pip install firebase-admin")
 
+from django.utils.module_loading import import_string
+
+from notifications.backends import INVALID_TOKEN_ERRORS
 from notifications.models import FCMToken, Notification
 
 logger = logging.getLogger(__name__)
 
+# الحد الأقصى لعدد التوكنات في رسالة multicast واحدة
+FCM_BATCH_SIZE = 500
+
 # متغير global للـ Firebase App
 _firebase_app = None
 
@@ -79,6 +85,18 @@ def initialize_firebase():
         return None
 
 
+def get_messaging_backend():
+    """
+    الـ backend المستخدم للإرسال (FCM_MESSAGING_BACKEND في الإعدادات)
+    """
+    backend_path = getattr(
+        settings,
+        "FCM_MESSAGING_BACKEND",
+        "notifications.backends.FirebaseMessagingBackend",
+    )
+    return import_string(backend_path)()
+
+
 # ═══════════════════════════════════════════════════════════════════
 # دوال إرسال الإشعارات
 # ═══════════════════════════════════════════════════════════════════
@@ -104,8 +122,11 @@ def send_push_notification(
         image_url (str, optional): رابط صورة تظهر في الإشعار
         click_action (str, optional): URL للانتقال إليه عند النقر على الإشعار
     
+    يتم الإرسال على دفعات من FCM_BATCH_SIZE توكن، والتوكنات غير الصالحة
+    يتم إلغاء تفعيلها في تحديث واحد.
+    
     Returns:
-        Dict: نتيجة الإرسال تحتوي على success, failure, results
+        Dict: نتيجة الإرسال تحتوي على success, failure, failed_tokens, failed_user_ids, responses
     
     Example:
         >>> result = send_push_notification(
@@ -115,10 +136,9 @@ def send_push_notification(
         ...     data={"order_id": 123, "type": "new_order"}
         ... )
     """
-    # تهيئة Firebase
-    app = initialize_firebase()
+    backend = get_messaging_backend()
     
-    if not app:
+    if not backend.is_available():
         logger.error("Firebase Admin SDK not available")
         return {
             "success": 0,
@@ -127,15 +147,18 @@ def send_push_notification(
         }
     
     # الحصول على tokens
+    token_users = {}
     if tokens is None:
         if user_ids:
             # الحصول على tokens من قاعدة البيانات
-            tokens = list(
+            # مرتبة حسب المستخدم حتى تقع توكنات كل مستخدم في أقل عدد من الدفعات
+            token_users = dict(
                 FCMToken.objects.filter(
                     user_id__in=user_ids,
                     is_active=True
-                ).values_list("token", flat=True)
+                ).order_by("user_id", "id").values_list("token", "user_id")
             )
+            tokens = list(token_users)
         else:
             logger.error("Either user_ids or tokens must be provided")
             return {
@@ -153,115 +176,76 @@ def send_push_notification(
         }
     
     # إعداد البيانات الإضافية
-    notification_data = data or {}
+    notification_data = dict(data or {})
     if click_action:
         notification_data["click_action"] = click_action
     
     # تحويل جميع القيم إلى strings (FCM requirement)
     notification_data = {k: str(v) for k, v in notification_data.items()}
     
-    try:
-        # إنشاء رسالة FCM
-        fcm_message = messaging.MulticastMessage(
-            notification=messaging.Notification(
-                title=title,
-                body=message,
-                image=image_url if image_url else None,
-            ),
-            data=notification_data,
-            tokens=tokens,
-            # إعدادات إضافية
-            webpush=messaging.WebpushConfig(
-                notification=messaging.WebpushNotification(
-                    title=title,
-                    body=message,
-                    icon="/icon.png",  # أيقونة من public/
-                    badge="/icon.png",
-                    image=image_url if image_url else None,
-                ),
-                fcm_options=messaging.WebpushFCMOptions(
-                    link=click_action if click_action else None,
-                ),
-            ),
-        )
+    # الإرسال على دفعات (FCM يقبل 500 توكن كحد أقصى لكل رسالة multicast)
+    responses = []
+    failure_count = 0
+    failed_batches = 0
+    failed_tokens = []
+    delivered_tokens = []
+    invalid_tokens = []
+    
+    for start in range(0, len(tokens), FCM_BATCH_SIZE):
+        batch = tokens[start:start + FCM_BATCH_SIZE]
         
-        # إرسال الإشعار
-        # استخدام send_multicast بدلاً من send_each للتوافق مع جميع الإصدارات
         try:
-            response = messaging.send_multicast(fcm_message)
-        except (AttributeError, TypeError):
-            # إذا send_multicast غير متاح، استخدم send لكل token على حدة
-            success_count = 0
-            failure_count = 0
-            responses = []
-            
-            for token in tokens:
-                try:
-                    msg = messaging.Message(
-                        notification=messaging.Notification(
-                            title=title,
-                            body=message,
-                            image=image_url if image_url else None,
-                        ),
-                        data=notification_data,
-                        token=token,
-                    )
-                    msg_id = messaging.send(msg)
-                    success_count += 1
-                    logger.info(f"Push sent successfully to token {token[:20]}...")
-                except Exception as e:
-                    failure_count += 1
-                    logger.error(f"Error sending to token {token[:20]}: {e}")
-                    # إلغاء تفعيل الـ token إذا كان غير صالح
-                    if 'invalid' in str(e).lower() or 'not-registered' in str(e).lower():
-                        FCMToken.objects.filter(token=token).update(is_active=False)
-            
-            # إنشاء response object بسيط
-            class SimpleResponse:
-                def __init__(self, success, failure):
-                    self.success_count = success
-                    self.failure_count = failure
-                    self.responses = []
-            
-            response = SimpleResponse(success_count, failure_count)
-        
-        # معالجة النتائج
-        success_count = response.success_count
-        failure_count = response.failure_count
-        
-        # تحديث last_used للـ tokens الناجحة
-        if success_count > 0:
-            from django.utils import timezone
-            FCMToken.objects.filter(token__in=tokens).update(last_used=timezone.now())
-        
-        # التعامل مع الـ tokens الفاشلة
-        if response.responses:
-            for idx, resp in enumerate(response.responses):
-                if not resp.success:
-                    # إذا كان التوكن غير صالح، قم بإلغاء تفعيله
-                    error_code = resp.exception.code if resp.exception else None
-                    if error_code in ['invalid-registration-token', 'registration-token-not-registered']:
-                        FCMToken.objects.filter(token=tokens[idx]).update(is_active=False)
-                        logger.warning(f"Deactivated invalid token: {tokens[idx][:20]}...")
-        
-        logger.info(
-            f"Push notification sent: {success_count} success, "
-            f"{failure_count} failure"
-        )
+            results = backend.send_multicast(
+                batch,
+                title=title,
+                message=message,
+                data=notification_data,
+                image_url=image_url,
+                click_action=click_action,
+            )
+        except Exception as e:
+            logger.error(f"Error sending push notification batch: {e}")
+            failure_count += len(batch)
+            failed_batches += 1
+            failed_tokens.extend(batch)
+            continue
         
-        return {
-            "success": success_count,
-            "failure": failure_count,
-            "responses": response.responses,
-        }
+        for token, error_code in results:
+            if error_code is None:
+                delivered_tokens.append(token)
+            else:
+                failure_count += 1
+                if error_code in INVALID_TOKEN_ERRORS:
+                    invalid_tokens.append(token)
         
-    except Exception as e:
-        logger.error(f"Error sending push notification: {e}")
-        return {
-            "success": 0,
-            "failure": len(tokens),
-            "error": str(e)
-        }
+        responses.extend(results)
+    
+    # تحديث last_used للـ tokens الناجحة
+    if delivered_tokens:
+        from django.utils import timezone
+        FCMToken.objects.filter(token__in=delivered_tokens).update(last_used=timezone.now())
+    
+    # إلغاء تفعيل الـ tokens غير الصالحة في تحديث واحد
+    if invalid_tokens:
+        FCMToken.objects.filter(token__in=invalid_tokens).update(is_active=False)
+        logger.warning(f"Deactivated {len(invalid_tokens)} invalid tokens")
+    
+    success_count = len(delivered_tokens)
+    
+    logger.info(
+        f"Push notification sent: {success_count} success, "
+        f"{failure_count} failure"
+    )
+    
+    return {
+        "success": success_count,
+        "failure": failure_count,
+        "failed_batches": failed_batches,
+        # توكنات الدفعات التي فشل إرسالها بالكامل ومستخدميها (لإعادة المحاولة لهم فقط)
+        "failed_tokens": failed_tokens,
+        "failed_user_ids": sorted({token_users[token] for token in failed_tokens if token in token_users}),
+        "responses": responses,
+    }
 
 
 def send_push_to_user(
@@ -368,25 +352,19 @@ def send_notification_with_push(
         ...     extra={"order_id": 123}
         ... )
     """
+    from django.utils import timezone
+    
     # إنشاء الإشعار في قاعدة البيانات
+    # Push Notification يتم إرساله في الخلفية (dispatch_push_notifications)
     notification = Notification.objects.create(
         user_id=user_id,
         title=title,
         message=message,
         extra=extra,
         image_url=image_url or "",
+        pushed_at=None if send_push else timezone.now(),
     )
     
-    # إرسال Push Notification
-    if send_push:
-        send_push_to_user(
-            user_id=user_id,
-            title=title,
-            message=message,
-            data=extra,
-            image_url=image_url,
-        )
-    
     return notification
 
 
@@ -32,7 +32,7 @@ from notifications.serializers import (
     FCMTokenSerializer,
 )
 from core.responses import APIResponse
-from core.views.abstract_paginations import CustomPageNumberPagination
+from core.views.abstract_paginations import CustomCursorPagination, CustomPageNumberPagination
 from accounts.permissions import AdminRoleAuthentication, ManagerRoleAuthentication
 
 
@@ -71,6 +71,18 @@ class NotificationListAPIView(ListAPIView):
         return Notification.objects.filter(user=user).select_related("user", "topic")
 
 
+class NotificationFeedAPIView(NotificationListAPIView):
+    """
+    Notifications of the authenticated user for infinite scroll, newest first.
+
+    Cursor pagination: no total count and a constant cost for deep pages,
+    follow `links.next` to load more.
+    """
+
+    pagination_class = CustomCursorPagination
+    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+
+
 class UnreadNotificationListAPIView(ListAPIView):
     """List only unread notifications for the authenticated user."""
     
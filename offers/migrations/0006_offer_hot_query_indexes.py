@@ -0,0 +1,37 @@
+# Generated manually on 2026-10-18
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction, the offers table stays writable meanwhile
+    atomic = False
+
+    dependencies = [
+        ('offers', '0002_add_wholesale_fields'),
+        ('offers', '0005_alter_offer_product_code'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_max', True), ('remaining_amount__gt', 0)), fields=['product', '-id'], name='offer_max_product_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_max', True), ('remaining_amount__gt', 0)), fields=['-selling_discount_percentage', 'id'], name='offer_max_discount_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('is_max_wholesale', True), ('is_wholesale', True), ('remaining_amount__gt', 0)), fields=['product'], name='offer_max_wholesale_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(condition=models.Q(('remaining_amount__gt', 0)), fields=['product', '-selling_discount_percentage'], name='offer_product_discount_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='offer',
+            index=models.Index(fields=['user', 'product_code'], name='offer_user_product_code_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated manually on 2026-10-18
+
+from django.contrib.postgres.operations import RemoveIndexConcurrently
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # DROP INDEX CONCURRENTLY can't run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('offers', '0006_offer_hot_query_indexes'),
+    ]
+
+    operations = [
+        # The offers of a store are only ever filtered by user, served by the user foreign key index
+        RemoveIndexConcurrently(
+            model_name='offer',
+            name='offer_user_product_code_idx',
+        ),
+    ]
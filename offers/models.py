@@ -52,5 +52,34 @@ class Offer(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Created concurrently (offers/migrations/0006), keep new indexes on this table that way
+        indexes = [
+            # Max offer of a product (market product list subquery, cart repricing)
+            models.Index(
+                fields=["product", "-id"],
+                name="offer_max_product_idx",
+                condition=models.Q(is_max=True, remaining_amount__gt=0),
+            ),
+            # Max offers list ordered by discount
+            models.Index(
+                fields=["-selling_discount_percentage", "id"],
+                name="offer_max_discount_idx",
+                condition=models.Q(is_max=True, remaining_amount__gt=0),
+            ),
+            # Max wholesale offers list
+            models.Index(
+                fields=["product"],
+                name="offer_max_wholesale_idx",
+                condition=models.Q(is_max_wholesale=True, is_wholesale=True, remaining_amount__gt=0),
+            ),
+            # Max offer calculation, the highest discount in stock per product (get_max_offer_ids_queryset)
+            models.Index(
+                fields=["product", "-selling_discount_percentage"],
+                name="offer_product_discount_idx",
+                condition=models.Q(remaining_amount__gt=0),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.product_code}"
@@ -10,7 +10,13 @@ from django.utils.translation import gettext_lazy as _
 from django.apps import apps
 from django.utils import timezone
 
-from offers.utils import calculate_max_offer, calculate_max_offer_from_offer, get_selling_data, update_offer
+from offers.utils import (
+    calculate_max_offers,
+    calculate_max_offer_from_offer,
+    get_selling_data,
+    import_offers,
+    update_offer,
+)
 
 get_model = apps.get_model
 
@@ -321,6 +327,25 @@ class OfferExcelReadSerialzier(BaseModelSerializer):
         ]
 
 
+class WholesaleOfferExcelReadSerializer(OfferExcelReadSerialzier):
+    min_quantity = serializers.IntegerField(read_only=True)
+    increment = serializers.IntegerField(read_only=True)
+
+    class Meta(OfferExcelReadSerialzier.Meta):
+        fields = [
+            "product_seller_code",
+            "product_name",
+            "seller_name",
+            "public_price",
+            "selling_discount_percentage",
+            "actual_discount_percentage",
+            "actual_offer_price",
+            "min_quantity",
+            "increment",
+            "payment_period_name",
+        ]
+
+
 class OfferPDFReadSerializer(BaseModelSerializer):
     product_name = serializers.CharField(read_only=True)
     seller_name = serializers.CharField(read_only=True, required=False)
@@ -348,6 +373,8 @@ class OfferUploaderSerializer(BaseUploaderSerializer):
         queryset=get_model("accounts", "User").objects.select_related("profile").all(), required=True, write_only=True
     )
     is_wholesale = serializers.BooleanField(default=False, write_only=True)
+    # diff: apply only the changes against the existing offers, replace: delete and recreate them all
+    mode = serializers.ChoiceField(choices=["diff", "replace"], default="diff", write_only=True)
     
     required_columns = [
         "product_code",
@@ -372,7 +399,7 @@ class OfferUploaderSerializer(BaseUploaderSerializer):
         "is_wholesale",
     ]
 
-    def validate_column_product_code(self, value, line_number):
+    def parse_product_code(self, value, line_number):
         if value is None or value == "":
             raise serializers.ValidationError(
                 _("in line {line_number}, Product code was not specified.").format(line_number=line_number)
@@ -381,40 +408,43 @@ class OfferUploaderSerializer(BaseUploaderSerializer):
         # Convert decimal to integer if needed (handle Excel format like 22.0 -> 22)
         try:
             if isinstance(value, (int, float)):
-                code_value = int(value)
-            else:
-                code_value = int(float(str(value)))
+                return int(value)
+            return int(float(str(value)))
         except (ValueError, TypeError):
             raise serializers.ValidationError(
                 _("in line {line_number}, Product code must be a valid number.").format(line_number=line_number)
             )
 
-        # Admin can upload for any store, others can only upload for their own store
-        if hasattr(self, 'request_user') and self.request_user.role == 'ADMIN':
-            # Admin can upload for any store
-            product_code = (
-                get_model("market", "StoreProductCode")
-                .objects.select_related("product", "store")
-                .filter(code=code_value, store_id=self.user.id)
-                .first()
-            )
-        else:
-            # Regular users can only upload for their own store
-            product_code = (
-                get_model("market", "StoreProductCode")
-                .objects.select_related("product", "store")
-                .filter(code=code_value, store_id=self.user.id)
-                .first()
-            )
+    def validate_columns_product_code(self, values, line_numbers):
+        codes = []
+        for value, line_number in zip(values, line_numbers):
+            try:
+                codes.append(self.parse_product_code(value, line_number))
+            except serializers.ValidationError as err:
+                codes.append(err)
+
+        # Admin and store users upload for the selected store only, resolve all its codes at once
+        product_codes = {}
+        for product_code in (
+            get_model("market", "StoreProductCode")
+            .objects.select_related("product", "store")
+            .filter(store_id=self.user.id, code__in={code for code in codes if isinstance(code, int)})
+            .order_by("pk")
+        ):
+            product_codes.setdefault(product_code.code, product_code)
+
+        results = []
+        for code, line_number in zip(codes, line_numbers):
+            if isinstance(code, int):
+                code = product_codes.get(code) or serializers.ValidationError(
+                    _(
+                        "in line {line_number}, Product code {code} was not found, Please add the Code first then try again."
+                    ).format(line_number=line_number, code=code)
+                )
 
-        if product_code is None:
-            raise serializers.ValidationError(
-                _(
-                    "in line {line_number}, Product code {code} was not found, Please add the Code first then try again."
-                ).format(line_number=line_number, code=code_value)
-            )
+            results.append(code)
 
-        return product_code
+        return results
 
     def validate_column_available_amount(self, value, line_number):
         try:
@@ -667,6 +697,11 @@ class OfferUploaderSerializer(BaseUploaderSerializer):
         rows = validated_data.get("data")
         user = validated_data.get("user")
 
+        if validated_data.get("mode") == "diff":
+            with transaction.atomic():
+                offers_list, _ = import_offers(user, rows)
+            return offers_list
+
         offers_list = []
         products_set = set()
 
@@ -679,19 +714,16 @@ class OfferUploaderSerializer(BaseUploaderSerializer):
             existing_user_offers.delete()
 
             for row_data in rows:
-                print(row_data)
                 offer_instance = Offer.objects.create(**row_data)
                 offers_list.append(offer_instance)
                 products_set.add(row_data.get("product").pk)
 
-            # حساب أفضل العروض بناءً على نوع العرض
+            # حساب أفضل العروض بناءً على نوع العرض (دفعة واحدة لكل المنتجات)
             if self.is_wholesale_flag:
-                from offers.utils import calculate_max_wholesale_offer
-                for product_id in products_set:
-                    calculate_max_wholesale_offer(product_id)
+                from offers.utils import calculate_max_wholesale_offers
+                calculate_max_wholesale_offers(products_set)
             else:
-                for product_id in products_set:
-                    calculate_max_offer(product_id)
+                calculate_max_offers(products_set)
 
         return offers_list
 
@@ -4,16 +4,67 @@ Signals for the offers app.
 Automatically send notifications when offers are created or updated.
 """
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from offers.models import Offer
 from notifications.models import Notification
+from core.utils import bump_search_cache_version
 from market.models import PharmacyProductWishList
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def notify_wishlist_pharmacies(offers):
+    """
+    إرسال إشعار للصيدليات التي أضافت المنتج في wishlist لكل منتج من منتجات `offers`
+    (إشعار واحد لكل صيدلية ومنتج بأفضل عرض، باستعلام واحد لكل المنتجات).
+    """
+    best_offers = {}
+    for offer in offers:
+        best_offer = best_offers.get(offer.product_id)
+        if best_offer is None or offer.selling_discount_percentage > best_offer.selling_discount_percentage:
+            best_offers[offer.product_id] = offer
+
+    if not best_offers:
+        return 0
+
+    # البحث عن الصيدليات التي أضافت هذه المنتجات في wishlist
+    wishlist_items = PharmacyProductWishList.objects.filter(product_id__in=best_offers).select_related('pharmacy')
+
+    # إنشاء إشعارات جماعية
+    notifications = []
+    for wishlist_item in wishlist_items:
+        offer = best_offers[wishlist_item.product_id]
+        notifications.append(
+            Notification(
+                user=wishlist_item.pharmacy,
+                title="✨ منتج متوفر من قائمة الرغبات!",
+                message=f"المنتج '{offer.product.name}' أصبح متوفراً الآن بخصم {offer.selling_discount_percentage}% وسعر {offer.selling_price} جنيه",
+                extra={
+                    "type": "wishlist_product_available",
+                    "product_id": offer.product.pk,
+                    "product_name": offer.product.name,
+                    "offer_id": offer.pk,
+                    "seller_id": offer.user.pk,
+                    "seller_name": offer.user.name,
+                    "discount": str(offer.selling_discount_percentage),
+                    "price": str(offer.selling_price),
+                    "available_amount": offer.remaining_amount,
+                },
+                image_url=""
+            )
+        )
+
+    if notifications:
+        Notification.objects.bulk_create(notifications)
+        logger.info(
+            f"Wishlist notifications sent to {len(notifications)} pharmacies for {len(best_offers)} products"
+        )
+
+    return len(notifications)
+
+
 @receiver(post_save, sender=Offer)
 def notify_wishlist_pharmacies_on_offer_created(sender, instance, created, **kwargs):
     """
@@ -21,44 +72,14 @@ def notify_wishlist_pharmacies_on_offer_created(sender, instance, created, **kwa
     """
     if created:
         try:
-            # البحث عن الصيدليات التي أضافت هذا المنتج في wishlist
-            wishlist_items = PharmacyProductWishList.objects.filter(
-                product=instance.product
-            ).select_related('pharmacy')
-            
-            if not wishlist_items.exists():
-                return
-            
-            # إنشاء إشعارات جماعية
-            notifications = []
-            for wishlist_item in wishlist_items:
-                notifications.append(
-                    Notification(
-                        user=wishlist_item.pharmacy,
-                        title="✨ منتج متوفر من قائمة الرغبات!",
-                        message=f"المنتج '{instance.product.name}' أصبح متوفراً الآن بخصم {instance.selling_discount_percentage}% وسعر {instance.selling_price} جنيه",
-                        extra={
-                            "type": "wishlist_product_available",
-                            "product_id": instance.product.pk,
-                            "product_name": instance.product.name,
-                            "offer_id": instance.pk,
-                            "seller_id": instance.user.pk,
-                            "seller_name": instance.user.name,
-                            "discount": str(instance.selling_discount_percentage),
-                            "price": str(instance.selling_price),
-                            "available_amount": instance.remaining_amount,
-                        },
-                        image_url=""
-                    )
-                )
-            
-            if notifications:
-                Notification.objects.bulk_create(notifications)
-                logger.info(
-                    f"Wishlist notifications sent to {len(notifications)} pharmacies "
-                    f"for product {instance.product.name} (offer #{instance.pk})"
-                )
-                
+            notify_wishlist_pharmacies([instance])
         except Exception as e:
             logger.error(f"Failed to send wishlist notifications for offer #{instance.pk}: {str(e)}")
 
+
+@receiver(post_delete, sender=Offer)
+def expire_offer_search_cache(sender, instance, **kwargs):
+    """
+    Deleted offers must leave the cached offer search results
+    """
+    bump_search_cache_version("offers")
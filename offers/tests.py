@@ -1,3 +1,466 @@
-from django.test import TestCase
+import random
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, models, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from openpyxl import Workbook
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.choices import Role
+from market.models import Category, Company, Product, StoreProductCode
+from market.views import ProductListAPIView
+from offers.models import Offer
+from offers.serializers import OfferUploaderSerializer
+from offers.utils import (
+    affect_offer,
+    calculate_max_offers,
+    calculate_max_wholesale_offers,
+    get_max_offer_ids_queryset,
+    import_offers,
+    lock_offers,
+)
+from offers.views import MaxOfferListAPIView, MaxWholesaleOfferListAPIView
+from profiles.models import PaymentPeriod, UserProfile
+from shop.models import Cart, CartItem
+
+User = get_user_model()
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Row locks need PostgreSQL.")
+class OfferReservationConcurrencyTest(TransactionTestCase):
+    """Parallel checkouts must never oversell an offer."""
+
+    WORKERS = 8
+    CHECKOUTS_PER_WORKER = 40
+    OFFERS = 5
+    AVAILABLE_AMOUNT = 150
+
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        store = User.objects.create_user(username="+201000000001", name="Store", role=Role.STORE)
+
+        self.offers = []
+        for index in range(self.OFFERS):
+            product = Product.objects.create(
+                name=f"Product {index}",
+                e_name=f"Product {index}",
+                public_price=Decimal("100.00"),
+                company=company,
+                category=category,
+                shape="اقراص",
+            )
+            self.offers.append(
+                Offer.objects.create(
+                    product=product,
+                    user=store,
+                    available_amount=self.AVAILABLE_AMOUNT,
+                    remaining_amount=self.AVAILABLE_AMOUNT,
+                    max_amount_per_invoice=5,
+                    purchase_discount_percentage=Decimal("20.00"),
+                    purchase_price=Decimal("80.00"),
+                    selling_discount_percentage=Decimal("15.00"),
+                    selling_price=Decimal("85.00"),
+                    is_max=True,
+                )
+            )
+
+    def checkout(self, rng, reserved, reserved_lock, counters):
+        offers = rng.sample(self.offers, rng.randint(1, 3))
+        items = [(offer, rng.randint(1, 5)) for offer in offers]
+
+        try:
+            with transaction.atomic():
+                lock_offers([(offer.pk, quantity) for offer, quantity in items])
+                for offer, quantity in items:
+                    invoice_item = SimpleNamespace(
+                        offer=Offer(pk=offer.pk, product_id=offer.product_id), quantity=quantity
+                    )
+                    affect_offer("add", invoice_item)
+        except ValidationError:
+            with reserved_lock:
+                counters["rejected"] += 1
+            return
+
+        with reserved_lock:
+            counters["accepted"] += 1
+            for offer, quantity in items:
+                reserved[offer.pk] += quantity
+
+    def test_parallel_checkouts_never_oversell(self):
+        reserved = {offer.pk: 0 for offer in self.offers}
+        reserved_lock = threading.Lock()
+        counters = {"accepted": 0, "rejected": 0}
+        failures = []
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(self.CHECKOUTS_PER_WORKER):
+                    self.checkout(rng, reserved, reserved_lock, counters)
+            except Exception as exc:  # pragma: no cover - surfaced by the assertion below
+                failures.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(failures, [])
+
+        for offer in Offer.objects.filter(pk__in=reserved):
+            self.assertGreaterEqual(offer.remaining_amount, 0)
+            self.assertEqual(offer.remaining_amount, self.AVAILABLE_AMOUNT - reserved[offer.pk])
+
+        total = self.WORKERS * self.CHECKOUTS_PER_WORKER
+        self.assertEqual(counters["accepted"] + counters["rejected"], total)
+
+
+class OfferUploaderTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        self.store = User.objects.create_user(username="+201000000001", name="Store", role=Role.STORE)
+        self.profile, _ = UserProfile.objects.get_or_create(user=self.store)
+
+        for code in range(1, 51):
+            product = Product.objects.create(
+                name=f"Product {code}",
+                e_name=f"Product {code}",
+                public_price=Decimal("100.00"),
+                company=company,
+                category=category,
+                shape="اقراص",
+            )
+            StoreProductCode.objects.create(product=product, store_id=self.store.pk, code=code)
+
+    def get_file(self, codes, wholesale=None):
+        workbook = Workbook()
+        sheet = workbook.active
+        optional_columns = OfferUploaderSerializer.optional_columns if wholesale else []
+        sheet.append([" Product_Code", *OfferUploaderSerializer.required_columns[1:], *optional_columns])
+        expiry_date = (timezone.now() + timedelta(days=365)).date().isoformat()
+
+        for code in codes:
+            sheet.append([code, 10, 20, None, None, expiry_date, "OP-1", *(wholesale or [])])
+
+        content = BytesIO()
+        workbook.save(content)
+        return SimpleUploadedFile("offers.xlsx", content.getvalue())
+
+    def validate(self, codes, wholesale=None):
+        serializer = OfferUploaderSerializer()
+        serializer.user = self.store
+        serializer.user_profile = self.profile
+
+        file = self.get_file(codes, wholesale)
+        serializer.validate_file(file)
+
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                return serializer.validate_file_data(file)["data"], None, len(queries)
+            except ValidationError as err:
+                return None, err.detail["file"], len(queries)
+
+    def test_codes_are_resolved_with_one_query(self):
+        data, errs, queries = self.validate([float(code) for code in range(1, 51)])
+
+        self.assertIsNone(errs)
+        self.assertEqual(queries, 1)
+        self.assertEqual([row["product"].name for row in data[:2]], ["Product 1", "Product 2"])
+        self.assertEqual(data[0]["selling_discount_percentage"], Decimal("18.50"))
+
+    def test_errors_are_reported_per_row(self):
+        data, errs, queries = self.validate([1, 999, "abc", 2])
+
+        self.assertIsNone(data)
+        self.assertEqual(queries, 1)
+        self.assertEqual(len(errs), 2)
+        self.assertIn("in line 2,", str(errs[0]["product_code"]))
+        self.assertIn("in line 3,", str(errs[1]["product_code"]))
+
+    def test_diff_import_applies_only_changes(self):
+        rows, _, _ = self.validate(list(range(1, 11)))
+        offers, changed = import_offers(self.store, rows)
+        self.assertEqual(len(changed), 10)
+        offer_ids = [offer.pk for offer in offers]
+
+        # Re-uploading the same sheet writes nothing
+        rows, _, _ = self.validate(list(range(1, 11)))
+        with CaptureQueriesContext(connection) as queries:
+            offers, changed = import_offers(self.store, rows)
+        self.assertEqual(changed, set())
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([offer.pk for offer in offers], offer_ids)
+
+        # One offer changed, one removed and one added
+        rows, _, _ = self.validate([1, 2, 3, 4, 5, 6, 7, 8, 9, 11])
+        rows[0]["available_amount"] = rows[0]["remaining_amount"] = 30
+        offers, changed = import_offers(self.store, rows)
+
+        self.assertEqual(len(changed), 3)
+        self.assertEqual([offer.pk for offer in offers[:9]], offer_ids[:9])
+        self.assertEqual(Offer.objects.get(pk=offer_ids[0]).remaining_amount, 30)
+        self.assertFalse(Offer.objects.filter(pk=offer_ids[9]).exists())
+        self.assertEqual(Offer.objects.filter(user=self.store).count(), 10)
+
+    def test_diff_import_applies_wholesale_columns(self):
+        rows, _, _ = self.validate([1, 2])
+        self.assertNotIn("wholesale_min_quantity", rows[0])
+        import_offers(self.store, rows)
+
+        # Only the optional wholesale columns changed
+        rows, _, _ = self.validate([1, 2], wholesale=[20, 10])
+        offers, changed = import_offers(self.store, rows)
+
+        self.assertEqual(len(changed), 2)
+        self.assertEqual(
+            set(Offer.objects.filter(user=self.store).values_list("wholesale_min_quantity", "wholesale_increment")),
+            {(20, 10)},
+        )
+
+        # A sheet without the optional columns keeps them
+        rows, _, _ = self.validate([1, 2])
+        offers, changed = import_offers(self.store, rows)
+
+        self.assertEqual(changed, set())
+        self.assertEqual(
+            set(Offer.objects.filter(user=self.store).values_list("wholesale_min_quantity", "wholesale_increment")),
+            {(20, 10)},
+        )
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "EXPLAIN plans are checked on PostgreSQL.")
+class OfferIndexesTest(TestCase):
+    def setUp(self):
+        company = Company.objects.create(name="Company")
+        category = Category.objects.create(name="Category")
+        self.store = User.objects.create_user(username="+201000000002", name="Store", role=Role.STORE)
+        self.product = Product.objects.create(
+            name="Product",
+            e_name="Product",
+            public_price=Decimal("100.00"),
+            company=company,
+            category=category,
+            shape="اقراص",
+        )
+        self.product_code = StoreProductCode.objects.create(product=self.product, store_id=self.store.pk, code=1)
+
+        for discount in range(10, 20):
+            Offer.objects.create(
+                product=self.product,
+                product_code=self.product_code,
+                user=self.store,
+                available_amount=10,
+                remaining_amount=10 if discount % 2 else 0,
+                purchase_discount_percentage=Decimal(discount),
+                purchase_price=Decimal("80.00"),
+                selling_discount_percentage=Decimal(discount),
+                selling_price=Decimal("85.00"),
+                is_max=discount == 19,
+                is_wholesale=discount > 15,
+                is_max_wholesale=discount == 17,
+            )
+
+    def assertUsesIndex(self, queryset, index_name):
+        # The test tables are tiny, without this the planner scans them sequentially whatever the indexes
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def get_view_queryset(self, view_class, user, **params):
+        """The queryset of a list page as the view builds it (filters and ordering included)"""
+        request = APIRequestFactory().get("/", params)
+        force_authenticate(request, user)
+
+        view = view_class()
+        view.args, view.kwargs, view.format_kwarg = (), {}, None
+        view.request = view.initialize_request(request)
+
+        # One page of results
+        return view.filter_queryset(view.get_queryset())[:10]
+
+    def test_max_offer_of_product(self):
+        pharmacy = User.objects.create_user(username="+201000000003", name="Pharmacy", role=Role.PHARMACY)
+        profile, _ = UserProfile.objects.get_or_create(user=pharmacy)
+        profile.payment_period = PaymentPeriod.objects.create(
+            name="Cash", period_in_days=0, addition_percentage=Decimal("2.00")
+        )
+        profile.save()
+
+        self.assertUsesIndex(self.get_view_queryset(ProductListAPIView, pharmacy), "offer_max_product_idx")
+
+    def test_max_offers_by_discount(self):
+        self.assertUsesIndex(
+            self.get_view_queryset(MaxOfferListAPIView, self.store, ordering="-selling_discount_percentage"),
+            "offer_max_discount_idx",
+        )
+
+    def test_max_wholesale_offers(self):
+        self.assertUsesIndex(
+            self.get_view_queryset(MaxWholesaleOfferListAPIView, self.store),
+            "offer_max_wholesale_idx",
+        )
+
+    def test_max_offer_calculation(self):
+        self.assertUsesIndex(get_max_offer_ids_queryset([self.product.pk]), "offer_product_discount_idx")
+        self.assertUsesIndex(
+            get_max_offer_ids_queryset([self.product.pk], is_wholesale=True).filter(remaining_amount__gt=0),
+            "offer_product_discount_idx",
+        )
+
+
+def per_product_max_offers(product_ids, wholesale=False):
+    """`is_max` / `is_max_wholesale` as the former per-product calculation set them"""
+    expected = {}
+
+    for product_id in product_ids:
+        offers = Offer.objects.filter(product_id=product_id, **({"is_wholesale": True} if wholesale else {}))
+        max_discount = offers.filter(remaining_amount__gt=0).aggregate(
+            max_discount=models.Max("selling_discount_percentage")
+        )["max_discount"]
+
+        for offer in offers:
+            is_max = offer.selling_discount_percentage == max_discount
+            # Only wholesale offers in stock could be the max wholesale offer
+            expected[offer.pk] = is_max and offer.remaining_amount > 0 if wholesale else is_max
+
+    return expected
+
+
+class MaxOfferCalculationTest(TestCase):
+    def setUp(self):
+        self.company = Company.objects.create(name="Company")
+        self.category = Category.objects.create(name="Category")
+        self.sellers = [
+            User.objects.create_user(username=f"+20100000007{index}", name=f"Store {index}", role=Role.STORE)
+            for index in range(3)
+        ]
+        self.products = 0
+
+    def create_product(self):
+        self.products += 1
+        return Product.objects.create(
+            name=f"Product {self.products}",
+            e_name=f"Product {self.products}",
+            public_price=Decimal("100.00"),
+            company=self.company,
+            category=self.category,
+            shape="اقراص",
+        )
+
+    def create_offer(self, product, discount, remaining_amount=10, seller=0, **kwargs):
+        return Offer.objects.create(
+            product=product,
+            user=self.sellers[seller],
+            available_amount=10,
+            remaining_amount=remaining_amount,
+            purchase_discount_percentage=Decimal(discount),
+            purchase_price=Decimal("80.00"),
+            selling_discount_percentage=Decimal(discount),
+            selling_price=Decimal(100 - discount),
+            **kwargs,
+        )
+
+    def test_matches_per_product_calculation(self):
+        ties = self.create_product()
+        self.create_offer(ties, 20)
+        self.create_offer(ties, 20, seller=1)
+        self.create_offer(ties, 10, seller=2)
+
+        sold_out_best = self.create_product()
+        self.create_offer(sold_out_best, 30, remaining_amount=0)
+        self.create_offer(sold_out_best, 25, seller=1)
+        # Out of stock with the max discount, flagged like the in-stock one
+        self.create_offer(sold_out_best, 25, remaining_amount=0, seller=2)
+
+        sold_out = self.create_product()
+        self.create_offer(sold_out, 15, remaining_amount=0)
+
+        wholesale = self.create_product()
+        self.create_offer(wholesale, 15)
+        self.create_offer(wholesale, 18, seller=1, is_wholesale=True)
+        self.create_offer(wholesale, 16, seller=2, is_wholesale=True)
+        self.create_offer(wholesale, 20, remaining_amount=0, seller=2, is_wholesale=True)
+
+        product_ids = [ties.pk, sold_out_best.pk, sold_out.pk, wholesale.pk]
+
+        calculate_max_offers(product_ids, affect_carts=False)
+        calculate_max_wholesale_offers(product_ids)
+
+        self.assertEqual(dict(Offer.objects.values_list("pk", "is_max")), per_product_max_offers(product_ids))
+        self.assertEqual(
+            dict(Offer.objects.filter(is_wholesale=True).values_list("pk", "is_max_wholesale")),
+            per_product_max_offers(product_ids, wholesale=True),
+        )
+        self.assertEqual(Offer.objects.filter(is_max=True, product=ties).count(), 2)
+        self.assertFalse(Offer.objects.filter(is_max=True, product=sold_out).exists())
+        self.assertEqual(
+            list(Offer.objects.filter(is_max_wholesale=True).values_list("selling_discount_percentage", flat=True)),
+            [Decimal("18.00")],
+        )
+        self.assertFalse(Offer.objects.filter(is_max_wholesale=True, is_wholesale=False).exists())
+
+    def test_cart_items_follow_the_max_offer(self):
+        pharmacy = User.objects.create_user(username="+201000000079", name="Pharmacy", role=Role.PHARMACY)
+        profile, _ = UserProfile.objects.get_or_create(user=pharmacy)
+        profile.payment_period = PaymentPeriod.objects.create(
+            name="Cash", period_in_days=0, addition_percentage=Decimal("2.00")
+        )
+        profile.save()
+        cart, _ = Cart.objects.get_or_create(user=pharmacy)
+
+        available = self.create_product()
+        old_offer = self.create_offer(available, 10)
+        best_offer = self.create_offer(available, 20, seller=1)
+        self.create_offer(available, 20, seller=2)
+
+        sold_out = self.create_product()
+        sold_out_offer = self.create_offer(sold_out, 15, remaining_amount=0)
+
+        def add_item(offer, quantity):
+            return CartItem.objects.create(
+                cart=cart,
+                offer=offer,
+                product=offer.product,
+                quantity=quantity,
+                discount_percentage=Decimal("8.00"),
+                price=Decimal("92.00"),
+                sub_total=Decimal("92.00") * quantity,
+            )
+
+        moved = add_item(old_offer, 3)
+        gone = add_item(sold_out_offer, 2)
+
+        calculate_max_offers([available, sold_out])
+
+        moved.refresh_from_db()
+        gone.refresh_from_db()
+        cart.refresh_from_db()
+
+        # Ties go to the oldest offer, as `.first()` of the per-product calculation did
+        self.assertEqual(moved.offer, best_offer)
+        self.assertEqual(moved.discount_percentage, Decimal("18.00"))
+        self.assertEqual(moved.price, Decimal("82.00"))
+        self.assertEqual(moved.sub_total, Decimal("246.00"))
+        self.assertFalse(moved.sold_out)
+        self.assertTrue(gone.sold_out)
+
+        self.assertEqual(cart.items_count, 1)
+        self.assertEqual(cart.total_quantity, 3)
+        self.assertEqual(cart.total_price, Decimal("246.00"))
@@ -1,12 +1,35 @@
+import logging
 from decimal import Decimal
 from django.db import models
 from django.apps import apps
 from rest_framework.exceptions import ValidationError
 
-from shop.utils import mark_item_as_sold_out, update_cart_item_offer
+from core.utils import bump_search_cache_version
+from shop.utils import update_cart_item_offer, update_cart_items_max_offer
 
 get_model = apps.get_model
 
+logger = logging.getLogger(__name__)
+
+# Offer fields set from an uploaded offers sheet
+OFFER_IMPORT_FIELDS = [
+    "product_code",
+    "product",
+    "operating_number",
+    "available_amount",
+    "remaining_amount",
+    "max_amount_per_invoice",
+    "product_expiry_date",
+    "min_purchase",
+    "purchase_discount_percentage",
+    "purchase_price",
+    "selling_discount_percentage",
+    "selling_price",
+    "is_wholesale",
+    "wholesale_min_quantity",
+    "wholesale_increment",
+]
+
 
 def deconstuct_offer(offer):
     return {
@@ -47,70 +70,207 @@ def get_selling_data(product, user, purchase_discount_percentage, raise_exceptio
     return selling_discount_percentage, selling_price
 
 
+def lock_offers(items):
+    """
+    Lock all offers of one invoice with `select_for_update` and check the requested
+    quantities against the locked rows.
+
+    `items` is a list of `(offer_id, quantity)`. Rows are locked in ascending id order so
+    concurrent checkouts sharing offers wait for each other instead of deadlocking.
+    Must run inside a transaction; returns the locked offers by id.
+    """
+    Offer = get_model("offers", "Offer")
+
+    offer_ids = sorted({offer_id for offer_id, _ in items})
+    offers = {offer.pk: offer for offer in Offer.objects.select_for_update().filter(pk__in=offer_ids).order_by("pk")}
+
+    errs = []
+    raise_err = False
+
+    for offer_id, quantity in items:
+        offer = offers.get(offer_id)
+        err = {}
+
+        if offer is None:
+            err = {"offer": "Offer not found."}
+        elif offer.max_amount_per_invoice is not None and quantity > offer.max_amount_per_invoice:
+            err = {"quantity": f"Quantity cannot exceed {offer.max_amount_per_invoice} for this offer."}
+        elif offer.remaining_amount < quantity:
+            err = {"quantity": f"Quantity cannot exceed {offer.remaining_amount} for this offer."}
+
+        raise_err = raise_err or bool(err)
+        errs.append(err)
+
+    if raise_err:
+        raise ValidationError({"items": errs})
+
+    return offers
+
+
+def change_offer_remaining_amount(offer, delta):
+    """
+    Add `delta` to the offer remaining amount with a conditional `F()` update,
+    so concurrent changes are never lost and the amount never goes below zero.
+    """
+    Offer = get_model("offers", "Offer")
+
+    if delta:
+        updated = Offer.objects.filter(pk=offer.pk, remaining_amount__gte=max(-delta, 0)).update(
+            remaining_amount=models.F("remaining_amount") + delta
+        )
+
+        if not updated:
+            raise ValidationError({"offer": "Insufficient offer amount."})
+
+    offer.refresh_from_db(fields=["remaining_amount"])
+
+    return offer
+
+
 def affect_offer(operation, invoice_item, old_quantity=None, reset_max=True):
     offer = invoice_item.offer
 
     if offer is None:
         return
 
-    if operation == "add":
-        offer.remaining_amount -= invoice_item.quantity
+    delta = 0
 
-        if reset_max and offer.remaining_amount == 0:
-            calculate_max_offer_from_offer(offer)
+    if operation == "add":
+        delta = -invoice_item.quantity
 
     elif operation == "update":
-        old_amount = offer.remaining_amount
         if old_quantity is not None:
-            offer.remaining_amount += old_quantity - invoice_item.quantity
-
-        if reset_max and (offer.remaining_amount == 0 or old_amount == 0):
-            calculate_max_offer_from_offer(offer)
+            delta = old_quantity - invoice_item.quantity
 
     elif operation == "remove":
-        old_amount = offer.remaining_amount
-        offer.remaining_amount += invoice_item.quantity
+        delta = invoice_item.quantity
 
-        if reset_max and old_amount == 0:
-            calculate_max_offer_from_offer(offer)
+    offer = change_offer_remaining_amount(offer, delta)
+    old_amount = offer.remaining_amount - delta
 
-    if offer.remaining_amount < 0:
+    # The offer ran out of stock or came back in stock
+    if reset_max and (offer.remaining_amount == 0) != (old_amount == 0):
+        calculate_max_offer_from_offer(offer)
+
+    return offer
+
+
+def affect_offers(operation, invoice_items, reset_max=True):
+    """
+    `affect_offer` for many invoice items ("add" or "remove") with one conditional update
+    of all their offers, one read of the new amounts and one max offer recalculation.
+    """
+    Offer = get_model("offers", "Offer")
+
+    sign = {"add": -1, "remove": 1}[operation]
+    offers = {}
+    deltas = {}
+
+    for invoice_item in invoice_items:
+        offer = invoice_item.offer
+
+        if offer is None:
+            continue
+
+        offers.setdefault(offer.pk, []).append(offer)
+        deltas[offer.pk] = deltas.get(offer.pk, 0) + sign * invoice_item.quantity
+
+    deltas = {offer_id: delta for offer_id, delta in deltas.items() if delta}
+
+    if not deltas:
+        return
+
+    condition = models.Q()
+    whens = []
+
+    for offer_id, delta in deltas.items():
+        condition |= models.Q(pk=offer_id, remaining_amount__gte=max(-delta, 0))
+        whens.append(models.When(pk=offer_id, then=models.F("remaining_amount") + delta))
+
+    updated = Offer.objects.filter(condition).update(
+        remaining_amount=models.Case(*whens, default=models.F("remaining_amount"))
+    )
+
+    if updated != len(deltas):
         raise ValidationError({"offer": "Insufficient offer amount."})
 
-    offer.save()
+    changed_products = set()
 
-    return offer
+    for offer_id, remaining_amount in Offer.objects.filter(pk__in=deltas).values_list("pk", "remaining_amount"):
+        old_amount = remaining_amount - deltas[offer_id]
 
+        for offer in offers[offer_id]:
+            offer.remaining_amount = remaining_amount
 
-def calculate_max_offer(product, affect_carts=True):
+        # The offer ran out of stock or came back in stock
+        if (remaining_amount == 0) != (old_amount == 0):
+            changed_products.add(offers[offer_id][0].product_id)
+
+    if reset_max and changed_products:
+        calculate_max_offers(changed_products)
+
+
+def get_product_ids(products):
+    product_ids = set()
+
+    for product in products:
+        if isinstance(product, models.Model):
+            product_ids.add(product.pk)
+        elif product is not None:
+            product_ids.add(int(product))
+
+    return product_ids
+
+
+def get_max_offer_ids_queryset(product_ids, **filter_kwargs):
+    """
+    Ids of the offers holding the highest selling discount among the offers of each product
+    that still have a remaining amount, for all products in one query.
+
+    The highest discount of a product is the first in-stock offer by descending discount, read
+    from `offer_product_discount_idx` instead of aggregating every offer of the product.
+    """
     Offer = get_model("offers", "Offer")
 
-    filter_kwargs = {}
+    max_selling_discount = (
+        Offer.objects.filter(product_id=models.OuterRef("product_id"), remaining_amount__gt=0, **filter_kwargs)
+        .order_by("-selling_discount_percentage")
+        .values("selling_discount_percentage")[:1]
+    )
+
+    return Offer.objects.filter(
+        product_id__in=product_ids,
+        selling_discount_percentage=models.Subquery(max_selling_discount),
+        **filter_kwargs,
+    ).values("pk")
 
-    if isinstance(product, str) or isinstance(product, int):
-        filter_kwargs["product_id"] = product
-    elif isinstance(product, models.Model):
-        filter_kwargs["product"] = product
 
-    queryset = Offer.objects.filter(**filter_kwargs)
-    queryset.update(is_max=False)
+def calculate_max_offers(products, affect_carts=True):
+    """
+    Recalculate `is_max` for the offers of all `products` with a single update,
+    then reprice the cart items of those products in bulk.
+    """
+    Offer = get_model("offers", "Offer")
+    product_ids = get_product_ids(products)
+
+    if not product_ids:
+        return
 
-    max_selling_discount = queryset.filter(remaining_amount__gt=0).aggregate(
-        max_selling_discount=models.Max("selling_discount_percentage"),
-    )["max_selling_discount"]
-    queryset.filter(selling_discount_percentage=max_selling_discount).update(is_max=True)
+    Offer.objects.filter(product_id__in=product_ids).update(
+        is_max=models.Case(
+            models.When(pk__in=get_max_offer_ids_queryset(product_ids), then=models.Value(True)),
+            default=models.Value(False),
+        )
+    )
+    # The max offers (and which of them are in stock) changed, cached offer searches are stale
+    bump_search_cache_version("offers")
 
     if affect_carts:
-        CartItem = get_model("shop", "CartItem")
-        cart_items = CartItem.objects.select_related("cart__user__profile__payment_period").filter(product=product)
-        max_offer = queryset.filter(is_max=True).first()
+        update_cart_items_max_offer(product_ids)
 
-        if max_offer is not None:
-            for item in cart_items:
-                update_cart_item_offer(item, max_offer)
-        else:
-            for item in cart_items:
-                mark_item_as_sold_out(item)
+
+def calculate_max_offer(product, affect_carts=True):
+    calculate_max_offers([product], affect_carts=affect_carts)
 
 
 def update_offer(offer, data, affect_carts=True):
@@ -204,39 +364,37 @@ def delete_offer(offer, reset_max=True):
 
 
 # دوال خاصة بعروض الجملة
-def calculate_max_wholesale_offer(product, affect_carts=False):
+def calculate_max_wholesale_offers(products, affect_carts=False):
     """
-    حساب أفضل عرض جملة للمنتج بناءً على أعلى خصم
+    حساب أفضل عرض جملة لكل منتج بناءً على أعلى خصم (في استعلام واحد لكل المنتجات)
     عروض الجملة منفصلة تماماً عن العروض العادية
     """
     Offer = get_model("offers", "Offer")
+    product_ids = get_product_ids(products)
 
-    filter_kwargs = {"is_wholesale": True}
-
-    if isinstance(product, str) or isinstance(product, int):
-        filter_kwargs["product_id"] = product
-    elif isinstance(product, models.Model):
-        filter_kwargs["product"] = product
-
-    # الحصول على جميع عروض الجملة للمنتج
-    queryset = Offer.objects.filter(**filter_kwargs)
-    queryset.update(is_max_wholesale=False)
+    if not product_ids:
+        return
 
-    # حساب أعلى خصم في عروض الجملة
-    max_selling_discount = queryset.filter(remaining_amount__gt=0).aggregate(
-        max_selling_discount=models.Max("selling_discount_percentage"),
-    )["max_selling_discount"]
+    max_offer_ids = get_max_offer_ids_queryset(product_ids, is_wholesale=True).filter(remaining_amount__gt=0)
 
-    if max_selling_discount is not None:
-        queryset.filter(
-            selling_discount_percentage=max_selling_discount,
-            remaining_amount__gt=0
-        ).update(is_max_wholesale=True)
+    Offer.objects.filter(product_id__in=product_ids, is_wholesale=True).update(
+        is_max_wholesale=models.Case(
+            models.When(pk__in=max_offer_ids, then=models.Value(True)),
+            default=models.Value(False),
+        )
+    )
 
     # ملاحظة: عروض الجملة لا تؤثر على السلات العادية
     # لأن لها نظام طلب منفصل
 
 
+def calculate_max_wholesale_offer(product, affect_carts=False):
+    """
+    حساب أفضل عرض جملة للمنتج بناءً على أعلى خصم
+    """
+    calculate_max_wholesale_offers([product], affect_carts=affect_carts)
+
+
 def calculate_max_wholesale_offer_from_offer(offer, affect_carts=False):
     """
     حساب أفضل عرض جملة بناءً على عرض محدد
@@ -289,3 +447,100 @@ def update_wholesale_offer(offer, data, affect_carts=False):
         calculate_max_wholesale_offer_from_offer(offer, affect_carts=affect_carts)
 
     return offer
+
+
+def import_offers(user, rows):
+    """
+    Make the offers of `user` match the uploaded sheet `rows` by applying only the differences.
+
+    Rows are matched with the existing offers by product code (in upload order when a code repeats),
+    only the fields present in a row are compared (a sheet without the optional wholesale columns
+    keeps the current values).
+    Changed offers are written with one `bulk_update`, new ones with one `bulk_create` and the offers
+    missing from the sheet with one delete. Max offers are recalculated and wishlist pharmacies are
+    notified once, for the changed products only.
+
+    Returns `(offers, changed_product_ids)`, `offers` in the order of `rows`.
+    """
+    from offers.signals import notify_wishlist_pharmacies
+
+    Offer = get_model("offers", "Offer")
+    fields = {name: Offer._meta.get_field(name) for name in OFFER_IMPORT_FIELDS}
+
+    existing_offers = {}
+    for offer in Offer.objects.filter(user=user).order_by("pk"):
+        existing_offers.setdefault(offer.product_code_id, []).append(offer)
+
+    offers = []
+    created_offers = []
+    updated_offers = []
+    updated_fields = set()
+    available_offers = []
+    changed_products = {False: set(), True: set()}
+
+    for row in rows:
+        matches = existing_offers.get(getattr(row.get("product_code"), "pk", None))
+
+        if not matches:
+            offer = Offer(**{**row, "user": user})
+            created_offers.append(offer)
+            changed_products[offer.is_wholesale].add(offer.product_id)
+            offers.append(offer)
+            continue
+
+        offer = matches.pop(0)
+        was_available = offer.remaining_amount > 0
+        old_product = (offer.is_wholesale, offer.product_id)
+        changed = []
+
+        for name, field in fields.items():
+            if name not in row:
+                continue
+
+            value = row[name]
+            if field.is_relation and value is not None:
+                value = value.pk
+
+            if getattr(offer, field.attname) != value:
+                setattr(offer, field.attname, value)
+                changed.append(name)
+
+        if changed:
+            updated_offers.append(offer)
+            updated_fields.update(changed)
+            changed_products[old_product[0]].add(old_product[1])
+            changed_products[offer.is_wholesale].add(offer.product_id)
+
+            # The offer came back in stock
+            if not was_available and offer.remaining_amount > 0:
+                available_offers.append(offer)
+
+        offers.append(offer)
+
+    deleted_offers = [offer for matches in existing_offers.values() for offer in matches]
+    for offer in deleted_offers:
+        changed_products[offer.is_wholesale].add(offer.product_id)
+
+    if deleted_offers:
+        Offer.objects.filter(pk__in=[offer.pk for offer in deleted_offers]).delete()
+
+    if updated_offers:
+        Offer.objects.bulk_update(updated_offers, sorted(updated_fields), batch_size=500)
+
+    if created_offers:
+        Offer.objects.bulk_create(created_offers, batch_size=500)
+
+    calculate_max_offers(changed_products[False])
+    calculate_max_wholesale_offers(changed_products[True])
+
+    try:
+        notify_wishlist_pharmacies([*created_offers, *available_offers])
+    except Exception as e:
+        logger.error(f"Failed to send wishlist notifications for the offers of user #{user.pk}: {str(e)}")
+
+    logger.info(
+        f"Imported offers of user #{user.pk}: {len(created_offers)} created, {len(updated_offers)} updated, "
+        f"{len(deleted_offers)} deleted, {len(offers) - len(created_offers) - len(updated_offers)} unchanged"
+    )
+
+    return offers, changed_products[False] | changed_products[True]
@@ -2,7 +2,6 @@ from decimal import Decimal
 import logging
 from accounts.permissions import *
 from accounts.choices import Role
-from drf_excel.mixins import XLSXFileMixin
 from drf_excel.renderers import XLSXRenderer
 from rest_framework.generics import ListAPIView, CreateAPIView, DestroyAPIView, UpdateAPIView
 from rest_framework import filters
@@ -15,14 +14,24 @@ from offers.serializers import (
     OfferUpdateSerializer,
     OfferExcelReadSerialzier,
     OfferPDFReadSerializer,
+    WholesaleOfferExcelReadSerializer,
     OfferReadSerializer,
     OfferUploaderSerializer,
     UserOfferCreateSerializer,
 )
 from django.utils import timezone
-from core.utils import get_excel_body, get_excel_header, get_excel_column_header
-from core.views.mixins import PDFFileMixin
+from core.utils import (
+    filter_by_ranked_ids,
+    get_excel_body,
+    get_excel_column_header,
+    get_excel_header,
+    get_ranked_search_ids,
+    get_search_cache_key,
+    set_trigram_similarity_threshold,
+)
 from core.views.renderers import PDFRenderer
+from exports.choices import ExportJobKindChoice
+from exports.mixins import PDFExportJobMixin, XLSXStreamingMixin
 from django.utils.translation import activate
 from rest_framework.response import Response
 from core.views.abstract_paginations import CustomPageNumberPagination, LargePageNumberPagination
@@ -78,6 +87,55 @@ class MaxOfferListAPIView(ListAPIView):
         "min_purchase",
     ]
 
+    def search(self, queryset, adv_query, search_mode, min_similarity):
+        """Rank `queryset` with PostgreSQL FTS + Trigram on the related product fields"""
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        from django.contrib.postgres.search import TrigramSimilarity
+        from django.db.models import F, Value, Q, Case, When, IntegerField
+
+        # Stored, GIN-indexed product vector (Arabic config)
+        query = SearchQuery(adv_query, config='arabic', search_type='websearch')
+        queryset = queryset.annotate(rank=SearchRank(F('product__search_vector'), query))
+        fts_match = Q(product__search_vector=query)
+
+        # Trigram similarity on the same fields
+        trig = (
+            TrigramSimilarity('product__name', adv_query) * 1.0 +
+            TrigramSimilarity('product__effective_material', adv_query) * 0.8 +
+            TrigramSimilarity('product__company__name', adv_query) * 0.6 +
+            TrigramSimilarity('product__e_name', adv_query) * 0.4
+        )
+        queryset = queryset.annotate(sim=trig)
+        # Index-backed candidates (pg_trgm %), the weighted score is computed on them only:
+        # a match needs at least one of the scored fields as similar as `min_similarity`
+        trigram_match = (
+            Q(product__name__trigram_similar=adv_query) |
+            Q(product__effective_material__trigram_similar=adv_query) |
+            Q(product__company__name__trigram_similar=adv_query) |
+            Q(product__e_name__trigram_similar=adv_query)
+        )
+
+        if search_mode != 'fts':
+            # `%` must accept the same matches as `min_similarity`
+            set_trigram_similarity_threshold(min_similarity, queryset.db)
+
+        if search_mode == 'fts':
+            queryset = queryset.filter(fts_match).order_by('-rank')
+        elif search_mode == 'trigram':
+            queryset = queryset.filter(trigram_match, sim__gte=min_similarity).order_by('-sim')
+        else:  # hybrid
+            queryset = queryset.filter(fts_match | (trigram_match & Q(sim__gte=min_similarity)))
+            queryset = queryset.annotate(score=F('rank')*1.0 + F('sim')*0.7).order_by('-score')
+
+        # Prefix boost on product name
+        return queryset.annotate(
+            starts=Case(
+                When(product__name__istartswith=adv_query, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        ).order_by('-starts')
+
     def get_queryset(self):
         user = self.request.user
         search_term_raw = self.request.query_params.get('search', '')
@@ -121,61 +179,17 @@ class MaxOfferListAPIView(ListAPIView):
 
         # Advanced search (FTS + Trigram) on related product fields
         if adv_query:
-            from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
-            from django.contrib.postgres.search import TrigramSimilarity
-            from django.db.models import F, Value, Q, Case, When, IntegerField
-            from django.core.cache import cache
-            import hashlib
-
-            # Redis Cache for offer search results
-            cache_key_raw = f"search_offers_{adv_query}_{search_mode}_{min_similarity}_{user.role if hasattr(user, 'role') else 'anon'}"
-            cache_key = hashlib.md5(cache_key_raw.encode()).hexdigest()
-            
-            cached_ids = cache.get(cache_key)
-            if cached_ids is not None:
-                queryset = queryset.filter(id__in=cached_ids)
-                preserved_order = Case(*[When(id=pk, then=pos) for pos, pk in enumerate(cached_ids)])
-                return queryset.order_by(preserved_order)
-
-            # Arabic config for better stemming
-            vector = (
-                SearchVector('product__name', weight='A', config='arabic') +
-                SearchVector('product__effective_material', weight='B', config='arabic') +
-                SearchVector('product__company__name', weight='C', config='arabic') +
-                SearchVector('product__e_name', weight='D', config='arabic')
+            # Ranked ids of every page, cached until the catalog or the max offers change
+            # (see `bump_search_cache_version`)
+            cache_key = get_search_cache_key(("catalog", "offers"), "max_offers", adv_query, search_mode, min_similarity)
+            ranked_ids = get_ranked_search_ids(
+                cache_key, lambda: self.search(queryset, adv_query, search_mode, min_similarity)
             )
-            query = SearchQuery(adv_query, config='arabic', search_type='websearch')
-            queryset = queryset.annotate(rank=SearchRank(vector, query))
-
-            # Trigram similarity on the same fields
-            trig = (
-                TrigramSimilarity('product__name', adv_query) * 1.0 +
-                TrigramSimilarity('product__effective_material', adv_query) * 0.8 +
-                TrigramSimilarity('product__company__name', adv_query) * 0.6 +
-                TrigramSimilarity('product__e_name', adv_query) * 0.4
-            )
-            queryset = queryset.annotate(sim=trig)
-
-            if search_mode == 'fts':
-                queryset = queryset.filter(rank__gt=0).order_by('-rank')
-            elif search_mode == 'trigram':
-                queryset = queryset.filter(sim__gte=min_similarity).order_by('-sim')
-            else:  # hybrid
-                queryset = queryset.filter(Q(rank__gt=0) | Q(sim__gte=min_similarity))
-                queryset = queryset.annotate(score=F('rank')*1.0 + F('sim')*0.7).order_by('-score')
 
-            # Prefix boost on product name
-            queryset = queryset.annotate(
-                starts=Case(
-                    When(product__name__istartswith=adv_query, then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-            ).order_by('-starts')
-            
-            # Cache the result IDs for 5 minutes
-            result_ids = list(queryset.values_list('id', flat=True)[:100])
-            cache.set(cache_key, result_ids, timeout=300)
+            if ranked_ids is not None:
+                queryset = filter_by_ranked_ids(queryset, ranked_ids)
+            else:
+                queryset = self.search(queryset, adv_query, search_mode, min_similarity)
 
         # Apply search filter manually
         if search_term and not adv_query:
@@ -242,7 +256,7 @@ class OfferDestroyAPIView(DestroyAPIView):
         delete_offer(instance)
 
 
-class OfferDownloadExcelAPIView(XLSXFileMixin, ListAPIView):
+class OfferDownloadExcelAPIView(XLSXStreamingMixin, ListAPIView):
     permission_classes = [SalesRoleAuthentication | DataEntryRoleAuthentication | ManagerRoleAuthentication]
     serializer_class = OfferExcelReadSerialzier
     renderer_classes = [XLSXRenderer]
@@ -334,12 +348,13 @@ class OfferDownloadExcelAPIView(XLSXFileMixin, ListAPIView):
         return queryset
 
 
-class OfferDownloadPDFAPIView(PDFFileMixin, ListAPIView):
+class OfferDownloadPDFAPIView(PDFExportJobMixin, ListAPIView):
     permission_classes = [SalesRoleAuthentication | DataEntryRoleAuthentication | ManagerRoleAuthentication]
     renderer_classes = [PDFRenderer]
     serializer_class = OfferPDFReadSerializer
     template_name = "market/pdf/store_offers.html"
     template_context = {"timestamp": timezone.now().strftime("%d-%m-%Y")}
+    export_kind = ExportJobKindChoice.OFFERS_PDF
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     search_fields = ["product__name", "product__e_name"]
 
@@ -406,7 +421,7 @@ class OfferDownloadPDFAPIView(PDFFileMixin, ListAPIView):
         activate("ar")
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return self.export_pdf(serializer.data)
 
 
 class UserOfferListAPIView(ListAPIView):
@@ -638,14 +653,14 @@ class WholesaleOfferDestroyAPIView(DestroyAPIView):
         delete_offer(instance)
 
 
-class WholesaleOfferDownloadExcelAPIView(XLSXFileMixin, ListAPIView):
+class WholesaleOfferDownloadExcelAPIView(XLSXStreamingMixin, ListAPIView):
     """
     تحميل عروض الجملة كملف Excel
     """
     permission_classes = [
         SalesRoleAuthentication | DataEntryRoleAuthentication | ManagerRoleAuthentication
     ]
-    serializer_class = OfferExcelReadSerialzier
+    serializer_class = WholesaleOfferExcelReadSerializer
     renderer_classes = [XLSXRenderer]
     filterset_class = OfferFilter
     pagination_class = None
@@ -17,6 +17,43 @@ app.conf.beat_schedule = {
         'schedule': crontab(hour=9, minute=0),  # كل يوم الساعة 9 صباحاً
     },
     
+    # إرسال Push Notifications للإشعارات التي لم ترسل بعد (بما فيها المنشأة بـ bulk_create)
+    'dispatch-push-notifications': {
+        'task': 'notifications.tasks.dispatch_push_notifications',
+        'schedule': 30.0,  # كل 30 ثانية
+    },
+    
+    # كتابة عدد مرات استخدام مطابقات المنتجات المخزنة مؤقتاً دفعة واحدة
+    'flush-product-match-cache-access': {
+        'task': 'market.tasks.flush_product_match_cache_access',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    
+    # تحديث بيانات الأدوية لفهرس الـ RAG (المنتجات الجديدة/المعدلة/المحذوفة فقط)
+    'sync-rag-data': {
+        'task': 'market.tasks.sync_rag_data',
+        'schedule': crontab(minute='*/15'),  # كل 15 دقيقة
+    },
+    
+    # كتابة سجلات البحث المخزنة مؤقتاً في قاعدة البيانات دفعة واحدة
+    'flush-search-logs': {
+        'task': 'core.tasks.flush_search_logs',
+        'schedule': 60.0,  # كل دقيقة
+    },
+    
+    # تحديث عمليات البحث الشائعة من سجلات البحث الجديدة فقط
+    'aggregate-popular-searches': {
+        'task': 'core.tasks.aggregate_popular_searches',
+        'schedule': crontab(minute='*/10'),  # كل 10 دقائق
+    },
+    
+    # حذف ملفات التصدير (PDF) القديمة يومياً
+    'delete-old-export-jobs': {
+        'task': 'exports.tasks.delete_old_export_jobs',
+        'schedule': crontab(hour=3, minute=0),  # كل يوم الساعة 3 صباحاً
+        'args': (7,)  # حذف الأقدم من 7 أيام
+    },
+    
     # حذف الإشعارات المقروءة القديمة (أسبوعياً)
     'delete-old-notifications': {
         'task': 'notifications.tasks.delete_old_read_notifications',
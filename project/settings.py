@@ -80,6 +80,7 @@ INSTALLED_APPS = [
     "invoices",
     "inventory",
     "notifications",
+    "exports",
 ]
 
 MIDDLEWARE = [
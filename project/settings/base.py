@@ -71,6 +71,7 @@ LOCAL_APPS = [
     "invoices",
     "inventory",
     "notifications",
+    "exports",
     "ai_agent",
 ]
 
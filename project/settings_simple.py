@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'notifications',
     'ads',
     'shop',
+    'exports',
     'utils',
     'ai_agent', 
     # Third party apps (moved to end to avoid loading issues)
@@ -28,6 +28,7 @@ def home_view(request):
             "shop": "/shop/",
             "inventory": "/inventory/",
             "notifications": "/notifications/",
+            "exports": "/exports/",
             "core": "/core/"
         }
     })
@@ -47,6 +48,7 @@ urlpatterns = [
     path("inventory/", include("inventory.urls")),
     path("profiles/", include("profiles.urls")),
     path("notifications/", include("notifications.urls")),
+    path("exports/", include("exports.urls")),
     path("core/", include("core.urls")),
     # Push notifications URLs temporarily disabled
     # path(
@@ -1,5 +1,6 @@
 from decimal import Decimal
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.apps import apps
 
 get_model = apps.get_model
@@ -27,6 +28,26 @@ def affect_cart(cart, operation, item, old_quantity=None, old_price=None):
     return cart
 
 
+def recalculate_carts_totals(cart_ids):
+    """Recompute the denormalized totals of the given carts from their items in one update."""
+    Cart = get_model("shop", "Cart")
+    CartItem = get_model("shop", "CartItem")
+
+    if not cart_ids:
+        return 0
+
+    items = CartItem.objects.filter(cart=models.OuterRef("pk"), sold_out=False).values("cart")
+
+    def aggregate(expression):
+        return models.Subquery(items.annotate(value=expression).values("value"))
+
+    return Cart.objects.filter(pk__in=cart_ids).update(
+        items_count=Coalesce(aggregate(models.Count("pk")), 0),
+        total_quantity=Coalesce(aggregate(models.Sum("quantity")), 0),
+        total_price=Coalesce(aggregate(models.Sum("sub_total")), Decimal("0.00"), output_field=models.DecimalField()),
+    )
+
+
 def reset_cart(cart):
     cart.items_count = 0
     cart.total_quantity = 0
@@ -156,3 +177,46 @@ def update_cart_item_offer(item, offer):
         affect_cart(item.cart, "update", item, old_price=old_price)
 
     return item
+
+
+def update_cart_items_max_offer(product_ids):
+    """
+    Point every cart item of `product_ids` at the current max offer of its product
+    (or mark it as sold out) with one bulk update, then recompute the affected carts.
+    """
+    Offer = get_model("offers", "Offer")
+    CartItem = get_model("shop", "CartItem")
+
+    max_offers = {}
+    for offer in Offer.objects.filter(product_id__in=product_ids, is_max=True, remaining_amount__gt=0).order_by("pk"):
+        max_offers.setdefault(offer.product_id, offer)
+
+    items = list(
+        CartItem.objects.select_related("product", "cart__user__profile__payment_period").filter(
+            product_id__in=product_ids
+        )
+    )
+
+    for item in items:
+        offer = max_offers.get(item.product_id)
+
+        if offer is None:
+            item.sold_out = True
+            continue
+
+        addition_percentage = item.cart.user.profile.payment_period.addition_percentage
+        public_price = item.product.public_price
+
+        item.offer = offer
+        item.discount_percentage = offer.selling_discount_percentage - addition_percentage
+        price = Decimal(public_price * (1 - item.discount_percentage / 100)).quantize(Decimal("0.00"))
+        item.price = price
+        item.sub_total = Decimal(price * item.quantity).quantize(Decimal("0.00"))
+        item.sold_out = False
+
+    CartItem.objects.bulk_update(
+        items, ["offer", "discount_percentage", "price", "sub_total", "sold_out"], batch_size=500
+    )
+    recalculate_carts_totals({item.cart_id for item in items})
+
+    return items